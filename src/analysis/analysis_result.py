@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Set
 
 import numpy as np
 import pandas as pd
@@ -7,6 +7,32 @@ from src.analysis.get_term_hierarchy import get_hierarchy_for_experiment_type
 from src.model.geo_dataset import GEODataset
 
 
+class AnalysisState:
+    """
+    Fitted models and intermediate results of an analysis, used to update it when its PubMed IDs change slightly.
+    Rows of embeddings and counts are in the order of datasets.
+    """
+
+    def __init__(self, datasets: List[GEODataset], space, svd, centroids: np.ndarray, layout, vocabulary: List[str],
+                 counts, standardized_characteristics_values: pd.DataFrame | None,
+                 pubmed_ids: List[int] | None = None, baseline_silhouette_score: float | None = None,
+                 baseline_accessions: Set[str] | None = None):
+        self.datasets = datasets
+        # EmbeddingSpace of the datasets with the map of stems to tokens fitted on them, None in the streaming mode
+        self.space = space
+        self.svd = svd
+        self.centroids = centroids
+        self.layout = layout
+        self.vocabulary = vocabulary
+        self.counts = counts
+        self.standardized_characteristics_values = standardized_characteristics_values
+        self.pubmed_ids = pubmed_ids
+        # Silhouette score and accessions of the last full analysis, incremental updates are compared against
+        # them so that chained updates can't drift away from it
+        self.baseline_silhouette_score = baseline_silhouette_score
+        self.baseline_accessions = baseline_accessions
+
+
 class AnalysisResult:
     def __init__(
             self,
@@ -18,6 +44,7 @@ class AnalysisResult:
             silhouette_score: float,
             standardized_characteristics_values: pd.DataFrame,
             standardized_samples: pd.DataFrame | None = None,
+            embeddings: np.ndarray | None = None,
     ):
         self.df: pd.DataFrame = pd.DataFrame(list(map(GEODataset.to_dict, datasets)))
         self.df["experiment_type_hierarchy"] = self.df["experiment_type"].map(
@@ -34,3 +61,8 @@ class AnalysisResult:
         self.silhouette_score: float = silhouette_score
         self.samples: pd.DataFrame | None = standardized_samples
         self.n_clusters = n_clusters
+        # SVD-reduced embeddings of the datasets in the order of df
+        self.embeddings: np.ndarray | None = embeddings
+        self.state: AnalysisState | None = None
+        # Tracer with the time and memory spent in each stage of the analysis
+        self.trace = None
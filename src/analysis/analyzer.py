@@ -1,25 +1,32 @@
-import time
 from typing import List, Dict
 
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix, vstack
+from sklearn.base import clone
 from sklearn.decomposition import TruncatedSVD
-from sklearn.manifold import TSNE
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import Normalizer
-from tqdm import tqdm
 
-from src.analysis.analysis_result import AnalysisResult
-from src.analysis.cluster import auto_cluster, get_clusters_top_terms
+from src.analysis.analysis_result import AnalysisResult, AnalysisState
+from src.analysis.cluster import auto_cluster, get_clusters_top_terms, sort_cluster_labels, sampled_silhouette_score, \
+    cluster_centroids, assign_to_nearest_centroids
+from src.analysis.corpus_embeddings import get_corpus_embeddings
 from src.analysis.get_term_hierarchy import get_hierarchy
-from src.analysis.vectorize_datasets import vectorize_datasets
+from src.analysis.layout_engines import select_layout_engine
+from src.analysis.vectorize_datasets import vectorize_datasets_with_space, vectorize_more_datasets
 from src.config import config
 from src.config import logger
-from src.ingestion.download_geo_datasets import download_geo_datasets
+from src.config.config import INCREMENTAL_MAX_CHANGED_FRACTION, INCREMENTAL_MAX_SILHOUETTE_DROP
+from src.ingestion.download_geo_datasets import download_geo_datasets, fetch_geo_series_accessions, \
+    download_geo_datasets_by_accessions
 from src.ingestion.download_samples import download_samples_for_datasets
 from src.model.geo_dataset import GEODataset
 from src.model.geo_sample import GEOSample
-from src.standardization.bern2_pipeline import BERN2Error, BERN2Pipeline
+from src.standardization.bern2_cache import get_bern2_cache
+from src.standardization.bern2_pipeline import BERN2Pipeline
 from src.standardization.standardization_resources import StandardizationResources
+from src.utils.tracing import span, traced
 
 
 class DatasetAnalyzer:
@@ -28,7 +35,6 @@ class DatasetAnalyzer:
             TruncatedSVD(n_components=svd_components, random_state=42),
             Normalizer(copy=False),
         )
-        self.tsne = TSNE(n_components=2, random_state=42)
         self.characteristics_to_standardize = [
             ("disease", ["disease", "disease state"]),
             ("tissue", ["tissue"]),
@@ -43,9 +49,10 @@ class DatasetAnalyzer:
             #                                          url=config.bern2_url)
             # TODO: switch to BERN2AngelPipeline later
             self.bern2_pipeline = BERN2Pipeline(mesh_lookup, ncbi_gene,
-                                                url=config.bern2_url)
+                                                url=config.bern2_url, cache=get_bern2_cache())
 
 
+    @traced
     def analyze_paper_datasets(self, pubmed_ids: List[int]) -> AnalysisResult:
         """
         Analyzes the datasets that are associated with the given PubMed IDs and
@@ -54,11 +61,140 @@ class DatasetAnalyzer:
         :param pumbed_ids: List of PubMed IDs for which to analyze datasets.
         :return: An instance of AnalysisResult containing the results.
         """
+        pubmed_ids = list(pubmed_ids)
+        with span("download_datasets") as download_span:
+            datasets = download_geo_datasets(pubmed_ids)
+            download_span.items = len(datasets)
+        with span("download_samples", items=len(datasets)):
+            download_samples_for_datasets(datasets)
+        result = self.analyze_datasets(datasets)
+        result.state.pubmed_ids = pubmed_ids
+        return result
+
+    @traced
+    def analyze_paper_datasets_incremental(self, pubmed_ids: List[int], previous: AnalysisResult) -> AnalysisResult:
+        """
+        Updates a previous analysis for a slightly changed list of PubMed IDs.
+        Only the added datasets are downloaded, embedded with the previous vectorization and SVD, assigned
+        to the nearest previous cluster, placed into the previous layout and standardized.
+        Falls back to a full analysis when too many datasets changed or the clustering got noticeably worse
+        since the last full analysis, or the previous analysis can't be updated.
+
+        :param pubmed_ids: List of PubMed IDs for which to analyze datasets.
+        :param previous: Result of the previous analysis.
+        :return: An instance of AnalysisResult containing the results.
+        """
+        pubmed_ids = list(pubmed_ids)
+        state = getattr(previous, "state", None)
+        if state is None or state.space is None:
+            logger.info("The previous analysis can't be updated, analyzing from scratch")
+            return self.analyze_paper_datasets(pubmed_ids)
+
+        with span("fetch_accessions", items=len(pubmed_ids)):
+            accessions = fetch_geo_series_accessions(pubmed_ids)
+        previous_accessions = [dataset.id for dataset in state.datasets]
+        kept = [i for i, accession in enumerate(previous_accessions) if accession in accessions]
+        added_accessions = sorted(accessions - set(previous_accessions))
+        logger.info("Incremental analysis: %d datasets kept, %d removed, %d added",
+                    len(kept), len(previous_accessions) - len(kept), len(added_accessions))
+        baseline_accessions = state.baseline_accessions or set(previous_accessions)
+        n_changed = len(baseline_accessions ^ accessions)
+        if n_changed > INCREMENTAL_MAX_CHANGED_FRACTION * len(baseline_accessions):
+            logger.info("Too many datasets changed, analyzing from scratch")
+            return self.analyze_paper_datasets(pubmed_ids)
+
+        with span("download_datasets", items=len(added_accessions)):
+            added = download_geo_datasets_by_accessions(added_accessions)
+        with span("download_samples", items=len(added)):
+            download_samples_for_datasets(added)
+        result = self._update_analysis(previous, kept, added)
+        if result is None:
+            return self.analyze_paper_datasets(pubmed_ids)
+        result.state.pubmed_ids = pubmed_ids
+        return result
+
+    def _update_analysis(self, previous: AnalysisResult, kept: List[int], added: List[GEODataset]
+                         ) -> AnalysisResult | None:
+        """
+        :param kept: Indices of the previous datasets that are kept.
+        :param added: New datasets.
+        :return: Updated analysis or None if it should be analyzed from scratch.
+        """
+        state = previous.state
+        datasets = [state.datasets[i] for i in kept] + added
+        if added:
+            with span("vectorize", items=len(added)):
+                vectorized = vectorize_more_datasets(added, state.space)
+            if vectorized is None:
+                logger.info("The embeddings backend of the previous analysis is not available")
+                return None
+            added_embeddings, added_counts = vectorized
+            with span("svd", items=len(added)):
+                added_embeddings_svd = state.svd.transform(added_embeddings)
+            with span("cluster", items=len(added)):
+                added_cluster_assignments = assign_to_nearest_centroids(added_embeddings_svd, state.centroids)
+            with span("layout", items=len(added)):
+                added_embeddings_2d = state.layout.transform(added_embeddings_svd)
+        else:
+            added_embeddings_svd = np.zeros((0, previous.embeddings.shape[1]))
+            added_counts = csr_matrix((0, len(state.vocabulary)))
+            added_cluster_assignments = np.zeros(0, dtype=int)
+            added_embeddings_2d = np.zeros((0, 2))
 
-        datasets = download_geo_datasets(pubmed_ids)
-        download_samples_for_datasets(datasets)
-        return self.analyze_datasets(datasets)
+        embeddings_svd = np.vstack([previous.embeddings[kept], added_embeddings_svd])
+        cluster_assignments = sort_cluster_labels(np.concatenate([
+            previous.df["cluster"].to_numpy()[kept], added_cluster_assignments
+        ]))
+        n_clusters = int(np.max(cluster_assignments)) + 1
+        if n_clusters < 2:
+            return None
+        silhouette_score = sampled_silhouette_score(embeddings_svd, cluster_assignments)
+        baseline_silhouette_score = state.baseline_silhouette_score
+        if baseline_silhouette_score is None:
+            baseline_silhouette_score = previous.silhouette_score
+        logger.info("Silhouette score: last full analysis %.3f, updated %.3f", baseline_silhouette_score,
+                    silhouette_score)
+        if silhouette_score < baseline_silhouette_score - INCREMENTAL_MAX_SILHOUETTE_DROP:
+            logger.info("The clustering got worse, analyzing from scratch")
+            return None
 
+        corpus_counts = vstack([state.counts[kept], added_counts]).tocsr()
+        with span("topics", items=n_clusters):
+            cluster_topics = get_clusters_top_terms(
+                cluster_assignments, state.vocabulary, corpus_counts, config.topic_words
+            )
+        embeddings_2d = np.vstack([previous.df[["x", "y"]].to_numpy()[kept], added_embeddings_2d])
+
+        unique_characteristics_values = None
+        if self.mesh_lookup:
+            previous_values = state.standardized_characteristics_values
+            if previous_values is None:
+                unique_characteristics_values = pd.DataFrame(self.standardize_unique_characteristics_values(datasets))
+            else:
+                kept_ids = {dataset.id for dataset in datasets}
+                unique_characteristics_values = pd.concat(
+                    [previous_values[previous_values["id"].isin(kept_ids)]] +
+                    ([self.standardize_unique_characteristics_values(added)] if added else []),
+                    ignore_index=True
+                )
+                # Entity types that only occur in the previous or the new datasets
+                for column in unique_characteristics_values.columns.drop("id"):
+                    unique_characteristics_values[column] = unique_characteristics_values[column].map(
+                        lambda values: values if isinstance(values, list) else [])
+
+        result = AnalysisResult(
+            datasets, n_clusters, cluster_assignments, cluster_topics, embeddings_2d, silhouette_score,
+            unique_characteristics_values, None, embeddings_svd
+        )
+        result.state = AnalysisState(
+            datasets, state.space, state.svd, cluster_centroids(embeddings_svd, cluster_assignments), state.layout,
+            state.vocabulary, corpus_counts, unique_characteristics_values,
+            baseline_silhouette_score=baseline_silhouette_score,
+            baseline_accessions=state.baseline_accessions or {dataset.id for dataset in state.datasets}
+        )
+        return result
+
+    @traced
     def analyze_datasets(self, datasets: List[GEODataset]):
         """
         Analyzes the datasets and clusters them.
@@ -66,31 +202,51 @@ class DatasetAnalyzer:
         :param datasets: List of GEODataset objects.
         :return: An instance of AnalysisResult containing the results.
         """
-        embeddings, vocabulary, corpus_counts = vectorize_datasets(datasets)
-        embeddings_svd = self.svd.fit_transform(embeddings)
+        with span("gather_corpus_embeddings", items=len(datasets)):
+            corpus_embeddings = get_corpus_embeddings()
+            gathered = corpus_embeddings.gather(datasets) if corpus_embeddings is not None else None
+        if gathered is not None:
+            logger.info("Using corpus-wide embeddings")
+            embeddings_svd, vocabulary, corpus_counts = gathered
+            space, svd = corpus_embeddings.space, corpus_embeddings.svd
+        else:
+            with span("vectorize", items=len(datasets)):
+                embeddings, vocabulary, corpus_counts, space = vectorize_datasets_with_space(datasets)
+            # Fitted on every job, a copy is kept in the job's state
+            svd = clone(self.svd)
+            with span("svd", items=len(datasets)):
+                embeddings_svd = svd.fit_transform(embeddings)
 
-        explained_variance = self.svd[0].explained_variance_ratio_.sum()
-        logger.info("Explained variance of the SVD step: %.1f %%",
-                    explained_variance * 100)
+            explained_variance = svd[0].explained_variance_ratio_.sum()
+            logger.info("Explained variance of the SVD step: %.1f %%",
+                        explained_variance * 100)
 
-        begin = time.time()
-        cluster_assignments, silhouette_score, n_clusters = auto_cluster(embeddings_svd)
-        end = time.time()
+        with span("cluster", items=len(datasets)) as cluster_span:
+            cluster_assignments, silhouette_score, n_clusters = auto_cluster(embeddings_svd)
         self.n_clusters = n_clusters
-        logger.info("Clustering time: %.2fs", end - begin)
-        cluster_topics = get_clusters_top_terms(
-            cluster_assignments, vocabulary, corpus_counts, config.topic_words
-        )
+        logger.info("Clustering time: %.2fs", cluster_span.wall_seconds)
+        with span("topics", items=n_clusters):
+            cluster_topics = get_clusters_top_terms(
+                cluster_assignments, vocabulary, corpus_counts, config.topic_words
+            )
 
-        self.tsne.perplexity = min(30, len(datasets) - 1)
-        tsne_embeddings_2d = self.tsne.fit_transform(embeddings_svd)
+        layout = select_layout_engine(len(datasets))
+        with span(f"layout_{type(layout).__name__}", items=len(datasets)) as layout_span:
+            tsne_embeddings_2d = layout.fit_transform(embeddings_svd)
+        logger.info("Layout time (%s): %.2fs", type(layout).__name__, layout_span.wall_seconds)
         unique_characteristics_values = pd.DataFrame(self.standardize_unique_characteristics_values(
             datasets)) if self.mesh_lookup else None
 
-        return AnalysisResult(
+        result = AnalysisResult(
             datasets, n_clusters, cluster_assignments, cluster_topics, tsne_embeddings_2d, silhouette_score,
-            unique_characteristics_values, None
+            unique_characteristics_values, None, embeddings_svd
+        )
+        result.state = AnalysisState(
+            datasets, space, svd, cluster_centroids(embeddings_svd, cluster_assignments), layout, vocabulary,
+            corpus_counts, unique_characteristics_values,
+            baseline_silhouette_score=silhouette_score, baseline_accessions={dataset.id for dataset in datasets}
         )
+        return result
 
     def standardize_unique_characteristics_values(self, datasets: List[GEODataset]) -> pd.DataFrame:
         """
@@ -99,19 +255,18 @@ class DatasetAnalyzer:
             "id": [],
             "entities": []
         }
-        for dataset in tqdm(datasets):
-            entities_per_dataset["id"].append(dataset.id)
-            dataset_with_characteristics_str = dataset.get_str_with_sample_characteristics()
-            try:
-                entities = self.bern2_pipeline(dataset_with_characteristics_str)
-            except BERN2Error as e:
-                print("BERN 2 API failed for dataset:", dataset.id)
-                print(dataset_with_characteristics_str)
-                print(e)
-                entities = []
-            entities_per_dataset["entities"].append(entities)
-
-        return self._pivot_by_entity(entities_per_dataset)
+        with span("bern2", items=len(datasets)):
+            texts = [dataset.get_str_with_sample_characteristics() for dataset in datasets]
+            batch = self.bern2_pipeline.batch_lines if config.bern2_annotate_lines else self.bern2_pipeline.batch
+            for dataset, entities in zip(datasets, batch(texts)):
+                entities_per_dataset["id"].append(dataset.id)
+                if entities is None:
+                    print("BERN 2 API failed for dataset:", dataset.id)
+                    entities = []
+                entities_per_dataset["entities"].append(entities)
+
+        with span("hierarchy", items=len(datasets)):
+            return self._pivot_by_entity(entities_per_dataset)
 
     def _pivot_by_entity(self, entities_per_dataset):
         entity_types = list(
@@ -0,0 +1,39 @@
+import argparse
+import os
+from os import path
+
+from src.analysis.corpus_embeddings import build_corpus_embeddings
+from src.config import config, logger
+from src.config.config import CORPUS_EMBEDDINGS_SAMPLE_SIZE, CORPUS_EMBEDDINGS_CHUNK_SIZE
+from src.ingestion.load_cached_datasets import load_cached_datasets, list_cached_series_accessions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Embeds all cached GEO series into corpus-wide embeddings shared by all jobs.")
+    parser.add_argument("--index-path", default=config.corpus_index_path)
+    parser.add_argument("--download-folder", default=config.download_folder,
+                        help="Folder with the cached or bulk-imported GEO series")
+    parser.add_argument("--sample-size", type=int, default=CORPUS_EMBEDDINGS_SAMPLE_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=CORPUS_EMBEDDINGS_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    index_dir = path.dirname(args.index_path)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+    accessions = list_cached_series_accessions(args.download_folder)
+    if not accessions:
+        logger.info(f"No cached series in {args.download_folder}")
+        return
+
+    # Only the series metadata is embedded, so the sample files are not parsed
+    build_corpus_embeddings(
+        lambda: load_cached_datasets(args.download_folder, accessions=accessions, load_samples=False),
+        len(accessions),
+        args.index_path, config.svd_dimensions, args.sample_size, args.chunk_size
+    )
+    logger.info(f"Embedded {len(accessions)} series to {args.index_path}")
+
+
+if __name__ == "__main__":
+    main()
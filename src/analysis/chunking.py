@@ -0,0 +1,139 @@
+import atexit
+import concurrent.futures
+import logging
+import multiprocessing
+import re
+
+from more_itertools import chunked
+
+from src.config.config import EMBEDDINGS_CHUNKING_WORKERS, EMBEDDINGS_CHUNKING_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# This module is imported by the chunking worker processes, keep its imports light
+
+# Sentence ends with punctuation followed by a space and an upper case letter, digit or bracket, or a line break
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9(\[])|\s*\n+\s*')
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+
+def split_sentences(text):
+    """
+    Lightweight rule-based sentence splitter, a faster alternative to spaCy for chunking.
+    """
+    return [sentence for sentence in (s.strip() for s in SENTENCE_BOUNDARY.split(text)) if sentence]
+
+
+def count_tokens(sentence):
+    return len(TOKEN.findall(sentence))
+
+
+def get_chunks(text, max_tokens=128, overlap_sentences=1):
+    """
+    Split text into a list of overlapping chunks.
+
+    Args:
+        text (str): The text to split into chunks
+        max_tokens (int): Maximum number of tokens per chunk
+        overlap_sentences (int): Number of sentences to overlap between chunks
+
+    Returns:
+        list: List of text chunks
+    """
+
+    # Get all sentences with their number of tokens
+    sentences = [(sentence, count_tokens(sentence)) for sentence in split_sentences(text)]
+
+    if not sentences:
+        return [text]
+
+    chunks = []
+    current_chunk_sentences = []
+    current_token_count = 0
+
+    for sentence, sentence_tokens in sentences:
+        # If adding this sentence exceeds max_tokens, create a new chunk
+        if current_token_count + sentence_tokens > max_tokens and current_chunk_sentences:
+            # Join the sentences in the current chunk
+            chunk_text = ' '.join([s for s, _ in current_chunk_sentences])
+            chunks.append(chunk_text)
+
+            # Keep the overlapping sentences for the next chunk
+            if overlap_sentences > 0:
+                overlap_size = min(overlap_sentences, len(current_chunk_sentences))
+                current_chunk_sentences = current_chunk_sentences[-overlap_size:]
+                current_token_count = sum(n for _, n in current_chunk_sentences)
+            else:
+                current_chunk_sentences = []
+                current_token_count = 0
+
+        # Add the current sentence to the chunk
+        current_chunk_sentences.append((sentence, sentence_tokens))
+        current_token_count += sentence_tokens
+
+    # Add the last chunk if there are any sentences left
+    if current_chunk_sentences:
+        chunk_text = ' '.join([s for s, _ in current_chunk_sentences])
+        chunks.append(chunk_text)
+    return chunks
+
+
+def collect_papers_chunks(args):
+    batch, max_tokens, overlap_sentences = args
+    chunks = []
+    chunk_idx = []
+    for i, (pid, text) in enumerate(batch):
+        for chunk_id, chunk in enumerate(get_chunks(text, max_tokens, overlap_sentences)):
+            chunk_idx.append((pid, chunk_id))
+            chunks.append(chunk)
+        if i % 100 == 1:
+            logger.debug(f'Processed {i} papers')
+    return chunks, chunk_idx
+
+
+_pool = None
+
+
+def get_chunking_pool(max_workers=EMBEDDINGS_CHUNKING_WORKERS):
+    """
+    Returns the chunking worker pool, which is started once per process and reused by all jobs.
+    Workers are spawned rather than forked, so they don't inherit the models loaded in the parent. They still
+    re-import the parent's __main__ module as __mp_main__, and the modules chunking imports.
+    """
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')
+        )
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def parallel_collect_chunks(
+        pids,
+        texts,
+        max_tokens,
+        overlap_sentences=1,
+        batch_size=EMBEDDINGS_CHUNKING_BATCH_SIZE,
+):
+    """
+    Splits texts into chunks in the chunking worker pool.
+    Texts are sent to the workers in small batches to balance the load, chunks are returned in the order of texts.
+    :return: List of chunks and list of (pid, chunk id) for each chunk
+    """
+    chunks = []
+    chunk_idx = []
+
+    parallel_batches = [(b, max_tokens, overlap_sentences) for b in chunked(zip(pids, texts), batch_size)]
+    if len(parallel_batches) <= 1:
+        results = [collect_papers_chunks(b) for b in parallel_batches]
+    else:
+        # executor.map returns results in the order of batches
+        results = get_chunking_pool().map(collect_papers_chunks, parallel_batches)
+
+    # Combine results
+    for text_chunks, text_chunk_idx in results:
+        chunks.extend(text_chunks)
+        chunk_idx.extend(text_chunk_idx)
+    assert len(chunks) == len(chunk_idx)
+    return chunks, chunk_idx
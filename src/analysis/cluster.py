@@ -1,14 +1,19 @@
+import time
 from typing import List, Tuple
 
 import numpy as np
-from scipy.sparse import spmatrix
-from sklearn.cluster import KMeans
+from joblib import Parallel, delayed
+from more_itertools import chunked
+from scipy.sparse import spmatrix, csr_matrix, issparse
 from sklearn.decomposition import TruncatedSVD
 from sklearn.metrics import silhouette_score
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import Normalizer
 
+from src.analysis.clustering_engines import ClusteringEngine, select_clustering_engine, select_kmeans_engine
 from src.config import config, logger
+from src.config.config import CLUSTERING_MAX_CLUSTERS, CLUSTERING_N_JOBS, CLUSTERING_PARALLEL_MIN_DATASETS, \
+    CLUSTERING_SILHOUETTE_SAMPLE_SIZE, CLUSTERING_EARLY_STOPPING_PATIENCE
 from src.exception.not_enough_datasets_error import NotEnoughDatasetsError
 
 n_topic_words = config.topic_words
@@ -34,36 +39,42 @@ def get_clusters_top_terms(
     :return: List of lists of most influential terms for every cluster.
     """
 
+    cluster_assignments = np.asarray(cluster_assignments)
     n_clusters = np.max(cluster_assignments) + 1
-    tokens_freqs_per_comp = np.zeros(
-        shape=(n_clusters, corpus_counts.shape[1]), dtype=np.float32)
-    for cluster_idx in range(n_clusters):
-        tokens_freqs_per_comp[cluster_idx] = np.sum(
-            corpus_counts[cluster_assignments == cluster_idx], axis=0
-        )
+    # One-hot cluster indicator matrix, its product with the counts sums the counts of every cluster
+    cluster_indicator = csr_matrix(
+        (np.ones(len(cluster_assignments), dtype=np.float32),
+         (cluster_assignments, np.arange(len(cluster_assignments)))),
+        shape=(n_clusters, len(cluster_assignments)),
+    )
+    tokens_freqs_per_comp = cluster_indicator @ corpus_counts
+    if issparse(tokens_freqs_per_comp):
+        tokens_freqs_per_comp = tokens_freqs_per_comp.toarray()
+    tokens_freqs_per_comp = np.asarray(tokens_freqs_per_comp, dtype=np.float32)
 
     # Calculate total number of occurrences for each word
     tokens_freqs_total = np.sum(tokens_freqs_per_comp, axis=0)
 
-    # Normalize frequency vector for each word to have length of 1
-    tokens_freqs_norm = np.sqrt(
-        np.diag(tokens_freqs_per_comp.T @ tokens_freqs_per_comp))
-    tokens_freqs_per_comp = tokens_freqs_per_comp / tokens_freqs_norm
+    # Normalize frequency vector for each word to have length of 1, words that never occur keep zero vectors
+    tokens_freqs_norm = np.sqrt(np.sum(tokens_freqs_per_comp ** 2, axis=0))
+    tokens_freqs_per_comp = np.divide(tokens_freqs_per_comp, tokens_freqs_norm,
+                                      out=np.zeros_like(tokens_freqs_per_comp), where=tokens_freqs_norm > 0)
 
     logger.debug(
         'Take frequent tokens that have the most descriptive frequency vector for topics')
-    # Calculate cosine distance between the frequency vector and [0, ..., 0, 1, 0, ..., 0] for each cluster
-    cluster_mask = np.eye(n_clusters)
-    distance = tokens_freqs_per_comp.T @ cluster_mask
+    # Cosine similarity between the normalized frequency vector and [0, ..., 0, 1, 0, ..., 0] for each cluster
+    # is the normalized frequency in that cluster.
     # Add some weight for more frequent tokens to get rid of extremely rare ones in the top
-    adjusted_distance = distance.T * np.log1p(tokens_freqs_total)
+    adjusted_distance = tokens_freqs_per_comp * np.log1p(tokens_freqs_total)
 
-    top_term_indices_per_cluster = adjusted_distance.argsort()[:, ::-1]
+    n_top = min(n_topic_words, adjusted_distance.shape[1])
+    top_term_indices_per_cluster = np.argpartition(-adjusted_distance, n_top - 1, axis=1)[:, :n_top]
     top_terms = []
     for cluster_idx in range(n_clusters):
-        top_terms.append([])
-        for ind in top_term_indices_per_cluster[cluster_idx, :n_topic_words]:
-            top_terms[-1].append(vocabulary[ind])
+        indices = top_term_indices_per_cluster[cluster_idx]
+        # Sort the top terms by decreasing score, ties by decreasing index as with a reversed argsort
+        indices = indices[np.lexsort((-indices, -adjusted_distance[cluster_idx, indices]))]
+        top_terms.append([vocabulary[ind] for ind in indices])
 
     return top_terms
 
@@ -81,45 +92,118 @@ def sort_cluster_labels(cluster_assignments: np.array) -> np.array:
     return np.array([cluster_ranks[cluster_assignment] for cluster_assignment in cluster_assignments])
 
 
-def cluster(embeddings: spmatrix, n_clusters: int) -> Tuple[List[int], np.ndarray]:
+def sampled_silhouette_score(embeddings, cluster_assignments, sample_size=CLUSTERING_SILHOUETTE_SAMPLE_SIZE) -> float:
     """
-    Clusters the vector representations of GEO datasets.
+    Silhouette score, estimated on a random sample of datasets when there are more than sample_size datasets.
+    """
+    if embeddings.shape[0] <= sample_size:
+        return silhouette_score(embeddings, cluster_assignments)
+    return silhouette_score(embeddings, cluster_assignments, sample_size=sample_size, random_state=42)
 
-    :param embeddings: Vector representations of the datasets.
-    :param n_cluster: Number of clusters to create.
-    :return: Cluster assignements for each dataset and silhouette score.
+
+def cluster_centroids(embeddings: np.ndarray, cluster_assignments: np.ndarray) -> np.ndarray:
+    """
+    :return: Mean embedding of the datasets of each cluster.
+    """
+    n_clusters = np.max(cluster_assignments) + 1
+    cluster_sizes = np.bincount(cluster_assignments, minlength=n_clusters)
+    centroids = np.zeros((n_clusters, embeddings.shape[1]))
+    np.add.at(centroids, cluster_assignments, embeddings)
+    return centroids / np.maximum(cluster_sizes, 1)[:, np.newaxis]
+
+
+def assign_to_nearest_centroids(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
     """
+    :return: Index of the nearest centroid of each dataset.
+    """
+    distances = ((embeddings[:, np.newaxis, :] - centroids[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return np.argmin(distances, axis=1)
 
-    clusterer = KMeans(n_clusters=n_clusters, random_state=42)
 
+def _fit_clustering(engine: ClusteringEngine, embeddings, n_clusters: int | None):
+    """
+    :return: Cluster assignments, silhouette score, centroids and fitting time in seconds.
+    """
+    begin = time.time()
     try:
-        cluster_assignments = clusterer.fit_predict(embeddings)
+        cluster_assignments, centers = engine.fit_predict(embeddings, n_clusters)
     except ValueError:
         raise NotEnoughDatasetsError(
-            f"Cannot extract {n_clusters} clusters for {embeddings.shape[0]} datasets"
+            f"Cannot extract {n_clusters or 'any'} clusters for {embeddings.shape[0]} datasets"
         )
     cluster_assignments = sort_cluster_labels(cluster_assignments)
+    silhouette_avg = sampled_silhouette_score(embeddings, cluster_assignments)
+    return cluster_assignments, silhouette_avg, centers, time.time() - begin
+
+
+def cluster(embeddings: spmatrix, n_clusters: int, engine: ClusteringEngine | None = None
+            ) -> Tuple[List[int], np.ndarray]:
+    """
+    Clusters the vector representations of GEO datasets.
 
-    silhouette_avg = silhouette_score(embeddings, cluster_assignments)
+    :param embeddings: Vector representations of the datasets.
+    :param n_cluster: Number of clusters to create.
+    :param engine: Clustering engine, by default selected by the number of datasets.
+    :return: Cluster assignements for each dataset and silhouette score.
+    """
+    engine = engine or select_clustering_engine(embeddings.shape[0])
+    cluster_assignments, silhouette_avg, _, _ = _fit_clustering(engine, embeddings, n_clusters)
     logger.debug(f"Silhouette score: {silhouette_avg}")
 
     return cluster_assignments, silhouette_avg
 
 
-def auto_cluster(embeddings: spmatrix) -> Tuple[List[int], np.ndarray]:
+def auto_cluster(embeddings: spmatrix, n_jobs: int | None = None, engine: ClusteringEngine | None = None
+                 ) -> Tuple[np.ndarray, float, int]:
     """
     Clusters the vector representations of GEO datasets and chooses the optimal
     number of clusters based on silhoutte score.
 
+    Numbers of clusters are tried in waves of n_jobs fitted in parallel, every clustering is initialized
+    with k-means++. The search stops early when the silhouette score hasn't improved for
+    CLUSTERING_EARLY_STOPPING_PATIENCE numbers of clusters.
+    Engines that choose the number of clusters themselves are fitted once, when they find fewer than
+    2 clusters the numbers of clusters are tried with k-means instead.
+
     :param embeddings: Vector representations of the datasets.
+    :param n_jobs: Number of clusterings fitted in parallel, by default depends on the number of datasets.
+    :param engine: Clustering engine, by default selected by the number of datasets.
     :return: Cluster assignements for each dataset, silhouette score and number of clusters.
     """
+    engine = engine or select_clustering_engine(embeddings.shape[0])
+    if engine.chooses_n_clusters:
+        try:
+            cluster_assignments, score, _, seconds = _fit_clustering(engine, embeddings, None)
+            n_clusters = int(np.max(cluster_assignments)) + 1
+            logger.info("Clustering found %d clusters: silhouette score %.3f, time %.2fs", n_clusters, score, seconds)
+            return cluster_assignments, score, n_clusters
+        except NotEnoughDatasetsError:
+            logger.info("%s found fewer than 2 clusters, choosing the number of clusters by silhouette score",
+                        type(engine).__name__)
+            engine = select_kmeans_engine(embeddings.shape[0])
+
+    if n_jobs is None:
+        n_jobs = CLUSTERING_N_JOBS if embeddings.shape[0] >= CLUSTERING_PARALLEL_MIN_DATASETS else 1
+    n_clusters_range = list(range(2, min(CLUSTERING_MAX_CLUSTERS, embeddings.shape[0])))
+    if not n_clusters_range:
+        raise NotEnoughDatasetsError(f"Cannot extract clusters for {embeddings.shape[0]} datasets")
+
     best_clustering = (None, -1, 0)
-    for n_cluster in range(2, min(20, embeddings.shape[0])):
-        cluster_assignments, silhouette_score = cluster(embeddings, n_cluster)
-        if silhouette_score > best_clustering[1]:
-            best_clustering = (cluster_assignments,
-                               silhouette_score, n_cluster)
+    not_improved = 0
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for wave in chunked(n_clusters_range, n_jobs):
+            results = parallel(delayed(_fit_clustering)(engine, embeddings, n_cluster) for n_cluster in wave)
+            for n_cluster, (cluster_assignments, score, _, seconds) in zip(wave, results):
+                logger.info("Clustering with %d clusters: silhouette score %.3f, time %.2fs",
+                            n_cluster, score, seconds)
+                if score > best_clustering[1]:
+                    best_clustering = (cluster_assignments, score, n_cluster)
+                    not_improved = 0
+                else:
+                    not_improved += 1
+            if not_improved >= CLUSTERING_EARLY_STOPPING_PATIENCE:
+                logger.debug(f"Silhouette score hasn't improved for {not_improved} numbers of clusters, stopping")
+                break
 
     return best_clustering
 
@@ -127,7 +211,6 @@ def auto_cluster(embeddings: spmatrix) -> Tuple[List[int], np.ndarray]:
 if __name__ == "__main__":
     from src.ingestion.download_geo_datasets import download_geo_datasets
     from src.analysis.vectorize_datasets import vectorize_datasets
-    import time
 
     SVD_COMPONENTS = 15
     N_CLUSTERS = 10
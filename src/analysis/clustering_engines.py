@@ -0,0 +1,101 @@
+from abc import ABC, abstractmethod
+from typing import Tuple
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans, HDBSCAN
+
+from src.config import config
+from src.config.config import CLUSTERING_MINIBATCH_SIZE, CLUSTERING_HDBSCAN_MIN_CLUSTER_SIZE
+
+
+class ClusteringEngine(ABC):
+    """
+    Algorithm used to cluster the vector representations of datasets.
+    Every dataset must be assigned to a cluster, cluster labels are 0, ..., n_clusters - 1.
+    """
+    # Whether the engine chooses the number of clusters itself
+    chooses_n_clusters = False
+
+    @abstractmethod
+    def fit_predict(self, embeddings, n_clusters: int | None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Clusters the datasets.
+
+        :param embeddings: Vector representations of the datasets.
+        :param n_clusters: Number of clusters to create, ignored by engines that choose it themselves.
+        :return: Cluster assignments for each dataset and cluster centroids.
+        """
+
+
+class KMeansEngine(ClusteringEngine):
+    def fit_predict(self, embeddings, n_clusters):
+        clusterer = KMeans(n_clusters=n_clusters, n_init="auto", random_state=42)
+        return clusterer.fit_predict(embeddings), clusterer.cluster_centers_
+
+
+class MiniBatchKMeansEngine(ClusteringEngine):
+    """
+    K-means fitted on mini-batches, time and memory per iteration don't depend on the number of datasets.
+    """
+
+    def __init__(self, batch_size: int = CLUSTERING_MINIBATCH_SIZE):
+        self.batch_size = batch_size
+
+    def fit_predict(self, embeddings, n_clusters):
+        clusterer = MiniBatchKMeans(n_clusters=n_clusters, batch_size=self.batch_size, n_init="auto",
+                                    random_state=42)
+        return clusterer.fit_predict(embeddings), clusterer.cluster_centers_
+
+
+class HDBSCANEngine(ClusteringEngine):
+    """
+    Density-based clustering, which chooses the number of clusters itself.
+    Datasets that HDBSCAN considers noise are assigned to the cluster with the closest centroid.
+    When HDBSCAN finds fewer than 2 clusters, auto_cluster falls back to k-means.
+    """
+    chooses_n_clusters = True
+
+    def __init__(self, min_cluster_size: int = CLUSTERING_HDBSCAN_MIN_CLUSTER_SIZE):
+        self.min_cluster_size = min_cluster_size
+
+    def fit_predict(self, embeddings, n_clusters=None):
+        embeddings = embeddings.toarray() if hasattr(embeddings, "toarray") else np.asarray(embeddings)
+        cluster_assignments = HDBSCAN(min_cluster_size=self.min_cluster_size).fit_predict(embeddings)
+        cluster_labels = np.unique(cluster_assignments[cluster_assignments >= 0])
+        if len(cluster_labels) < 2:
+            raise ValueError(f"HDBSCAN found {len(cluster_labels)} clusters")
+        centers = np.array([embeddings[cluster_assignments == label].mean(axis=0) for label in cluster_labels])
+        noise = cluster_assignments < 0
+        if noise.any():
+            distances = ((embeddings[noise, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2).sum(axis=2)
+            cluster_assignments[noise] = cluster_labels[np.argmin(distances, axis=1)]
+        return np.searchsorted(cluster_labels, cluster_assignments), centers
+
+
+CLUSTERING_ENGINES = {
+    "kmeans": KMeansEngine,
+    "minibatch_kmeans": MiniBatchKMeansEngine,
+    "hdbscan": HDBSCANEngine,
+}
+
+
+def select_kmeans_engine(n_datasets: int) -> ClusteringEngine:
+    """
+    Returns mini-batch k-means for large jobs and k-means for others.
+
+    :param n_datasets: Number of datasets to cluster.
+    """
+    return MiniBatchKMeansEngine() if n_datasets >= config.minibatch_min_datasets else KMeansEngine()
+
+
+def select_clustering_engine(n_datasets: int) -> ClusteringEngine:
+    """
+    Returns the clustering engine set in the [clustering] section of config.ini.
+    With engine = auto, the engine is chosen by select_kmeans_engine.
+
+    :param n_datasets: Number of datasets to cluster.
+    """
+    engine = config.clustering_engine
+    if engine == "auto":
+        return select_kmeans_engine(n_datasets)
+    return CLUSTERING_ENGINES[engine]()
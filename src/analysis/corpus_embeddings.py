@@ -0,0 +1,153 @@
+"""
+Corpus-wide embeddings of all cached GEO series built offline, see src/analysis/build_corpus_embeddings.py.
+Jobs gather the rows of their datasets instead of vectorizing them, so that all jobs share one embedding space.
+
+Files of corpus embeddings saved at <index_path>:
+- <index_path>.keys.json, <index_path>.npy, <index_path>.hnsw: ANNIndex over the SVD-reduced embeddings
+- <index_path>.counts.npz: counts of the vocabulary tokens in every series
+- <index_path>.model.pkl: EmbeddingSpace, with the map of stems to tokens fitted on the sample, and fitted SVD
+"""
+
+import logging
+import pickle
+import random
+from os import path
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse
+from more_itertools import chunked
+from sklearn.decomposition import TruncatedSVD
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import Normalizer
+
+from src.analysis.vectorize_datasets import vectorize_datasets_with_space, vectorize_more_datasets
+from src.config import config
+from src.config.config import CORPUS_EMBEDDINGS_MIN_COVERAGE
+from src.model.geo_dataset import GEODataset
+from src.utils.ann_index import ANNIndex
+from src.utils.lazy import lazy_resource
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusEmbeddings:
+    def __init__(self, index: ANNIndex, counts, space, svd):
+        self.index = index
+        self.counts = counts
+        self.space = space
+        self.svd = svd
+
+    @classmethod
+    def load(cls, index_path: str) -> "CorpusEmbeddings":
+        with open(f"{index_path}.model.pkl", "rb") as f:
+            space, svd = pickle.load(f)
+        return cls(
+            ANNIndex.load(index_path, mmap=True),
+            scipy.sparse.load_npz(f"{index_path}.counts.npz"),
+            space,
+            svd,
+        )
+
+    def gather(self, datasets: List[GEODataset]) -> Tuple[np.ndarray, List[str], scipy.sparse.csr_matrix] | None:
+        """
+        Gathers the SVD-reduced embeddings and counts of the datasets.
+        Datasets that are not in the corpus are embedded into the corpus space.
+
+        :return: Tuple (SVD-reduced embeddings, Vocabulary, Counts) in the order of datasets or None
+        if too few datasets are in the corpus or the missing ones can't be embedded.
+        """
+        rows = [self.index.key_to_row.get(dataset.id) for dataset in datasets]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if len(datasets) - len(missing) < CORPUS_EMBEDDINGS_MIN_COVERAGE * len(datasets):
+            logger.info(f"Only {len(datasets) - len(missing)} of {len(datasets)} datasets are in the corpus")
+            return None
+
+        found = [i for i, row in enumerate(rows) if row is not None]
+        found_rows = np.array([rows[i] for i in found], dtype=np.int64)
+        embeddings_svd = [np.asarray(self.index.vectors[found_rows])]
+        counts = [self.counts[found_rows]]
+        if missing:
+            vectorized = vectorize_more_datasets([datasets[i] for i in missing], self.space)
+            if vectorized is None:
+                return None
+            missing_embeddings, missing_counts = vectorized
+            embeddings_svd.append(self.svd.transform(missing_embeddings))
+            counts.append(missing_counts)
+        # Rows are gathered as found + missing, restore the order of datasets
+        order = np.argsort(np.array(found + missing))
+        return np.vstack(embeddings_svd)[order], self.space.vocabulary, scipy.sparse.vstack(counts).tocsr()[order]
+
+
+@lazy_resource
+def get_corpus_embeddings() -> CorpusEmbeddings | None:
+    """
+    :return: Corpus-wide embeddings or None if they are disabled or haven't been built.
+    """
+    if not config.use_corpus_embeddings or not path.isfile(f"{config.corpus_index_path}.model.pkl"):
+        return None
+    corpus_embeddings = CorpusEmbeddings.load(config.corpus_index_path)
+    if getattr(corpus_embeddings.space, "stems_tokens_map", None) is None:
+        logger.warning("Corpus embeddings were built without the map of stems to tokens, "
+                       "rebuild them with src/analysis/build_corpus_embeddings.py")
+        return None
+    return corpus_embeddings
+
+
+def build_corpus_embeddings(datasets: Callable[[], Iterable[GEODataset]], n_datasets: int, index_path: str,
+                            svd_components: int, sample_size: int, chunk_size: int):
+    """
+    Fits the vectorization and the SVD on a random sample of the datasets and embeds all of them.
+    The datasets are iterated twice, once to sample and once to embed, only the sample is kept in memory.
+
+    :param datasets: Function returning a new iterator over the datasets on every call.
+    :param n_datasets: Number of datasets.
+    :param index_path: Path to save the embeddings to.
+    :param svd_components: Number of SVD dimensions.
+    :param sample_size: Number of datasets the vectorization and the SVD are fitted on.
+    :param chunk_size: Number of datasets embedded at once.
+    """
+    logger.info(f"Sampling {min(sample_size, n_datasets)} of {n_datasets} datasets")
+    sample = _reservoir_sample(datasets(), sample_size)
+    sample_embeddings, _, _, space = vectorize_datasets_with_space(sample)
+    if space is None:
+        raise ValueError("The sample is vectorized in the streaming mode, use a smaller sample size")
+    svd = make_pipeline(
+        TruncatedSVD(n_components=svd_components, random_state=42),
+        Normalizer(copy=False),
+    )
+    svd.fit(sample_embeddings)
+    logger.info(f"Explained variance of the SVD step: {svd[0].explained_variance_ratio_.sum() * 100:.1f}%")
+
+    accessions = []
+    embeddings_svd = []
+    counts = []
+    n_embedded = 0
+    for chunk in chunked(datasets(), chunk_size):
+        vectorized = vectorize_more_datasets(chunk, space)
+        if vectorized is None:
+            raise RuntimeError("The embeddings backend became unavailable")
+        chunk_embeddings, chunk_counts = vectorized
+        accessions.extend(dataset.id for dataset in chunk)
+        embeddings_svd.append(svd.transform(chunk_embeddings))
+        counts.append(chunk_counts)
+        n_embedded += len(chunk)
+        logger.info(f"Embedded {n_embedded} of {n_datasets} datasets")
+
+    ANNIndex.build(accessions, np.vstack(embeddings_svd)).save(index_path)
+    scipy.sparse.save_npz(f"{index_path}.counts.npz", scipy.sparse.vstack(counts).tocsr())
+    with open(f"{index_path}.model.pkl", "wb") as f:
+        pickle.dump((space, svd), f)
+
+
+def _reservoir_sample(items: Iterable, k: int) -> List:
+    rng = random.Random(42)
+    sample = []
+    for i, item in enumerate(items):
+        if i < k:
+            sample.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                sample[j] = item
+    return sample
@@ -0,0 +1,114 @@
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+from sklearn.manifold import TSNE
+from sklearn.neighbors import NearestNeighbors
+
+from src.config import config, logger
+from src.config.config import LAYOUT_PERPLEXITY, LAYOUT_TRANSFORM_NEIGHBORS, LAYOUT_FFT_MIN_DATASETS
+
+
+class LayoutEngine(ABC):
+    """
+    Algorithm used to place the datasets in 2D for visualization.
+    A fitted engine can place new datasets into the existing layout without moving the fitted ones.
+    """
+
+    def __init__(self, n_jobs: int = 1):
+        self.n_jobs = min(n_jobs, os.cpu_count() or 1)
+
+    @abstractmethod
+    def fit_transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        :param embeddings: Vector representations of the datasets.
+        :return: 2D coordinates of the datasets.
+        """
+
+    @abstractmethod
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Places new datasets into the layout created by fit_transform.
+
+        :param embeddings: Vector representations of the new datasets.
+        :return: 2D coordinates of the new datasets.
+        """
+
+
+class TSNELayout(LayoutEngine):
+    """
+    Barnes-Hut t-SNE from scikit-learn. New datasets are placed at the distance-weighted
+    mean position of their nearest fitted datasets.
+    """
+
+    def fit_transform(self, embeddings):
+        tsne = TSNE(n_components=2, perplexity=min(LAYOUT_PERPLEXITY, len(embeddings) - 1), init="pca",
+                    n_jobs=self.n_jobs, random_state=42)
+        self.positions = tsne.fit_transform(embeddings)
+        self.neighbors = NearestNeighbors(n_neighbors=min(LAYOUT_TRANSFORM_NEIGHBORS, len(embeddings)))
+        self.neighbors.fit(embeddings)
+        return self.positions
+
+    def transform(self, embeddings):
+        distances, indices = self.neighbors.kneighbors(embeddings)
+        weights = 1 / np.maximum(distances, 1e-12)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum("ij,ijk->ik", weights, self.positions[indices])
+
+
+class OpenTSNELayout(LayoutEngine):
+    """
+    FFT-accelerated t-SNE from openTSNE, which scales linearly with the number of datasets.
+    """
+
+    def fit_transform(self, embeddings):
+        from openTSNE import TSNE as OpenTSNE
+
+        tsne = OpenTSNE(n_components=2, perplexity=min(LAYOUT_PERPLEXITY, len(embeddings) - 1),
+                        initialization="pca", negative_gradient_method="fft", n_jobs=self.n_jobs, random_state=42)
+        self.embedding = tsne.fit(np.asarray(embeddings))
+        return np.asarray(self.embedding)
+
+    def transform(self, embeddings):
+        return np.asarray(self.embedding.transform(np.asarray(embeddings)))
+
+
+class UMAPLayout(LayoutEngine):
+    def fit_transform(self, embeddings):
+        from umap import UMAP
+
+        self.umap = UMAP(n_components=2, n_neighbors=min(15, len(embeddings) - 1), init="pca",
+                         n_jobs=self.n_jobs)
+        return self.umap.fit_transform(embeddings)
+
+    def transform(self, embeddings):
+        return self.umap.transform(embeddings)
+
+
+LAYOUT_ENGINES = {
+    "tsne": TSNELayout,
+    "opentsne": OpenTSNELayout,
+    "umap": UMAPLayout,
+}
+
+
+def select_layout_engine(n_datasets: int) -> LayoutEngine:
+    """
+    Returns the layout engine set in the [layout] section of config.ini.
+    With engine = auto, large jobs are laid out with openTSNE if it is installed and others with scikit-learn t-SNE.
+    Engines whose package is not installed fall back to scikit-learn t-SNE.
+
+    :param n_datasets: Number of datasets to lay out.
+    """
+    engine = config.layout_engine
+    if engine == "auto":
+        engine = "opentsne" if n_datasets >= LAYOUT_FFT_MIN_DATASETS else "tsne"
+    package = {"opentsne": "openTSNE", "umap": "umap"}.get(engine)
+    if package:
+        try:
+            __import__(package)
+        except ImportError:
+            if config.layout_engine != "auto":
+                logger.warning(f"{package} is not installed, falling back to scikit-learn t-SNE")
+            engine = "tsne"
+    return LAYOUT_ENGINES[engine](n_jobs=config.layout_threads)
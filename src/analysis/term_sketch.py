@@ -0,0 +1,50 @@
+import heapq
+from operator import itemgetter
+from typing import Iterable, List, Tuple
+
+
+class HeavyHittersSketch:
+    """
+    Space-Saving sketch of the most frequent items in a stream with bounded memory.
+    At most 2 * capacity items are monitored at any time. The counts are overestimates of the true counts,
+    every item that is not monitored occurred at most `floor` times.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    def update(self, items: Iterable):
+        """
+        Adds one occurrence of each item.
+        """
+        for item in items:
+            if item in self.counts:
+                self.counts[item] += 1
+            else:
+                # The item might have been evicted before, so it could have occurred up to floor times
+                self.counts[item] = self.floor + 1
+                self.errors[item] = self.floor
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        """
+        Keeps only capacity items with the highest counts. Pruning in batches keeps updates O(1) amortized.
+        """
+        kept = heapq.nlargest(self.capacity + 1, self.counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, kept[-1][1])
+        kept = kept[:-1]
+        self.counts = dict(kept)
+        self.errors = {item: self.errors[item] for item, _ in kept}
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def top(self, k: int) -> List[Tuple[object, int]]:
+        """
+        :return: Up to k (item, estimated count) pairs with the highest counts.
+        """
+        return heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
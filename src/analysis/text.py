@@ -1,41 +1,56 @@
-import concurrent
-import concurrent.futures
 import logging
-import multiprocessing
+from collections import Counter
 from itertools import chain
-from math import ceil
-from threading import Lock
+from numbers import Integral
 
 import nltk
 import numpy as np
 import pandas as pd
-import spacy
 from gensim.models import Word2Vec
-from more_itertools import sliced
 from nltk import WordNetLemmatizer, SnowballStemmer
 from nltk.corpus import wordnet, stopwords
 from nltk.probability import FreqDist
+from scipy.sparse import vstack
+from sklearn.feature_extraction import FeatureHasher
 from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
 
+from src.analysis.chunking import parallel_collect_chunks
+from src.analysis.term_sketch import HeavyHittersSketch
+from src.analysis.word2vec_model import load_pretrained_word2vec, pretrained_tokens_embeddings
+from src.config import config
 from src.config.config import WORD2VEC_EMBEDDINGS_LENGTH, WORD2VEC_WINDOW, WORD2VEC_EPOCHS, EMBEDDINGS_CHUNK_SIZE, \
-    EMBEDDINGS_SENTENCE_OVERLAP
-from src.services.embeddings_service import is_embeddings_service_ready, is_texts_embeddings_available, \
-    fetch_texts_embedding, fetch_tokens_embeddings
-
-NLP = spacy.load("en_core_web_sm")
+    EMBEDDINGS_SENTENCE_OVERLAP, WORD2VEC_MIN_COVERAGE, VECTOR_STREAMING_CHUNK_SIZE, VECTOR_HASHING_FEATURES, \
+    VECTOR_SKETCH_CAPACITY
+from src.services.embeddings_service import get_embeddings_client
+from src.services.local_embeddings import get_local_embedder
+from src.utils.lazy import lazy_resource
 
 logger = logging.getLogger(__name__)
 
+
+@lazy_resource
+def get_nlp():
+    import spacy
+
+    return spacy.load("en_core_web_sm")
+
+
 # Ensure that modules are downloaded in advance
 # nltk averaged_perceptron_tagger required for nltk.pos_tag
 # nltk punkt required for word_tokenize
 # nltk stopwords
 # nltk wordnet
-NLTK_STOP_WORDS_SET = set(stopwords.words('english'))
+@lazy_resource
+def get_stop_words():
+    return set(stopwords.words('english'))
+
 
-# Lock to support multithreading for NLTK
-# See https://github.com/nltk/nltk/issues/1576
-NLTK_LOCK = Lock()
+@lazy_resource
+def get_lemmatizer():
+    # Load wordnet once in advance to support multithreading for NLTK
+    # See https://github.com/nltk/nltk/issues/1576
+    wordnet.ensure_loaded()
+    return WordNetLemmatizer()
 
 
 def vectorize_corpus(df, max_features, min_df, max_df, test=False):
@@ -46,47 +61,145 @@ def vectorize_corpus(df, max_features, min_df, max_df, test=False):
     :param min_df: Ignore tokens with frequency lower than given threshold
     :param max_df: Ignore tokens with frequency higher than given threshold
     :param test:
-    :return: Return list of list of sentences for each paper, tokens, and counts matrix
+    :return: Return list of list of sentences for each paper, tokens, counts matrix, and map of stems to tokens
     """
-    papers_sentences_corpus = build_stemmed_corpus(df)
+    papers_stemmed_sentences = _stem_papers(df)
+    stems_tokens_map = _build_stems_to_tokens_map(chain(*chain(*papers_stemmed_sentences)))
+    papers_sentences_corpus = _substitute_stems(papers_stemmed_sentences, stems_tokens_map)
     logger.debug(f'Vectorize corpus of {len(df)} papers')
-    counts = None
-    while counts is None:
-        try:
-            vectorizer = CountVectorizer(
-                min_df=min_df,
-                max_df=max_df if not test else 1.0,
-                max_features=max_features,
-                preprocessor=lambda t: t,
-                tokenizer=lambda t: t
-            )
-            counts = vectorizer.fit_transform([list(chain(*sentences)) for sentences in papers_sentences_corpus])
-        except:
-            # Workaround for exception After pruning, no terms remain.
-            logger.debug(f'Failed to build counts for vector for min_df={min_df}, max_df={max_df}, adjusting')
-            min_df = max(0.0, min_df - 0.1)
-            max_df = min(1.0, max_df + 0.1)
+    papers_tokens = [list(chain(*sentences)) for sentences in papers_sentences_corpus]
+    corpus_tokens = _select_vocabulary(papers_tokens, max_features, min_df, max_df if not test else 1.0)
+    counts = _count_vocabulary_tokens(papers_tokens, corpus_tokens)
     logger.debug(f'Vectorized corpus size {counts.shape}')
     tokens_counts = np.asarray(np.sum(counts, axis=0)).reshape(-1)
     tokens_freqs = tokens_counts / len(df)
     logger.debug(f'Tokens frequencies min={tokens_freqs.min()}, max={tokens_freqs.max()}, '
                  f'mean={tokens_freqs.mean()}, std={tokens_freqs.std()}')
-    corpus_tokens = vectorizer.get_feature_names_out().tolist()
     corpus_tokens_set = set(corpus_tokens)
     # Filter tokens left after vectorization
     filtered_corpus = [
         [[t for t in sentence if t in corpus_tokens_set] for sentence in paper_sentences]
         for paper_sentences in papers_sentences_corpus
     ]
-    return filtered_corpus, corpus_tokens, counts
+    return filtered_corpus, corpus_tokens, counts, stems_tokens_map
 
 
-# Convert pos_tag output to WordNetLemmatizer tags
-try:
-    NLTK_LOCK.acquire()
-    NLTK_POS_TAG_TO_WORDNET = dict(JJ=wordnet.ADJ, NN=wordnet.NOUN, VB=wordnet.VERB, RB=wordnet.ADV)
-finally:
-    NLTK_LOCK.release()
+def _count_vocabulary_tokens(papers_tokens, vocabulary):
+    vectorizer = CountVectorizer(
+        vocabulary=vocabulary,
+        preprocessor=lambda t: t,
+        tokenizer=lambda t: t
+    )
+    return vectorizer.transform(papers_tokens)
+
+
+def count_vocabulary_tokens(df, vocabulary, stems_tokens_map):
+    """
+    Counts the tokens of an existing vocabulary in papers, tokenized in the same way as in vectorize_corpus.
+    :param df: papers dataframe
+    :param vocabulary: Tokens returned by vectorize_corpus
+    :param stems_tokens_map: Map of stems to tokens returned by vectorize_corpus, the map of the papers
+    would replace stems with other tokens than the vocabulary has
+    :return: Counts matrix
+    """
+    papers_tokens = [list(chain(*sentences)) for sentences in build_stemmed_corpus(df, stems_tokens_map)]
+    return _count_vocabulary_tokens(papers_tokens, vocabulary)
+
+
+def _select_vocabulary(papers_tokens, max_features, min_df, max_df):
+    """
+    Selects the vocabulary in the same way as CountVectorizer with min_df, max_df and max_features, but
+    computes document frequencies only once. Tokens with equal counts at the max_features cutoff are kept
+    alphabetically, CountVectorizer keeps them in an unspecified order. When no terms remain after pruning,
+    thresholds are loosened until some terms remain.
+    :param papers_tokens: List of tokens for each paper
+    :return: Alphabetically sorted list of selected tokens
+    """
+    n_docs = len(papers_tokens)
+    tokens_doc_freqs = Counter()
+    tokens_total_counts = Counter()
+    for tokens in papers_tokens:
+        tokens_total_counts.update(tokens)
+        tokens_doc_freqs.update(set(tokens))
+    if not tokens_doc_freqs:
+        raise ValueError('Empty vocabulary, papers contain no tokens')
+
+    while True:
+        min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+        max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+        tokens = [t for t, doc_freq in tokens_doc_freqs.items() if min_doc_count <= doc_freq <= max_doc_count]
+        if tokens:
+            break
+        # Workaround for After pruning, no terms remain.
+        logger.debug(f'No tokens left for min_df={min_df}, max_df={max_df}, adjusting')
+        min_df = max(0.0, min_df - 0.1)
+        max_df = min(1.0, max_df + 0.1)
+
+    if max_features is not None and len(tokens) > max_features:
+        # Keep the most frequent tokens
+        tokens = sorted(tokens, key=lambda t: (-tokens_total_counts[t], t))[:max_features]
+    return sorted(tokens)
+
+
+def vectorize_corpus_streaming(df, max_features, min_df, max_df, chunk_size=VECTOR_STREAMING_CHUNK_SIZE,
+                               n_features=VECTOR_HASHING_FEATURES, sketch_capacity=VECTOR_SKETCH_CAPACITY):
+    """
+    Create vectorization for papers in df for very large corpora.
+    Papers are stemmed and hashed in chunks, so only one chunk of tokenized text is kept in memory.
+    Instead of a fitted vocabulary, document frequencies of the most common stems are estimated
+    with a heavy hitters sketch, and their hashed columns are selected as the vocabulary.
+    Unlike vectorize_corpus, stems are ranked by document frequency rather than by total count.
+    :param df: papers dataframe
+    :param max_features: Maximum vocabulary size
+    :param min_df: Ignore tokens with frequency lower than given threshold
+    :param max_df: Ignore tokens with frequency higher than given threshold
+    :param chunk_size: Number of papers tokenized at once
+    :param n_features: Number of hashed features
+    :param sketch_capacity: Number of stems tracked by the sketch
+    :return: Return None instead of the corpus, tokens, counts matrix, and map of stems to tokens
+    """
+    logger.debug(f'Vectorize corpus of {len(df)} papers in streaming mode')
+    hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+    sketch = HeavyHittersSketch(sketch_capacity)
+    # Shortest word for each tracked stem
+    stems_tokens_map = {}
+    hashed_counts = []
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        papers_stems = []
+        for sentences in _stem_papers(chunk):
+            stemmed = list(chain(*sentences))
+            papers_stems.append([stem for stem, _ in stemmed])
+            sketch.update(set(papers_stems[-1]))
+            for stem, token in stemmed:
+                if stem != token and (stem not in stems_tokens_map or len(stems_tokens_map[stem]) > len(token)):
+                    stems_tokens_map[stem] = token
+        hashed_counts.append(hasher.transform(papers_stems))
+        stems_tokens_map = {stem: token for stem, token in stems_tokens_map.items() if stem in sketch}
+        logger.debug(f'Processed {start + len(chunk)} papers')
+    hashed_counts = vstack(hashed_counts).tocsr()
+
+    n_docs = len(df)
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    stems = [stem for stem, doc_count in sketch.top(sketch_capacity) if min_doc_count <= doc_count <= max_doc_count]
+    if not stems:
+        # Workaround for After pruning, no terms remain.
+        stems = [stem for stem, _ in sketch.top(sketch_capacity)]
+    if not stems:
+        raise ValueError('Empty vocabulary, papers contain no tokens')
+    stems = sorted(stems[:max_features], key=lambda stem: stems_tokens_map.get(stem, stem))
+
+    columns = hasher.transform([[stem] for stem in stems]).indices
+    counts = hashed_counts[:, columns]
+    logger.debug(f'Vectorized corpus size {counts.shape}')
+    corpus_tokens = [stems_tokens_map.get(stem, stem) for stem in stems]
+    return None, corpus_tokens, counts, stems_tokens_map
+
+
+# Convert pos_tag output to WordNetLemmatizer tags,
+# values of wordnet.ADJ, wordnet.NOUN, wordnet.VERB and wordnet.ADV, which would load wordnet on access
+NLTK_POS_TAG_TO_WORDNET = dict(JJ='a', NN='n', VB='v', RB='r')
 
 
 def stemmed_tokens(sentence, min_token_length=3):
@@ -95,11 +208,11 @@ def stemmed_tokens(sentence, min_token_length=3):
     # Filter by length
     tokens = [t for t in tokens if len(t) >= min_token_length]
     # Ignore stop words, take into accounts nouns and adjectives, fix plural forms
-    lemmatizer = WordNetLemmatizer()
+    lemmatizer = get_lemmatizer()
     lemmas = [lemmatizer.lemmatize(token, pos=NLTK_POS_TAG_TO_WORDNET[pos[:2]])
               for token, pos in nltk.pos_tag(tokens)
               if len(token) >= min_token_length
-              and token not in NLTK_STOP_WORDS_SET
+              and token not in get_stop_words()
               and pos[:2] in NLTK_POS_TAG_TO_WORDNET]
     # Apply stemming to reduce word length,
     # later shortest word will be used as actual word
@@ -107,11 +220,22 @@ def stemmed_tokens(sentence, min_token_length=3):
     return [(stemmer.stem(token), token) for token in lemmas]
 
 
-def build_stemmed_corpus(df):
+def build_stemmed_corpus(df, stems_tokens_map=None):
     """ Tokenization is done in several steps
     1. Lemmatization:  Ignore stop words, take into accounts nouns and adjectives, fix plural forms
     2. Stemming: reducing words
-    3. Matching stems to the shortest existing lemma in texts
+    3. Matching stems to the shortest existing lemma in texts, or to the tokens of stems_tokens_map if it is given
+    """
+    papers_stemmed_sentences = _stem_papers(df)
+    if stems_tokens_map is None:
+        logger.info('Creating global shortest stem to word map')
+        stems_tokens_map = _build_stems_to_tokens_map(chain(*chain(*papers_stemmed_sentences)))
+    return _substitute_stems(papers_stemmed_sentences, stems_tokens_map)
+
+
+def _stem_papers(df):
+    """
+    :return: List of sentences for each paper, sentences are lists of (stem, token) pairs
     """
     logger.info(f'Building corpus from {len(df)} papers')
     logger.info(f'Processing stemming for all papers')
@@ -119,13 +243,15 @@ def build_stemmed_corpus(df):
     # NOTE: we split mesh and keywords by commas into separate sentences
     for i, (title, abstract) in enumerate(zip(df['title'], df['abstract'])):
         papers_stemmed_sentences.append([
-            stemmed_tokens(s) for s in NLP(f'{title}. {abstract}').sents
+            stemmed_tokens(s) for s in get_nlp()(f'{title}. {abstract}').sents
         ])
         if i % 100 == 1:
             logger.debug(f'Processed {i} papers')
     logger.debug(f'Done processing stemming for {len(df)} papers')
-    logger.info('Creating global shortest stem to word map')
-    stems_tokens_map = _build_stems_to_tokens_map(chain(*chain(*papers_stemmed_sentences)))
+    return papers_stemmed_sentences
+
+
+def _substitute_stems(papers_stemmed_sentences, stems_tokens_map):
     logger.info('Creating stemmed corpus')
     return [[[stems_tokens_map.get(s, s) for s, _ in stemmed] for stemmed in sentence]
             for sentence in papers_stemmed_sentences]
@@ -164,27 +290,116 @@ def _train_word2vec(corpus, corpus_tokens, vector_size=WORD2VEC_EMBEDDINGS_LENGT
     ])
 
 
-def embeddings(df, corpus, corpus_tokens, corpus_counts, test=False):
-    logger.debug(f"Embeddings service ready: {is_embeddings_service_ready()}")
+class EmbeddingSpace:
+    """
+    Vector space in which the papers of a job were embedded, used to embed more papers into the same space.
+    """
+
+    def __init__(self, vocabulary, stems_tokens_map, backend, tokens_embeddings=None, tfidf_transformer=None):
+        """
+        :param vocabulary: Tokens of the job
+        :param stems_tokens_map: Map of stems to tokens fitted on the job, used to count the tokens of more papers
+        :param backend: "service" or "local" for texts embeddings, "tokens" for TF-IDF weighted tokens embeddings
+        :param tokens_embeddings: Tokens embeddings of the "tokens" backend
+        :param tfidf_transformer: TF-IDF transformer fitted on the job's counts for the "tokens" backend
+        """
+        self.vocabulary = vocabulary
+        self.stems_tokens_map = stems_tokens_map
+        self.backend = backend
+        self.tokens_embeddings = tokens_embeddings
+        self.tfidf_transformer = tfidf_transformer
+
+    def embed(self, df):
+        """
+        Embeds papers into the space.
+        :param df: papers dataframe
+        :return: Tuple (papers embeddings, counts of the vocabulary tokens) or None if the backend is not available
+        """
+        counts = count_vocabulary_tokens(df, self.vocabulary, self.stems_tokens_map)
+        if self.backend == "tokens":
+            return _texts_embeddings(counts, self.tokens_embeddings, self.tfidf_transformer), counts
+
+        if self.backend == "service":
+            client = get_embeddings_client()
+            embedder = client if client.is_ready() and client.is_texts_embeddings_available() else None
+        else:
+            embedder = get_local_embedder()
+        if embedder is None:
+            return None
+        chunks, chunks_idx = _collect_chunks_for_embeddings(df)
+        texts_embs = embedder.fetch_texts_embedding(chunks)
+        if texts_embs is None:
+            return None
+        return chunks_to_text_embeddings(df, texts_embs, chunks_idx), counts
+
+
+def embeddings(df, corpus, corpus_tokens, corpus_counts, stems_tokens_map=None, test=False):
+    """
+    :param stems_tokens_map: Map of stems to tokens returned by vectorize_corpus, kept in the EmbeddingSpace
+    :return: Tuple (chunks or papers embeddings, chunks index or None, EmbeddingSpace or None for TF-IDF vectors)
+    """
+    client = get_embeddings_client()
+    # Readiness is cached by the client, so this doesn't cost round trips on every job
+    service_ready = not test and client.is_ready()
+    logger.debug(f"Embeddings service ready: {service_ready}")
     logger.debug(f"Test: {test}")
-    if not test and is_embeddings_service_ready():
+    if service_ready:
         # Start with text embeddings
-        if is_texts_embeddings_available():
-            logger.debug('Collecting chunks for embeddings')
-            data = [(pid, f'{title}. {abstract}')
-                    for pid, title, abstract in zip(df['id'], df['title'], df['abstract'])]
-            chunks, chunks_idx = collect_papers_chunks((data, EMBEDDINGS_CHUNK_SIZE, EMBEDDINGS_SENTENCE_OVERLAP))
-            logger.debug(f'Done collecting chunks for embeddings: {len(chunks)}')
-            return fetch_texts_embedding(chunks), chunks_idx
+        if client.is_texts_embeddings_available():
+            chunks, chunks_idx = _collect_chunks_for_embeddings(df)
+            texts_embs = client.fetch_texts_embedding(chunks)
+            logger.debug(f'Embeddings service batch latencies: {client.latency_summary()}')
+            if texts_embs is not None:
+                return texts_embs, chunks_idx, EmbeddingSpace(corpus_tokens, stems_tokens_map, "service")
 
         # Fallback to tokens embeddings
-        tokens_embs = fetch_tokens_embeddings(corpus_tokens)
+        tokens_embs = client.fetch_tokens_embeddings(corpus_tokens)
         if tokens_embs is not None:
-            return _texts_embeddings(corpus_counts, tokens_embs), None
-
-    logger.debug('Use to in-house word2vec')
-    tokens_embs = _train_word2vec(corpus, corpus_tokens, test=test)
-    return _texts_embeddings(corpus_counts, tokens_embs), None
+            tfidf_transformer = TfidfTransformer().fit(corpus_counts)
+            return _texts_embeddings(corpus_counts, tokens_embs, tfidf_transformer), None, \
+                EmbeddingSpace(corpus_tokens, stems_tokens_map, "tokens", tokens_embs, tfidf_transformer)
+
+    # In-process sentence embeddings when the service is down
+    local_embedder = get_local_embedder() if not test else None
+    if local_embedder is not None:
+        chunks, chunks_idx = _collect_chunks_for_embeddings(df)
+        texts_embs = local_embedder.fetch_texts_embedding(chunks)
+        if texts_embs is not None:
+            return texts_embs, chunks_idx, EmbeddingSpace(corpus_tokens, stems_tokens_map, "local")
+
+    tokens_embs = _pretrained_word2vec_embeddings(corpus_tokens) if not test else None
+    if tokens_embs is None and corpus is None:
+        # Corpus is not kept in the streaming mode, use TF-IDF vectors directly
+        logger.debug('Use TF-IDF vectors')
+        return TfidfTransformer().fit_transform(corpus_counts), None, None
+    if tokens_embs is None:
+        logger.debug('Use to in-house word2vec')
+        tokens_embs = _train_word2vec(corpus, corpus_tokens, test=test)
+    tfidf_transformer = TfidfTransformer().fit(corpus_counts)
+    return _texts_embeddings(corpus_counts, tokens_embs, tfidf_transformer), None, \
+        EmbeddingSpace(corpus_tokens, stems_tokens_map, "tokens", tokens_embs, tfidf_transformer)
+
+
+def _pretrained_word2vec_embeddings(corpus_tokens):
+    """
+    Looks up tokens embeddings in the corpus-wide word2vec model trained with src.analysis.train_word2vec.
+    :return: Tokens embeddings or None if the model is not available or doesn't cover the corpus.
+    """
+    wv = load_pretrained_word2vec(config.word2vec_model_path)
+    if wv is None:
+        return None
+    logger.debug('Use pretrained corpus-wide word2vec')
+    return pretrained_tokens_embeddings(wv, corpus_tokens, WORD2VEC_MIN_COVERAGE)
+
+
+def _collect_chunks_for_embeddings(df):
+    logger.debug('Collecting chunks for embeddings')
+    texts = [f'{title}. {abstract}' for title, abstract in zip(df['title'], df['abstract'])]
+    chunks, chunks_idx = parallel_collect_chunks(
+        df['id'].tolist(), texts, EMBEDDINGS_CHUNK_SIZE, EMBEDDINGS_SENTENCE_OVERLAP
+    )
+    logger.debug(f'Done collecting chunks for embeddings: {len(chunks)}')
+    return chunks, chunks_idx
 
 
 def chunks_to_text_embeddings(df, chunks_embeddings, chunks_idx):
@@ -200,16 +415,16 @@ def chunks_to_text_embeddings(df, chunks_embeddings, chunks_idx):
     return text_embeddings
 
 
-def _texts_embeddings(corpus_counts, tokens_embeddings):
+def _texts_embeddings(corpus_counts, tokens_embeddings, tfidf_transformer):
     """
     Computes texts embeddings as TF-IDF weighted average of words embeddings.
     :param corpus_counts: Vectorized papers matrix
     :param tokens_embeddings: Tokens word2vec embeddings
+    :param tfidf_transformer: Fitted TF-IDF transformer
     :return: numpy array [publications x embeddings]
     """
     logger.debug('Compute TF-IDF on tokens counts')
-    tfidf_transformer = TfidfTransformer()
-    tfidf = tfidf_transformer.fit_transform(corpus_counts)
+    tfidf = tfidf_transformer.transform(corpus_counts)
     logger.debug(f'TFIDF shape {tfidf.shape}')
 
     logger.debug('Compute text embeddings as TF-IDF weighted average of tokens embeddings')
@@ -218,92 +433,3 @@ def _texts_embeddings(corpus_counts, tokens_embeddings):
     ])
     logger.debug(f'Texts embeddings shape: {embeddings.shape}')
     return embeddings
-
-
-def get_chunks(text, max_tokens=128, overlap_sentences=1):
-    """
-    Split text into a list of overlapping chunks.
-
-    Args:
-        text (str): The text to split into chunks
-        max_tokens (int): Maximum number of tokens per chunk
-        overlap_sentences (int): Number of sentences to overlap between chunks
-
-    Returns:
-        list: List of text chunks
-    """
-
-    # Get all sentences
-    sentences = list(NLP(text).sents)
-
-    if not sentences:
-        return [text]
-
-    chunks = []
-    current_chunk_sentences = []
-    current_token_count = 0
-
-    for sentence in sentences:
-        # If adding this sentence exceeds max_tokens, create a new chunk
-        if current_token_count + len(sentence) > max_tokens and current_chunk_sentences:
-            # Join the sentences in the current chunk
-            chunk_text = ' '.join([s.text for s in current_chunk_sentences])
-            chunks.append(chunk_text)
-
-            # Keep the overlapping sentences for the next chunk
-            if overlap_sentences > 0:
-                overlap_size = min(overlap_sentences, len(current_chunk_sentences))
-                current_chunk_sentences = current_chunk_sentences[-overlap_size:]
-                current_token_count = sum(len(s) for s in current_chunk_sentences)
-            else:
-                current_chunk_sentences = []
-                current_token_count = 0
-
-        # Add the current sentence to the chunk
-        current_chunk_sentences.append(sentence)
-        current_token_count += len(sentence)
-
-    # Add the last chunk if there are any sentences left
-    if current_chunk_sentences:
-        chunk_text = ' '.join([s.text for s in current_chunk_sentences])
-        chunks.append(chunk_text)
-    return chunks
-
-
-def collect_papers_chunks(args):
-    batch, max_tokens, overlap_sentences = args
-    chunks = []
-    chunk_idx = []
-    for i, (pid, text) in enumerate(batch):
-        for chunk_id, chunk in enumerate(get_chunks(text, max_tokens, overlap_sentences)):
-            chunk_idx.append((pid, chunk_id))
-            chunks.append(chunk)
-        if i % 100 == 1:
-            logger.debug(f'Processed {i} papers')
-    return chunks, chunk_idx
-
-
-def parallel_collect_chunks(
-        pids,
-        texts,
-        max_tokens,
-        overlap_sentences=1,
-        max_workers=multiprocessing.cpu_count()
-):
-    chunks = []
-    chunk_idx = []
-
-    parallel_batches = [(b, max_tokens, overlap_sentences)
-                        for b in sliced(list(zip(pids, texts)), int(ceil(len(texts) / max_workers)))]
-
-    # Process texts in parallel processes
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks and wait for results
-        results = list(executor.map(collect_papers_chunks, parallel_batches))
-
-    # Combine results
-    for text_chunks, text_chunk_idx in results:
-        chunks.extend(text_chunks)
-        chunk_idx.extend(text_chunk_idx)
-    assert len(chunks) == len(chunk_idx)
-    return chunks, chunk_idx
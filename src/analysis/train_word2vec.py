@@ -0,0 +1,81 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+from os import path
+
+from gensim.models import Word2Vec
+
+from src.analysis.text import get_nlp, stemmed_tokens
+from src.analysis.word2vec_model import train_corpus_word2vec, update_corpus_word2vec, save_corpus_word2vec, \
+    load_trained_accessions
+from src.config import config, logger
+from src.ingestion.load_cached_datasets import load_cached_datasets
+
+
+def write_stemmed_corpus(datasets, corpus_file: str, batch_size: int = 64):
+    """
+    Writes the stemmed sentences of the datasets to a file, one sentence of space separated stems per line.
+    Datasets are tokenized in the same way as in vectorize_datasets.
+
+    :return: Accessions of the written datasets.
+    """
+    accessions = []
+    texts = []
+
+    def flush(f):
+        for doc in get_nlp().pipe(texts, batch_size=batch_size):
+            for sentence in doc.sents:
+                stems = [stem for stem, _ in stemmed_tokens(sentence)]
+                if stems:
+                    f.write(" ".join(stems) + "\n")
+        texts.clear()
+
+    with open(corpus_file, "w") as f:
+        for dataset in datasets:
+            accessions.append(dataset.id)
+            texts.append(f"{dataset.title}. {dataset.get_metadata_str()}")
+            if len(texts) == batch_size:
+                flush(f)
+            if len(accessions) % 1000 == 0:
+                logger.info(f"Tokenized {len(accessions)} datasets")
+        flush(f)
+    return accessions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Trains or updates the corpus-wide word2vec model over all cached GEO series.")
+    parser.add_argument("--model-path", default=config.word2vec_model_path)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--full", action="store_true",
+                        help="Retrain from scratch instead of updating the model with newly cached series")
+    args = parser.parse_args()
+
+    model_dir = path.dirname(args.model_path)
+    if model_dir:
+        os.makedirs(model_dir, exist_ok=True)
+    update = not args.full and path.isfile(args.model_path)
+    trained_accessions = load_trained_accessions(args.model_path) if update else set()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as new_corpus:
+        new_corpus_path = new_corpus.name
+    try:
+        new_accessions = write_stemmed_corpus(
+            load_cached_datasets(config.download_folder, exclude=trained_accessions), new_corpus_path)
+        if not new_accessions:
+            logger.info("No new cached series, the model is up to date")
+            return
+
+        if update:
+            model = update_corpus_word2vec(Word2Vec.load(args.model_path), new_corpus_path, args.workers)
+        else:
+            model = train_corpus_word2vec(new_corpus_path, args.workers)
+        save_corpus_word2vec(model, args.model_path, trained_accessions | set(new_accessions))
+        logger.info(f"Trained on {len(new_accessions)} new series, vocabulary size {len(model.wv)}")
+    finally:
+        os.remove(new_corpus_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 from scipy.sparse import spmatrix
 
-from src.analysis.text import vectorize_corpus, embeddings, chunks_to_text_embeddings
-from src.config.config import VECTOR_WORDS, VECTOR_MIN_DF, VECTOR_MAX_DF
+from src.analysis.text import vectorize_corpus, vectorize_corpus_streaming, embeddings, chunks_to_text_embeddings, \
+    EmbeddingSpace
+from src.config.config import VECTOR_WORDS, VECTOR_MIN_DF, VECTOR_MAX_DF, VECTOR_STREAMING_MIN_DATASETS
 from src.model.geo_dataset import GEODataset
+from src.utils.tracing import span
+
+
+def _datasets_df(datasets: List[GEODataset]) -> pd.DataFrame:
+    return pd.DataFrame(
+        dict(id=dataset.id, title=dataset.title, abstract=dataset.get_metadata_str())
+        for dataset in datasets
+    )
 
 
 def vectorize_datasets(datasets: List[GEODataset]) -> Tuple[spmatrix, List[str]]:
@@ -17,23 +27,48 @@ def vectorize_datasets(datasets: List[GEODataset]) -> Tuple[spmatrix, List[str]]
     :param datasets: Datasets to vectorize.
     :return: Tuple (Sparse matrix containing the tf-idf vectors of the datasets, Vocabulary of the datasets).
     """
-    df = pd.DataFrame(
-        dict(id=dataset.id, title=dataset.title, abstract=dataset.get_metadata_str())
-        for dataset in datasets
-    )
-    corpus, corpus_tokens, corpus_counts = vectorize_corpus(
-        df, max_features=VECTOR_WORDS, min_df=VECTOR_MIN_DF, max_df=VECTOR_MAX_DF, test=False
-    )
+    embeddings, corpus_tokens, corpus_counts, _ = vectorize_datasets_with_space(datasets)
+    return embeddings, corpus_tokens, corpus_counts
 
-    chunks_embeddings, chunks_idx = embeddings(
-        df, corpus, corpus_tokens, corpus_counts, test=False
-    )
-    return chunks_to_text_embeddings(df, chunks_embeddings, chunks_idx), corpus_tokens, corpus_counts
+
+def vectorize_datasets_with_space(datasets: List[GEODataset]) -> Tuple[spmatrix, List[str], spmatrix,
+                                                                        EmbeddingSpace | None]:
+    """
+    Same as vectorize_datasets, but also returns the space in which the datasets were embedded,
+    which can embed more datasets with vectorize_more_datasets. The space is None in the streaming mode.
+    """
+    df = _datasets_df(datasets)
+    # Very large jobs don't fit in memory with a fitted vocabulary
+    streaming = len(datasets) >= VECTOR_STREAMING_MIN_DATASETS
+    vectorize = vectorize_corpus_streaming if streaming else vectorize_corpus
+    with span("tokenize", items=len(datasets)):
+        corpus, corpus_tokens, corpus_counts, stems_tokens_map = vectorize(
+            df, max_features=VECTOR_WORDS, min_df=VECTOR_MIN_DF, max_df=VECTOR_MAX_DF
+        )
+
+    with span("embed", items=len(datasets)):
+        chunks_embeddings, chunks_idx, space = embeddings(
+            df, corpus, corpus_tokens, corpus_counts, stems_tokens_map, test=False
+        )
+    # Counts in the streaming mode are hashed, so the vocabulary can't count tokens of more datasets
+    space = space if not streaming else None
+    return chunks_to_text_embeddings(df, chunks_embeddings, chunks_idx), corpus_tokens, corpus_counts, space
+
+
+def vectorize_more_datasets(datasets: List[GEODataset], space: EmbeddingSpace) -> Tuple[np.ndarray, spmatrix] | None:
+    """
+    Embeds datasets into the space of previously vectorized datasets.
+
+    :param datasets: Datasets to vectorize.
+    :param space: Space returned by vectorize_datasets_with_space.
+    :return: Tuple (Embeddings of the datasets, Counts of the vocabulary tokens in the datasets)
+    or None if the embeddings backend of the space is not available.
+    """
+    return space.embed(_datasets_df(datasets))
 
 
 if __name__ == "__main__":
     from src.ingestion.download_geo_datasets import download_geo_datasets
-    import numpy as np
     from sklearn.metrics.pairwise import cosine_similarity
 
     datasets = download_geo_datasets(
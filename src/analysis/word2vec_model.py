@@ -0,0 +1,105 @@
+"""
+Corpus-wide word2vec model trained offline over all cached GEO series, see src/analysis/train_word2vec.py.
+The model is trained on word stems, so that it can be used regardless of which word each job maps a stem to.
+
+Files of a model saved at <model_path>:
+- <model_path>: full gensim model, required for incremental updates
+- <model_path>.kv: word vectors only, loaded read-only with mmap by the analysis
+- <model_path>.accessions.json: accessions of the series the model was trained on
+"""
+
+import json
+import logging
+from os import path
+
+import numpy as np
+from gensim.models import Word2Vec, KeyedVectors
+from nltk import SnowballStemmer
+
+from src.config.config import WORD2VEC_EMBEDDINGS_LENGTH, WORD2VEC_WINDOW, WORD2VEC_EPOCHS, WORD2VEC_MIN_COUNT
+
+logger = logging.getLogger(__name__)
+
+
+def train_corpus_word2vec(corpus_file: str, workers: int) -> Word2Vec:
+    """
+    Trains word2vec on a corpus file with one sentence of space separated stems per line.
+    """
+    logger.info(f'Training word2vec on {corpus_file} with {workers} workers')
+    return Word2Vec(
+        corpus_file=corpus_file, vector_size=WORD2VEC_EMBEDDINGS_LENGTH, window=WORD2VEC_WINDOW,
+        min_count=WORD2VEC_MIN_COUNT, workers=workers, epochs=WORD2VEC_EPOCHS, seed=42
+    )
+
+
+def update_corpus_word2vec(model: Word2Vec, corpus_file: str, workers: int) -> Word2Vec:
+    """
+    Continues training of the model on the sentences of new series, extending its vocabulary.
+    """
+    logger.info(f'Updating word2vec with {corpus_file} with {workers} workers')
+    model.workers = workers
+    model.build_vocab(corpus_file=corpus_file, update=True)
+    model.train(
+        corpus_file=corpus_file, total_examples=model.corpus_count, total_words=model.corpus_total_words,
+        epochs=model.epochs
+    )
+    return model
+
+
+def save_corpus_word2vec(model: Word2Vec, model_path: str, accessions):
+    model.save(model_path)
+    # Vectors are stored in a separate .npy file, so that they can always be loaded with mmap
+    model.wv.save(f'{model_path}.kv', separately=['vectors'])
+    with open(f'{model_path}.accessions.json', 'w') as f:
+        json.dump(sorted(accessions), f)
+
+
+def load_trained_accessions(model_path: str):
+    accessions_path = f'{model_path}.accessions.json'
+    if not path.isfile(accessions_path):
+        return set()
+    with open(accessions_path) as f:
+        return set(json.load(f))
+
+
+_vectors = {}
+
+
+def load_pretrained_word2vec(model_path: str) -> KeyedVectors | None:
+    """
+    Loads the word vectors of the corpus-wide model read-only with mmap, so that
+    the pages are shared between processes. The vectors are loaded once per process.
+
+    :return: Word vectors or None if the model hasn't been trained.
+    """
+    if model_path not in _vectors:
+        vectors_path = f'{model_path}.kv'
+        if path.isfile(vectors_path):
+            logger.debug(f'Loading pretrained word2vec from {vectors_path}')
+            _vectors[model_path] = KeyedVectors.load(vectors_path, mmap='r')
+        else:
+            _vectors[model_path] = None
+    return _vectors[model_path]
+
+
+def pretrained_tokens_embeddings(wv: KeyedVectors, corpus_tokens, min_coverage: float):
+    """
+    Looks up the embeddings of the corpus tokens in the pretrained model.
+    Each token is looked up as is and by its stem, missing tokens get zero embeddings.
+
+    :param wv: Pretrained word vectors.
+    :param corpus_tokens: Tokens of the job's corpus.
+    :param min_coverage: Minimal fraction of tokens that must be present in the model.
+    :return: numpy array [tokens x embeddings] or None if the coverage is too low.
+    """
+    stemmer = SnowballStemmer('english')
+    embeddings = np.zeros((len(corpus_tokens), wv.vector_size), dtype=np.float32)
+    found = 0
+    for i, token in enumerate(corpus_tokens):
+        key = token if token in wv.key_to_index else stemmer.stem(token)
+        if key in wv.key_to_index:
+            embeddings[i] = wv[key]
+            found += 1
+    coverage = found / len(corpus_tokens) if corpus_tokens else 0
+    logger.debug(f'Pretrained word2vec covers {coverage * 100:.1f}% of {len(corpus_tokens)} tokens')
+    return embeddings if coverage >= min_coverage else None
@@ -5,17 +5,21 @@ import os
 import os.path as path
 import pickle
 import uuid
+from functools import lru_cache
 
 from bokeh.embed import server_document
-from flask import Flask, render_template, request, abort, Blueprint, redirect
+from flask import Flask, render_template, request, abort, Blueprint, redirect, jsonify
 from flask_cors import CORS, cross_origin
 
 from src.analysis.analysis_result import AnalysisResult
 from src.analysis.analyzer import DatasetAnalyzer
 from src.config import config
+from src.config.config import SIMILAR_DATASETS_K, SIMILAR_DATASETS_MAX_K
 from src.exception.not_enough_datasets_error import NotEnoughDatasetsError
 from src.ingestion.get_pubmed_ids import get_pubmed_ids, get_pubmed_ids_esearch
 from src.mesh.mesh_vocabulary import build_mesh_lookup
+from src.utils.ann_index import ANNIndex
+from src.utils.lazy import lazy_resource, warmup
 from src.visualization.get_topic_table import get_topic_table
 from src.visualization.visualize_clusters import visualize_clusters_html
 
@@ -28,11 +32,16 @@ bp = Blueprint('app', __name__,
                static_folder="static")
 
 svd_dimensions = config.svd_dimensions
-mesh_lookup = build_mesh_lookup("desc2025.xml")
-ncbi_gene = {}
-with open("resources/gene_ontology_map.json") as f:
-    ncbi_gene = json.load(f)
-analyzer = DatasetAnalyzer(svd_dimensions, mesh_lookup, ncbi_gene)
+
+
+@lazy_resource
+def get_analyzer() -> DatasetAnalyzer:
+    mesh_lookup = build_mesh_lookup("desc2025.xml")
+    with open("resources/gene_ontology_map.json") as f:
+        ncbi_gene = json.load(f)
+    return DatasetAnalyzer(svd_dimensions, mesh_lookup, ncbi_gene)
+
+
 get_pubmed_ids = get_pubmed_ids if config.search_backend == "pubtrends" else get_pubmed_ids_esearch
 
 
@@ -50,6 +59,12 @@ def save_result(result):
     result.df.to_csv(f"completed_jobs/{job_id}_df.csv", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
     if result.samples:
         result.samples.to_csv(f"completed_jobs/{job_id}_samples.csv")
+    if result.embeddings is not None:
+        ANNIndex.build(result.df["id"].tolist(), result.embeddings).save(f"completed_jobs/{job_id}_index")
+    if result.trace is not None:
+        result.trace.save_json(f"completed_jobs/{job_id}_trace.json")
+        if config.chrome_trace:
+            result.trace.save_chrome_trace(f"completed_jobs/{job_id}_chrome_trace.json")
     return job_id
 
 
@@ -61,6 +76,52 @@ def load_result(job_id) -> AnalysisResult:
         return None
 
 
+def load_job_index(job_id) -> ANNIndex | None:
+    if not path.isfile(f"completed_jobs/{job_id}_index.keys.json"):
+        return None
+    return _load_job_index(job_id)
+
+
+# Only indices that exist are cached, a job's index may be saved after it was first requested
+@lru_cache(maxsize=32)
+def _load_job_index(job_id) -> ANNIndex:
+    return ANNIndex.load(f"completed_jobs/{job_id}_index")
+
+
+@lazy_resource
+def get_corpus_index() -> ANNIndex | None:
+    if not path.isfile(f"{config.corpus_index_path}.keys.json"):
+        return None
+    return ANNIndex.load(config.corpus_index_path, mmap=True)
+
+
+@bp.route("/similar", methods=["GET"])
+@cross_origin()
+def similar_datasets():
+    """
+    Returns the GEO series most similar to the given one, as JSON list of {"id", "similarity"} objects.
+    With job-id, the series are searched among the datasets of the job, otherwise in the corpus-wide index.
+    k, the number of returned series, must be between 1 and SIMILAR_DATASETS_MAX_K.
+    """
+    accession = request.args.get("accession")
+    if not accession:
+        abort(400)
+    try:
+        k = int(request.args.get("k", SIMILAR_DATASETS_K))
+    except ValueError:
+        abort(400)
+    if not 1 <= k <= SIMILAR_DATASETS_MAX_K:
+        abort(400)
+
+    job_id = request.args.get("job-id")
+    index = load_job_index(job_id) if job_id else get_corpus_index()
+    if index is None or accession not in index:
+        abort(404)
+
+    return jsonify([{"id": neighbour, "similarity": similarity}
+                    for neighbour, similarity in index.query_key(accession, k)])
+
+
 @bp.route("/visualize", methods=["GET"])
 @cross_origin()
 def visualize_completed_job():
@@ -123,7 +184,12 @@ def visualize_pubmed_ids():
         abort(400)
 
     try:
-        result = analyzer.analyze_paper_datasets(pubmed_ids)
+        # Jobs that refine a previous job only analyze the changed datasets
+        previous_result = load_result(request.form["job-id"]) if request.form.get("job-id") else None
+        if previous_result is not None:
+            result = get_analyzer().analyze_paper_datasets_incremental(pubmed_ids, previous_result)
+        else:
+            result = get_analyzer().analyze_paper_datasets(pubmed_ids)
         n_datasets = len(result.df)
 
         job_id = save_result(result)
@@ -179,5 +245,8 @@ if __name__ == "__main__":
     debug_env = os.environ.get("FLASK_DEBUG", "").lower()
     debug = debug_env in ("1", "true", "yes", "on")
 
+    # Load the models before accepting requests
+    warmup()
+
     # Start the built-in development server
     app.run(host=host, port=port, debug=debug, threaded=True)
@@ -1,4 +1,5 @@
 import configparser
+import os
 
 #############################
 ## Embeddings settings #####
@@ -12,6 +13,28 @@ EMBEDDINGS_SENTENCE_OVERLAP = 0
 EMBEDDINGS_QUESTIONS_CHUNK_SIZE = 64
 EMBEDDINGS_QUESTIONS_SENTENCE_OVERLAP = 1
 
+# Number of processes splitting texts into chunks
+EMBEDDINGS_CHUNKING_WORKERS = os.cpu_count()
+
+# Number of texts sent to a chunking process at once
+EMBEDDINGS_CHUNKING_BATCH_SIZE = 64
+
+# Maximum number of texts or tokens sent to the embeddings service in one request
+EMBEDDINGS_SERVICE_BATCH_SIZE = 64
+
+# Number of batches sent to the embeddings service concurrently
+EMBEDDINGS_SERVICE_MAX_IN_FLIGHT = 4
+
+# Timeout of a single embeddings service request in seconds
+EMBEDDINGS_SERVICE_TIMEOUT = 60
+
+# Retries with exponential backoff for failed embeddings service requests
+EMBEDDINGS_SERVICE_RETRIES = 3
+EMBEDDINGS_SERVICE_BACKOFF_FACTOR = 0.5
+
+# How long the readiness of the embeddings service is cached in seconds
+EMBEDDINGS_SERVICE_READINESS_TTL = 300
+
 #####################
 ## Analysis config ##
 #####################
@@ -25,6 +48,63 @@ VECTOR_MIN_DF = 0.001
 # Terms with higher frequency will be ignored, remove abundant words
 VECTOR_MAX_DF = 0.8
 
+# Jobs with more datasets are vectorized in the streaming mode with feature hashing
+VECTOR_STREAMING_MIN_DATASETS = 20_000
+
+# Number of datasets tokenized at once in the streaming mode
+VECTOR_STREAMING_CHUNK_SIZE = 1_000
+
+# Number of hashed features in the streaming mode
+VECTOR_HASHING_FEATURES = 2 ** 20
+
+# Number of terms tracked by the top terms sketch in the streaming mode
+VECTOR_SKETCH_CAPACITY = 5 * VECTOR_WORDS
+
+# Maximum number of clusters tried when choosing the number of clusters
+CLUSTERING_MAX_CLUSTERS = 20
+
+# Number of processes fitting clusterings for different numbers of clusters
+CLUSTERING_N_JOBS = os.cpu_count()
+
+# Smaller jobs are clustered in the main process
+CLUSTERING_PARALLEL_MIN_DATASETS = 1_000
+
+# Silhouette score is estimated on a sample of datasets for larger jobs
+CLUSTERING_SILHOUETTE_SAMPLE_SIZE = 5_000
+
+# Stop trying more clusters when silhouette score hasn't improved for this many numbers of clusters
+CLUSTERING_EARLY_STOPPING_PATIENCE = 4
+
+# Number of datasets in a mini-batch of mini-batch k-means
+CLUSTERING_MINIBATCH_SIZE = 4_096
+
+# Minimal number of datasets in a cluster found by HDBSCAN
+CLUSTERING_HDBSCAN_MIN_CLUSTER_SIZE = 10
+
+##########################
+## Incremental analysis ##
+##########################
+
+# Jobs are analyzed from scratch when more than this fraction of the datasets of the last full analysis
+# were added or removed since it
+INCREMENTAL_MAX_CHANGED_FRACTION = 0.2
+
+# Jobs are analyzed from scratch when the silhouette score drops by more than this below the last full analysis
+INCREMENTAL_MAX_SILHOUETTE_DROP = 0.05
+
+###################
+## Layout config ##
+###################
+
+# Maximal perplexity of t-SNE, lowered for jobs with few datasets
+LAYOUT_PERPLEXITY = 30
+
+# Number of nearest fitted datasets used to place a new dataset into a scikit-learn t-SNE layout
+LAYOUT_TRANSFORM_NEIGHBORS = 10
+
+# Minimal number of datasets for which FFT-accelerated t-SNE is faster than Barnes-Hut t-SNE
+LAYOUT_FFT_MIN_DATASETS = 10_000
+
 #####################
 ## Word2vec config ##
 #####################
@@ -33,6 +113,50 @@ WORD2VEC_EMBEDDINGS_LENGTH = 128
 WORD2VEC_WINDOW = 5
 WORD2VEC_EPOCHS = 3
 
+# Words occurring less often in the corpus-wide model's training corpus are ignored
+WORD2VEC_MIN_COUNT = 2
+
+# Minimal fraction of the job's tokens that must be in the corpus-wide model for it to be used
+WORD2VEC_MIN_COVERAGE = 0.5
+
+##############################
+## Similarity search config ##
+##############################
+
+# Number of neighbours of each node in the HNSW graph
+ANN_HNSW_M = 16
+
+# Size of the candidate list when building the HNSW graph, higher is more accurate and slower
+ANN_HNSW_EF_CONSTRUCTION = 200
+
+# Size of the candidate list when querying the HNSW graph, higher is more accurate and slower
+ANN_HNSW_EF_SEARCH = 64
+
+# Number of queries compared with all vectors at once by the brute-force search, bounds its memory usage
+ANN_BRUTE_FORCE_BATCH_SIZE = 64
+
+# Default number of similar datasets returned by the /similar endpoint
+SIMILAR_DATASETS_K = 10
+
+# Maximum number of similar datasets the /similar endpoint returns
+SIMILAR_DATASETS_MAX_K = 100
+
+# Jobs use the corpus-wide embeddings only if at least this fraction of their datasets is in the corpus
+CORPUS_EMBEDDINGS_MIN_COVERAGE = 0.9
+
+# Number of datasets the corpus-wide vectorization and SVD are fitted on
+CORPUS_EMBEDDINGS_SAMPLE_SIZE = 10_000
+
+# Number of datasets embedded at once when building the corpus-wide embeddings
+CORPUS_EMBEDDINGS_CHUNK_SIZE = 1_000
+
+############################
+## Standardization config ##
+############################
+
+# Number of (mention, MeSH term) Word Mover's Distances cached by the fastText normalizer
+WMD_CACHE_SIZE = 100_000
+
 
 class Config:
     def __init__(self, config_path):
@@ -43,20 +167,48 @@ class Config:
         if self.topic_words < 5:
             raise ValueError(
                 "clustering.topic_words must be greater than or equal to 5. Please check the configuration.")
+        self.clustering_engine = self._config["clustering"]["engine"]
+        if self.clustering_engine not in ["auto", "kmeans", "minibatch_kmeans", "hdbscan"]:
+            raise ValueError(
+                "clustering.engine should be one of 'auto', 'kmeans', 'minibatch_kmeans' or 'hdbscan'")
+        self.minibatch_min_datasets = self._config.getint("clustering", "minibatch_min_datasets")
+        self.layout_engine = self._config["layout"]["engine"]
+        if self.layout_engine not in ["auto", "tsne", "opentsne", "umap"]:
+            raise ValueError("layout.engine should be one of 'auto', 'tsne', 'opentsne' or 'umap'")
+        self.layout_threads = self._config.getint("layout", "threads")
         self.download_folder = self._config["ingestion"]["download_folder"]
         self.loglevel = self._config["logging"]["log_level"]
+        self.chrome_trace = self._config.getboolean("logging", "chrome_trace")
         self.angel_config = {
             "model_load_path": self._config["ANGEL"]["model_load_path"],
             "model_token_path": self._config["ANGEL"]["model_token_path"],
             "per_device_eval_batch_size": self._config.getint("ANGEL", "per_device_eval_batch_size"),
             "num_beams": self._config.getint("ANGEL", "num_beams"),
             "prefix_mention_is": self._config.getboolean("ANGEL", "prefix_mention_is"),
+            "candidate_tries_folder": self._config["ANGEL"]["candidate_tries_folder"],
         }
         self.bern2_url = self._config["BERN2"]["url"]
         self.bern2_rate_limit = self._config.getint("BERN2", "rate_limit")
+        self.bern2_max_in_flight = self._config.getint("BERN2", "max_in_flight")
+        self.bern2_timeout = self._config.getfloat("BERN2", "timeout")
+        self.bern2_retries = self._config.getint("BERN2", "retries")
+        self.bern2_cache_path = self._config["BERN2"]["cache_path"]
+        self.bern2_cache_max_size_mb = self._config.getfloat("BERN2", "cache_max_size_mb")
+        self.bern2_model_version = self._config["BERN2"]["model_version"]
+        self.bern2_annotate_lines = self._config.getboolean("BERN2", "annotate_lines")
         self.search_backend = self._config["search"]["backend"]
         if self.search_backend not in ["esearch", "pubtrends"]:
             raise Exception("search.backend should be either 'esearch' or 'pubtrends'")
+        self.word2vec_model_path = self._config["word2vec"]["model_path"]
+        self.corpus_index_path = self._config["similarity"]["corpus_index_path"]
+        self.use_corpus_embeddings = self._config.getboolean("similarity", "use_corpus_embeddings")
+        self.local_embeddings_config = {
+            "enabled": self._config.getboolean("embeddings", "local_backend"),
+            "onnx_model_path": self._config["embeddings"]["onnx_model_path"],
+            "onnx_tokenizer": self._config["embeddings"]["onnx_tokenizer"],
+            "onnx_threads": self._config.getint("embeddings", "onnx_threads"),
+            "onnx_batch_size": self._config.getint("embeddings", "onnx_batch_size"),
+        }
 
 
 config = Config("config.ini")
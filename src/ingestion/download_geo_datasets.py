@@ -2,7 +2,7 @@ import asyncio
 import concurrent.futures
 import os
 from os import path
-from typing import List
+from typing import Iterable, List, Set
 
 import GEOparse
 import aiofiles
@@ -32,6 +32,14 @@ def is_running_in_jupyter():
         return False
 
 
+def _run(coroutine):
+    if not is_running_in_jupyter():
+        return asyncio.run(coroutine)
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor()
+        return pool.submit(asyncio.run, coroutine).result()
+
+
 def download_geo_datasets(pubmed_ids: List[int]) -> List[GEODataset]:
     """
     Downloads the GEO datasets for papers with the given PubMed IDs.
@@ -39,12 +47,47 @@ def download_geo_datasets(pubmed_ids: List[int]) -> List[GEODataset]:
     :param dataset_ids: PubMed IDs for which to download GEO datasets.
     :returns: A list containing the dowloaded datasets.
     """
+    return _run(_download_geo_datasets(pubmed_ids))
 
-    if not is_running_in_jupyter():
-        return asyncio.run(_download_geo_datasets(pubmed_ids))
-    else:
-        pool = concurrent.futures.ThreadPoolExecutor()
-        return pool.submit(asyncio.run, _download_geo_datasets(pubmed_ids)).result()
+
+def fetch_geo_series_accessions(pubmed_ids: List[int]) -> Set[str]:
+    """
+    Finds the accessions of the GEO datasets for papers with the given PubMed IDs without downloading the datasets.
+
+    :param pubmed_ids: PubMed IDs for which to find GEO datasets.
+    :returns: A set of GEO accessions.
+    """
+
+    async def fetch():
+        async with aiohttp.ClientSession() as session:
+            return await _fetch_geo_series_accessions(pubmed_ids, session)
+
+    return _run(fetch())
+
+
+def download_geo_datasets_by_accessions(accessions: Iterable[str]) -> List[GEODataset]:
+    """
+    Downloads the GEO datasets with the given accessions.
+
+    :param accessions: GEO accessions of the datasets.
+    :returns: A list containing the dowloaded datasets.
+    """
+
+    async def download():
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(
+                *(download_geo_dataset(accession, session) for accession in accessions)
+            )
+
+    return _run(download())
+
+
+async def _fetch_geo_series_accessions(pubmed_ids: List[int], session: aiohttp.ClientSession) -> Set[str]:
+    geo_ids = await fetch_geo_ids(pubmed_ids, session)
+    accessions_geo = fetch_geo_accessions(geo_ids, session)
+    accessions_pmc = fetch_geo_accessions_europepmc(pubmed_ids, session)
+
+    return set(await accessions_geo) | set(await accessions_pmc)
 
 
 async def _download_geo_datasets(pubmed_ids: List[int]) -> List[GEODataset]:
@@ -55,11 +98,7 @@ async def _download_geo_datasets(pubmed_ids: List[int]) -> List[GEODataset]:
     :returns: A list containing the dowloaded datasets.
     """
     async with aiohttp.ClientSession() as session:
-        geo_ids = await fetch_geo_ids(pubmed_ids, session)
-        accessions_geo = fetch_geo_accessions(geo_ids, session)
-        accessions_pmc = fetch_geo_accessions_europepmc(pubmed_ids, session)
-
-        accessions = set(await accessions_geo) | set(await accessions_pmc)
+        accessions = await _fetch_geo_series_accessions(pubmed_ids, session)
 
         return await asyncio.gather(
             *(download_geo_dataset(accession, session) for accession in accessions)
@@ -0,0 +1,51 @@
+import os
+from os import path
+from typing import Iterator, Set
+
+import GEOparse
+
+from src.model.geo_dataset import GEODataset
+from src.model.geo_sample import GEOSample
+
+
+def _parse_cached_file(file_path: str):
+    with open(file_path) as soft_file:
+        return GEOparse.GEOparse.parse_metadata(soft_file)
+
+
+def list_cached_series_accessions(folder: str) -> Set[str]:
+    """
+    Lists the accessions of the GEO series that are in the download folder.
+
+    :param folder: Download folder of the GEO datasets.
+    :return: Set of GEO series accessions.
+    """
+    if not path.isdir(folder):
+        return set()
+    return {file[:-len(".txt")] for file in os.listdir(folder) if file.startswith("GSE") and file.endswith(".txt")}
+
+
+def load_cached_datasets(folder: str, exclude: Set[str] = frozenset(), accessions: Set[str] | None = None,
+                         load_samples: bool = True) -> Iterator[GEODataset]:
+    """
+    Loads the GEO series that have already been downloaded to the download folder
+    without making any requests. The samples of each series are loaded if they were downloaded as well.
+
+    :param folder: Download folder of the GEO datasets.
+    :param exclude: Accessions of the series to skip.
+    :param accessions: Accessions of the series to load, by default all cached series.
+    :param load_samples: Whether to load the samples, skip them when only the series metadata is needed.
+    :return: Iterator over the cached datasets in the order of their accessions.
+    """
+    if accessions is None:
+        accessions = list_cached_series_accessions(folder)
+    for accession in sorted(set(accessions) - set(exclude)):
+        dataset = GEODataset(_parse_cached_file(path.join(folder, f"{accession}.txt")))
+        if not load_samples:
+            yield dataset
+            continue
+        sample_paths = [path.join(folder, f"{sample_accession}.txt") for sample_accession in
+                        dataset.sample_accessions]
+        if sample_paths and all(path.isfile(sample_path) for sample_path in sample_paths):
+            dataset.samples = [GEOSample(_parse_cached_file(sample_path)) for sample_path in sample_paths]
+        yield dataset
@@ -16,18 +16,16 @@ def RateLimited(max_per_second):
         lastTimeCalled = [0.0]
 
         def rateLimitedFunction(*args, **kwargs):
-            lock.acquire()
-            elapsed = time.process_time() - lastTimeCalled[0]
-            leftToWait = minInterval - elapsed
+            # Calls are spaced by their start times, so that concurrent calls can overlap
+            with lock:
+                elapsed = time.monotonic() - lastTimeCalled[0]
+                leftToWait = minInterval - elapsed
 
-            if leftToWait > 0:
-                time.sleep(leftToWait)
+                if leftToWait > 0:
+                    time.sleep(leftToWait)
+                lastTimeCalled[0] = time.monotonic()
 
-            lock.release()
-
-            ret = func(*args, **kwargs)
-            lastTimeCalled[0] = time.process_time()
-            return ret
+            return func(*args, **kwargs)
 
         return rateLimitedFunction
 
@@ -4,10 +4,14 @@ from typing import List, Dict
 from dateutil.parser import parse as parse_date
 
 from src.model.geo_sample import GEOSample
+from src.utils.lazy import lazy_resource
+
+
+@lazy_resource
+def get_platform_map():
+    with open("resources/gpl_platform_map.json") as f:
+        return json.load(f)
 
-platform_map = None
-with open("resources/gpl_platform_map.json") as f:
-    platform_map = json.load(f)
 
 GEO_DATASET_CHARCTERISTICS_STR_SEPARATOR = " ; "
 
@@ -27,7 +31,7 @@ class GEODataset:
         self.samples: List[GEOSample] | None = None
         self.publication_date = parse_date(
             metadata["submission_date"][0]) if "submission_date" in metadata else None
-        self.platforms: List[str] = [platform_map.get(
+        self.platforms: List[str] = [get_platform_map().get(
             gpl, gpl) for gpl in self.platform_ids]
         self.contact_name: str = metadata.get("contact_name", [",,"])[0]
         self.contact_name = " ".join(self.contact_name.split(","))
@@ -95,7 +99,7 @@ class GEODataset:
 
         for key, values in characteristics.items():
             if len(values) < 20:
-                string += f"{key}: {','.join(values)}" + sep
+                string += f"{key}: {','.join(sorted(values))}" + sep
         return string
 
     def _shorten_string_to_limit(self, string, sep, limit):
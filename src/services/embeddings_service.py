@@ -1,80 +1,206 @@
+import concurrent.futures
 import logging
 import os
+import threading
+import time
+from collections import deque, namedtuple
 
 import numpy as np
-import requests
+from more_itertools import chunked
+
+from src.config.config import EMBEDDINGS_SERVICE_BATCH_SIZE, EMBEDDINGS_SERVICE_MAX_IN_FLIGHT, \
+    EMBEDDINGS_SERVICE_TIMEOUT, EMBEDDINGS_SERVICE_RETRIES, EMBEDDINGS_SERVICE_BACKOFF_FACTOR, \
+    EMBEDDINGS_SERVICE_READINESS_TTL
+from src.services.http_session import make_pooled_session
 
 logger = logging.getLogger(__name__)
 
 # Launch with a Docker address or locally
 EMBEDDINGS_SERVICE_URL = os.getenv('EMBEDDINGS_SERVICE_URL', 'http://localhost:5001')
 
+BatchLatency = namedtuple("BatchLatency", ["endpoint", "size", "seconds"])
 
-def is_embeddings_service_available():
-    logger.debug(f'Check if embeddings service endpoint is available')
-    try:
-        r = requests.request(url=EMBEDDINGS_SERVICE_URL, method='GET')
-        return r.status_code == 200
-    except Exception as e:
-        logger.debug(f'Embeddings service is not available: {e}')
-        return False
 
+class EmbeddingsServiceClient:
+    """
+    Client for the embeddings service.
+    Requests are split into batches that are sent concurrently over a pooled session,
+    failed requests are retried with backoff and the readiness of the service is cached.
+    """
 
-def is_embeddings_service_ready():
-    logger.debug(f'Check if embeddings service endpoint is ready')
-    try:
-        r = requests.request(url=EMBEDDINGS_SERVICE_URL, method='GET')
-        if r.status_code != 200:
+    def __init__(self, url: str = EMBEDDINGS_SERVICE_URL,
+                 batch_size: int = EMBEDDINGS_SERVICE_BATCH_SIZE,
+                 max_in_flight: int = EMBEDDINGS_SERVICE_MAX_IN_FLIGHT,
+                 timeout: float = EMBEDDINGS_SERVICE_TIMEOUT,
+                 retries: int = EMBEDDINGS_SERVICE_RETRIES,
+                 backoff_factor: float = EMBEDDINGS_SERVICE_BACKOFF_FACTOR,
+                 readiness_ttl: float = EMBEDDINGS_SERVICE_READINESS_TTL,
+                 max_latency_records: int = 10_000):
+        self.url = url
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.readiness_ttl = readiness_ttl
+        self.session = make_pooled_session(max_in_flight, retries, backoff_factor)
+        self.batch_latencies = deque(maxlen=max_latency_records)
+        self._lock = threading.Lock()
+        self._ready = None
+        self._texts_available = None
+        self._checked_at = 0.0
+        # Dimension of the embeddings of each endpoint, known after its first successful batch
+        self._dimensions = {}
+
+    def invalidate(self):
+        """
+        Forgets the cached readiness state, the next call to is_ready() queries the service again.
+        """
+        with self._lock:
+            self._ready = None
+            self._texts_available = None
+
+    def is_available(self) -> bool:
+        logger.debug(f'Check if embeddings service endpoint is available')
+        try:
+            r = self.session.get(self.url, timeout=self.timeout)
+            return r.status_code == 200
+        except Exception as e:
+            logger.debug(f'Embeddings service is not available: {e}')
             return False
-        r = requests.request(url=f'{EMBEDDINGS_SERVICE_URL}/check', method='GET',
-                             headers={'Accept': 'application/json'})
-        if r.status_code != 200 or r.json() is not True:
+
+    def is_ready(self) -> bool:
+        """
+        Checks whether the embeddings service is ready. The result is cached for readiness_ttl seconds.
+        """
+        self._refresh_readiness()
+        return self._ready
+
+    def is_texts_embeddings_available(self) -> bool:
+        """
+        Checks whether the embeddings service can embed texts. The result is cached together with readiness.
+        """
+        self._refresh_readiness()
+        return self._ready and self._texts_available
+
+    def _refresh_readiness(self):
+        with self._lock:
+            if self._ready is not None and time.monotonic() - self._checked_at < self.readiness_ttl:
+                return
+            self._ready = self._check_ready()
+            self._texts_available = self._ready and self._embed_batch(
+                'embeddings_texts', ['Test sentence 1.', 'Test sentence 2.']) is not None
+            self._checked_at = time.monotonic()
+
+    def _check_ready(self) -> bool:
+        logger.debug(f'Check if embeddings service endpoint is ready')
+        try:
+            r = self.session.get(self.url, timeout=self.timeout)
+            if r.status_code != 200:
+                return False
+            r = self.session.get(f'{self.url}/check', headers={'Accept': 'application/json'}, timeout=self.timeout)
+            return r.status_code == 200 and r.json() is True
+        except Exception as e:
+            logger.debug(f'Embeddings service is not ready: {e}')
             return False
-        return True
-    except Exception as e:
-        logger.debug(f'Embeddings service is not ready: {e}')
-        return False
+
+    def fetch_tokens_embeddings(self, tokens):
+        logger.debug(f'Fetch tokens embeddings')
+        return self._embed('embeddings_tokens', tokens)
+
+    def fetch_texts_embedding(self, texts):
+        logger.debug(f'Fetch texts embeddings')
+        return self._embed('embeddings_texts', texts)
+
+    def _embed(self, endpoint, items):
+        """
+        Embeds the items in batches of batch_size with at most max_in_flight batches sent at the same time.
+        :return: Embeddings in the order of items or None if any of the batches failed.
+        """
+        if len(items) == 0:
+            return np.zeros((0, self._dimensions.get(endpoint, 0)))
+        batches = list(chunked(items, self.batch_size))
+        if len(batches) <= 1:
+            results = [self._embed_batch(endpoint, batch) for batch in batches]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                results = list(executor.map(lambda batch: self._embed_batch(endpoint, batch), batches))
+        if any(result is None for result in results):
+            # The service may have gone down, check it again on the next job
+            self.invalidate()
+            return None
+        return np.concatenate(results)
+
+    def _embed_batch(self, endpoint, batch):
+        begin = time.perf_counter()
+        try:
+            r = self.session.get(
+                f'{self.url}/{endpoint}',
+                json=batch,
+                headers={'Accept': 'application/json'},
+                timeout=self.timeout
+            )
+            if r.status_code == 200:
+                embeddings = np.array(r.json()).reshape(len(batch), -1)
+                self._dimensions[endpoint] = embeddings.shape[1]
+                return embeddings
+            else:
+                logger.debug(f'Wrong response code {r.status_code}')
+        except Exception as e:
+            logger.debug(f'Failed to fetch {endpoint} {e}')
+        finally:
+            latency = BatchLatency(endpoint, len(batch), time.perf_counter() - begin)
+            self.batch_latencies.append(latency)
+            logger.debug(f'Embeddings batch {latency.endpoint} of size {latency.size} took {latency.seconds:.3f}s')
+        return None
+
+    def latency_summary(self):
+        """
+        :return: Dictionary with the number of batches sent and their mean, median, 95th percentile and
+          maximum latency in seconds.
+        """
+        latencies = np.array([latency.seconds for latency in self.batch_latencies])
+        if len(latencies) == 0:
+            return {"batches": 0}
+        return {
+            "batches": len(latencies),
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+        }
+
+
+_client = None
+
+
+def get_embeddings_client() -> EmbeddingsServiceClient:
+    """
+    Returns the embeddings service client shared within the process.
+    """
+    global _client
+    if _client is None:
+        _client = EmbeddingsServiceClient()
+    return _client
+
+
+def is_embeddings_service_available():
+    return get_embeddings_client().is_available()
+
+
+def is_embeddings_service_ready():
+    return get_embeddings_client().is_ready()
 
 
 def fetch_tokens_embeddings(tokens):
     # Don't use the model as is, since each celery process will load its own copy.
     # Shared model is available via additional service with a single model.
-    logger.debug(f'Fetch tokens embeddings')
-    try:
-        r = requests.request(
-            url=f'{EMBEDDINGS_SERVICE_URL}/embeddings_tokens',
-            method='GET',
-            json=tokens,
-            headers={'Accept': 'application/json'}
-        )
-        if r.status_code == 200:
-            return np.array(r.json()).reshape(len(tokens), -1)
-        else:
-            logger.debug(f'Wrong response code {r.status_code}')
-    except Exception as e:
-        logger.debug(f'Failed to fetch tokens embeddings ${e}')
-    return None
+    return get_embeddings_client().fetch_tokens_embeddings(tokens)
 
 
 def is_texts_embeddings_available():
-    return fetch_texts_embedding(['Test sentence 1.', 'Test sentence 2.']) is not None
+    return get_embeddings_client().is_texts_embeddings_available()
 
 
 def fetch_texts_embedding(texts):
     # Don't use the model as is, since each celery process will load its own copy.
     # Shared model is available via additional service with a single model.
-    logger.debug(f'Fetch texts embeddings')
-    try:
-        r = requests.request(
-            url=f'{EMBEDDINGS_SERVICE_URL}/embeddings_texts',
-            method='GET',
-            json=texts,
-            headers={'Accept': 'application/json'}
-        )
-        if r.status_code == 200:
-            return np.array(r.json()).reshape(len(texts), -1)
-        else:
-            logger.debug(f'Wrong response code {r.status_code}')
-    except Exception as e:
-        logger.debug(f'Failed to fetch texts embeddings ${e}')
-    return None
+    return get_embeddings_client().fetch_texts_embedding(texts)
@@ -0,0 +1,32 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def make_pooled_session(pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5,
+                        allowed_methods=("GET",)) -> requests.Session:
+    """
+    Creates a requests session that reuses connections and retries failed requests
+    with exponential backoff.
+
+    :param pool_size: Maximum number of connections kept open per host.
+    :param retries: Number of retries for connection errors and 5xx responses.
+    :param backoff_factor: Backoff factor between retries, the n-th retry waits backoff_factor * 2^(n-1) seconds.
+    :param allowed_methods: HTTP methods that are retried.
+    :return: Configured requests session.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(allowed_methods),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
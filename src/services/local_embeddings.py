@@ -0,0 +1,118 @@
+import logging
+import os
+import sys
+
+import numpy as np
+from more_itertools import chunked
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxTextEmbedder:
+    """
+    In-process CPU sentence embedding model executed with ONNX Runtime.
+    Texts are embedded as the mean of the token embeddings of the last hidden layer, normalized to unit length,
+    which matches sentence-transformers models exported to ONNX.
+    Use quantize_model() to convert an exported model to int8.
+    """
+
+    def __init__(self, model_path: str, tokenizer_name: str, threads: int = 4, batch_size: int = 32,
+                 max_length: int = 256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        if os.path.isfile(tokenizer_name):
+            self.tokenizer = Tokenizer.from_file(tokenizer_name)
+        else:
+            self.tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = attention_mask[:, :, np.newaxis].astype(np.float32)
+        mean_embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(mean_embeddings, axis=1, keepdims=True)
+        return mean_embeddings / np.clip(norms, 1e-12, None)
+
+    def fetch_texts_embedding(self, texts):
+        """
+        Embeds texts, has the same interface as fetch_texts_embedding from the embeddings service.
+        :param texts: List of texts to embed.
+        :return: numpy array [texts x embeddings] or None if the embedding failed.
+        """
+        logger.debug(f'Embed {len(texts)} texts with the local ONNX model')
+        try:
+            return np.concatenate([self._embed_batch(batch) for batch in chunked(texts, self.batch_size)])
+        except Exception as e:
+            logger.warning(f'Failed to embed texts with the local ONNX model: {e}')
+            return None
+
+
+_local_embedder = None
+_local_embedder_loaded = False
+
+
+def get_local_embedder() -> OnnxTextEmbedder | None:
+    """
+    Returns the local embedding backend configured in the [embeddings] section of config.ini,
+    or None if it is disabled or cannot be loaded. The model is loaded once per process.
+    """
+    global _local_embedder, _local_embedder_loaded
+    if _local_embedder_loaded:
+        return _local_embedder
+    _local_embedder_loaded = True
+
+    embeddings_config = config.local_embeddings_config
+    if not embeddings_config["enabled"]:
+        return None
+    if not os.path.isfile(embeddings_config["onnx_model_path"]):
+        logger.warning(f'Local embeddings model not found at {embeddings_config["onnx_model_path"]}')
+        return None
+    try:
+        _local_embedder = OnnxTextEmbedder(
+            embeddings_config["onnx_model_path"],
+            embeddings_config["onnx_tokenizer"],
+            threads=embeddings_config["onnx_threads"],
+            batch_size=embeddings_config["onnx_batch_size"],
+        )
+    except ImportError as e:
+        logger.warning(f'Local embeddings backend requires onnxruntime and tokenizers: {e}')
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.warning(f'Local embeddings model or tokenizer could not be loaded: {e}')
+    return _local_embedder
+
+
+def quantize_model(model_path: str, quantized_model_path: str):
+    """
+    Quantizes the weights of an ONNX model to int8.
+
+    :param model_path: Path to the exported float32 ONNX model.
+    :param quantized_model_path: Path where to save the quantized model.
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(model_path, quantized_model_path, weight_type=QuantType.QInt8)
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.services.local_embeddings <model.onnx> <model.int8.onnx>
+    quantize_model(sys.argv[1], sys.argv[2])
+    print(f"Saved quantized model to {sys.argv[2]}")
@@ -1,4 +1,5 @@
 from ANGEL.run_sample import run_sample
+from ANGEL.utils import get_config
 
 from src.standardization.angel_normalizer import ANGELMeshNormalizer
 from src.standardization.entity_normalizer import NormalizationResult
@@ -6,10 +7,11 @@ from src.standardization.get_standard_name_fasttext import FasttextNormalizer
 
 
 class ANGELFasttextMeshNormalizer(ANGELMeshNormalizer):
-    def __init__(self, mesh_lookup):
+    def __init__(self, mesh_lookup, use_ann_index=True):
         super().__init__(mesh_lookup, None)
+        self.config = get_config()
         self.fasttext = FasttextNormalizer(
-            "BioWordVec_PubMed_MIMICIII_d200.vec.bin", mesh_lookup)
+            "BioWordVec_PubMed_MIMICIII_d200.vec.bin", mesh_lookup, use_ann_index=use_ann_index)
 
     def _normalize(self, input_sentence, entity):
         prefix_sentence = f"{entity} is"
@@ -0,0 +1,169 @@
+"""
+Batched generation of MeSH terms with the ANGEL BART model, set in the [ANGEL] section of config.ini.
+As in ANGEL, beam search is constrained to the candidate terms by a prefix trie of their tokens, and the decoder
+is forced to start with "<mention> is" if prefix_mention_is is set. The model is loaded once and many mentions
+are generated in one beam search, instead of loading the model and searching for every mention.
+Candidates are compiled into tries once per category and referenced by the category afterwards.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from os import path
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateTrie:
+    """
+    Prefix trie of the token sequences of candidate terms.
+    """
+
+    def __init__(self, sequences: Dict[tuple, str]):
+        """
+        :param sequences: Map of the token sequences, ending with the EOS token, to their candidate terms.
+        """
+        self.terms = sequences
+        self.root = {}
+        self.depth = 0
+        for sequence in sequences:
+            node = self.root
+            for token in sequence:
+                node = node.setdefault(token, {})
+            self.depth = max(self.depth, len(sequence))
+
+    def next_tokens(self, prefix: Sequence[int]) -> List[int]:
+        """
+        :return: Tokens that continue the prefix to a candidate, empty if no candidate starts with the prefix.
+        """
+        node = self.root
+        for token in prefix:
+            node = node.get(token)
+            if node is None:
+                return []
+        return list(node)
+
+
+class ANGELGenerator:
+    def __init__(self, angel_config: Dict):
+        """
+        :param angel_config: config.angel_config.
+        """
+        import torch
+        from transformers import BartForConditionalGeneration, BartTokenizer
+
+        self.torch = torch
+        if torch.cuda.is_available():
+            self.device = "cuda"
+        elif torch.backends.mps.is_available():
+            self.device = "mps"
+        else:
+            self.device = "cpu"
+        self.tokenizer = BartTokenizer.from_pretrained(angel_config["model_token_path"])
+        self.model = BartForConditionalGeneration.from_pretrained(angel_config["model_load_path"])
+        self.model.to(self.device).eval()
+        self.batch_size = angel_config["per_device_eval_batch_size"]
+        self.num_beams = angel_config["num_beams"]
+        self.prefix_mention_is = angel_config["prefix_mention_is"]
+        self.tries_folder = angel_config["candidate_tries_folder"]
+        self._tries: Dict[str, CandidateTrie] = {}
+
+    def has_candidates(self, category: str) -> bool:
+        return category in self._tries
+
+    def add_candidates(self, category: str, candidates: List[str]):
+        """
+        Compiles the candidates into a prefix trie that generate() references by the category.
+        Compiled tries are saved to the tries folder and loaded instead of tokenizing the candidates again.
+
+        :param category: Handle of the candidates, for example "cell_type".
+        :param candidates: Terms the mentions of the category can be normalized to.
+        """
+        fingerprint = hashlib.sha256(self.tokenizer.name_or_path.encode())
+        for candidate in candidates:
+            fingerprint.update(f"{candidate}\n".encode())
+        trie_path = path.join(self.tries_folder, f"{category}_{fingerprint.hexdigest()[:16]}.pkl")
+        if path.isfile(trie_path):
+            with open(trie_path, "rb") as f:
+                self._tries[category] = pickle.load(f)
+            return
+
+        begin = time.perf_counter()
+        token_ids = self.tokenizer([f" {candidate.lower()}" for candidate in candidates],
+                                   add_special_tokens=False)["input_ids"]
+        sequences = {(*ids, self.tokenizer.eos_token_id): candidate for ids, candidate in zip(token_ids, candidates)}
+        self._tries[category] = CandidateTrie(sequences)
+        logger.info(f"Compiled {len(candidates)} {category} candidates in {time.perf_counter() - begin:.1f}s")
+        try:
+            os.makedirs(self.tries_folder, exist_ok=True)
+            with open(trie_path, "wb") as f:
+                pickle.dump(self._tries[category], f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            logger.warning(f"Could not save the {category} candidates trie to {trie_path}: {e}")
+
+    def _forced_prefix(self, mention: str) -> List[int]:
+        """
+        :return: Tokens the decoder is forced to start with after the decoder start token.
+        """
+        if not self.prefix_mention_is:
+            return [self.tokenizer.bos_token_id]
+        # Drop the EOS token, the candidate follows the prefix
+        return self.tokenizer(f"{mention} is")["input_ids"][:-1]
+
+    def generate(self, input_sentences: List[str], mentions: List[str], category: str) -> List[str | None]:
+        """
+        Generates the candidate term of each mention.
+
+        :param input_sentences: Inputs of the model, mentions marked with START and END.
+        :param mentions: Mentions in the input sentences.
+        :param category: Category of the candidates the mentions can be normalized to, see add_candidates.
+        :return: Generated candidate of each mention in the order of the mentions, None if the beam search
+        ended without generating a candidate.
+        """
+        trie = self._tries[category]
+        # Similar lengths in a batch reduce the padding
+        order = sorted(range(len(input_sentences)), key=lambda i: len(input_sentences[i]))
+        generated = [None] * len(input_sentences)
+        for begin in range(0, len(order), self.batch_size):
+            batch = order[begin:begin + self.batch_size]
+            terms = self._generate_batch([input_sentences[i] for i in batch], [mentions[i] for i in batch], trie)
+            for i, term in zip(batch, terms):
+                generated[i] = term
+        return generated
+
+    def _generate_batch(self, input_sentences: List[str], mentions: List[str], trie: CandidateTrie
+                        ) -> List[str | None]:
+        forced_prefixes = [self._forced_prefix(mention) for mention in mentions]
+
+        def prefix_allowed_tokens(batch_id, sentence):
+            # Skip the decoder start token
+            sentence = sentence.tolist()[1:]
+            forced_prefix = forced_prefixes[batch_id]
+            if len(sentence) < len(forced_prefix):
+                return [forced_prefix[len(sentence)]]
+            return trie.next_tokens(sentence[len(forced_prefix):]) or [self.tokenizer.pad_token_id]
+
+        inputs = self.tokenizer(input_sentences, padding=True, truncation=True, return_tensors="pt").to(self.device)
+        with self.torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                num_beams=self.num_beams,
+                max_length=max(map(len, forced_prefixes)) + trie.depth + 1,
+                prefix_allowed_tokens_fn=prefix_allowed_tokens,
+                early_stopping=True,
+            )
+
+        terms = []
+        for output, forced_prefix, mention in zip(outputs.tolist(), forced_prefixes, mentions):
+            sequence = output[1 + len(forced_prefix):]
+            if self.tokenizer.eos_token_id in sequence:
+                sequence = sequence[:sequence.index(self.tokenizer.eos_token_id) + 1]
+            term = trie.terms.get(tuple(sequence))
+            if term is None:
+                logger.warning(f"ANGEL generated '{self.tokenizer.decode(sequence, skip_special_tokens=True)}' "
+                               f"for '{mention}', which is not a candidate")
+            terms.append(term)
+        return terms
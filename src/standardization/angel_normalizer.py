@@ -1,34 +1,75 @@
-from ANGEL.run_sample import run_sample
-from ANGEL.utils import get_config
+from typing import List
+
+from src.config import config
+from src.standardization.angel_generator import ANGELGenerator
 from src.standardization.entity_normalizer import EntityNormalizer, NormalizationResult
 
 
 class ANGELMeshNormalizer(EntityNormalizer):
     def __init__(self, mesh_lookup, candidates=None):
         self.mesh_lookup = mesh_lookup
-        self.config = get_config()
         self.candidates = candidates or list(self.mesh_lookup.keys())
+        self.candidate_sets = {"all": self.candidates}
+        self.generator = None
+
+    def add_candidate_set(self, category: str, candidates: List[str]):
+        """
+        Adds candidates that entities of the category are normalized to, instead of all candidates.
+        The candidates are compiled for constrained decoding when an entity of the category is normalized first.
+        """
+        self.candidate_sets[category] = candidates
+
+    def _generate(self, input_sentences: List[str], entities: List[str], category: str) -> List[str | None]:
+        if not entities:
+            return []
+        if self.generator is None:
+            self.generator = ANGELGenerator(config.angel_config)
+        if not self.generator.has_candidates(category):
+            self.generator.add_candidates(category, self.candidate_sets[category])
+        return self.generator.generate(input_sentences, entities, category)
+
+    def normalize_entity(self, entity: str, category: str = "all"):
+        return self.normalize_entities([entity], category)[0]
+
+    def _to_result(self, entity: str, standard_name: str | None) -> NormalizationResult | None:
+        mesh_entry = self.mesh_lookup.get(standard_name) if standard_name is not None else None
+        if mesh_entry is None:
+            return None
+        return NormalizationResult(entity, standard_name, "MeSH", mesh_entry.id, 1.0)
 
-    def normalize_entity(self, entity: str):
-        input_sentence = f"START {entity} END"
-        prefix_sentence = f"{entity} is"
-        if entity in self.mesh_lookup:
-            mesh_entry = self.mesh_lookup[entity.strip().lower()]
-            return NormalizationResult(entity, mesh_entry.term, "MeSH", mesh_entry.id, 1.0)
+    def normalize_entities(self, entities: List[str], category: str = "all") -> List[NormalizationResult | None]:
+        """
+        Normalizes many entities to the candidates of the category at once. Entities that are MeSH terms
+        are looked up, the others are generated by ANGEL in batches of per_device_eval_batch_size.
+        Entities that ANGEL doesn't normalize to a MeSH term are None.
+        """
+        results = [None] * len(entities)
+        to_generate = []
+        for i, entity in enumerate(entities):
+            if entity in self.mesh_lookup:
+                mesh_entry = self.mesh_lookup[entity.strip().lower()]
+                results[i] = NormalizationResult(entity, mesh_entry.term, "MeSH", mesh_entry.id, 1.0)
+            else:
+                to_generate.append(i)
 
-        standard_name = run_sample(self.config, input_sentence, prefix_sentence, self.candidates).strip()
-        return NormalizationResult(entity, standard_name, "MeSH", self.mesh_lookup[standard_name].id, 1.0)
+        standard_names = self._generate([f"START {entities[i]} END" for i in to_generate],
+                                        [entities[i] for i in to_generate], category)
+        for i, standard_name in zip(to_generate, standard_names):
+            results[i] = self._to_result(entities[i], standard_name)
+        return results
 
-    def normalize_with_context(self, context: str, entity_begin: int, entity_end: int) -> NormalizationResult:
+    def normalize_with_context(self, context: str, entity_begin: int, entity_end: int,
+                               category: str = "all") -> NormalizationResult | None:
         entity = context[entity_begin:entity_end]
         input_sentence = context[:entity_begin] + "START " + entity + " END" + context[entity_end:]
-        prefix_sentence = f"{entity} is"
 
-        standard_name = run_sample(self.config, input_sentence, prefix_sentence, self.candidates).strip()
-        return NormalizationResult(entity, standard_name, "MeSH", self.mesh_lookup[standard_name].id, 1.0)
+        standard_name = self._generate([input_sentence], [entity], category)[0]
+        return self._to_result(entity, standard_name)
 
 
 if __name__ == "__main__":
+    from ANGEL.run_sample import run_sample
+    from ANGEL.utils import get_config
     from src.mesh.mesh_vocabulary import build_mesh_lookup
 
     mesh_lookup = build_mesh_lookup("desc2025.xml")
@@ -38,7 +79,7 @@ if __name__ == "__main__":
     input_sentence = "T cells from CRC patients were sorted, profiled by Smart-seq2 and sequenced on HiSeq4000. Based on FACS analysis, single cells of different subtypes, including START CD8+ T cells END (CD3+ and CD8+), T helper cells (CD3+, CD4+ and CD25-), and regulatory T cells (CD3+, CD4+ and CD25high) were sorted to perform RNA sequencing. The categories ?""sampleType"" column in the SAMPLES section? contain PTC(CD8+ T cells from peripheral blood), NTC(CD8+ T cells from adjacent normal colonrectal tissues) ,TTC (CD8+ T cells from tumor), PTH(CD3+, CD4+ and CD25- T cells from peripheral blood), NTH(CD3+, CD4+ and CD25- T cells from adjacent normal colonrectal tissues), TTH(CD3+, CD4+ and CD25- T cells from tumor), PTR(CD3+, CD4+ and CD25high T cells from peripheral blood), NTR(CD3+, CD4+ and CD25high T cells from adjacent normal colonrectal tissues), TTR(CD3+, CD4+ and CD25high T cells from tumor), PTY(CD3+, CD4+ and CD25mediate T cells from peripheral blood), NTY(CD3+, CD4+ and CD25mediate T cells from adjacent normal colonrectal tissues), TTY(CD3+, CD4+ and CD25medate T cells from tumor), PP7(CD3+, CD4+ T cells from peripheral blood), NP7(CD3+, CD4+ T cells from adjacent normal colonrectal tissues), TP7(CD3+, CD4+ T cells from tumor)."
     prefix_sentence = "CD8+ T cells is"
 
-    standard_name = run_sample(normalizer.config, input_sentence, prefix_sentence, normalizer.candidates)[0][0].strip()
+    standard_name = run_sample(get_config(), input_sentence, prefix_sentence, normalizer.candidates)[0][0].strip()
     print(standard_name)
 
     while True:
@@ -0,0 +1,46 @@
+"""
+Measures the throughput of the BERN2 standardization of cached GEO series, for example against
+a local stand-in server started with src/standardization/local_bern2_server.py:
+
+    python -m src.standardization.benchmark_bern2 --url http://127.0.0.1:8888/plain --datasets 500 --max-in-flight 8
+"""
+
+import argparse
+import itertools
+import time
+
+from src.config import config, logger
+from src.ingestion.load_cached_datasets import load_cached_datasets
+from src.standardization.bern2_cache import BERN2Cache
+from src.standardization.bern2_pipeline import BERN2Pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the throughput of the BERN2 standardization.")
+    parser.add_argument("--url", default=config.bern2_url)
+    parser.add_argument("--download-folder", default=config.download_folder,
+                        help="Folder with the cached GEO series")
+    parser.add_argument("--datasets", type=int, default=100, help="Number of cached series to standardize")
+    parser.add_argument("--max-in-flight", type=int, default=config.bern2_max_in_flight)
+    parser.add_argument("--lines", action="store_true", help="Annotate unique characteristic lines")
+    parser.add_argument("--cache", help="Path to a BERN2 annotations cache, no cache by default")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times to standardize the datasets")
+    args = parser.parse_args()
+
+    datasets = list(itertools.islice(load_cached_datasets(args.download_folder), args.datasets))
+    texts = [dataset.get_str_with_sample_characteristics() for dataset in datasets]
+    cache = BERN2Cache(args.cache, config.bern2_model_version, config.bern2_cache_max_size_mb) if args.cache else None
+    pipeline = BERN2Pipeline({}, {}, url=args.url, max_in_flight=args.max_in_flight, cache=cache)
+    batch = pipeline.batch_lines if args.lines else pipeline.batch
+
+    for run in range(args.repeat):
+        begin = time.perf_counter()
+        entities_per_text = batch(texts)
+        seconds = time.perf_counter() - begin
+        failed = sum(entities is None for entities in entities_per_text)
+        logger.info(f"Run {run + 1}: {len(texts)} datasets in {seconds:.2f}s, "
+                    f"{len(texts) / seconds:.1f} datasets/s, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,50 +17,69 @@ class BERN2AngelPipeline(BERN2Pipeline):
         self.angel = ANGELMeshNormalizer(mesh_lookup)
         self.must_normalize_to_mesh = must_normalize_to_mesh
         self.angel_cache = {}
-        self.cell_type_candidates = [key for key in mesh_lookup if is_term_in_one_of_categories(
-            key, mesh_lookup, ["A", "C04.588", "C04.557"])]
-        self.all_candidates = self.angel.candidates
+        self.angel.add_candidate_set("cell_type", [key for key in mesh_lookup if is_term_in_one_of_categories(
+            key, mesh_lookup, ["A", "C04.588", "C04.557"])])
+
+    def _must_normalize(self, annotation) -> bool:
+        return "CUI-less" in annotation["id"] or (self.must_normalize_to_mesh and not any(
+            term_id.startswith("mesh:") for term_id in annotation["id"]))
+
+    def preprocess_batch(self, annotations_per_text, texts):
+        """
+        Normalizes the uncached mentions of all texts with ANGEL at once, grouped by the category of their candidates.
+        """
+        mentions_per_category = {}
+        for annotations, text in zip(annotations_per_text, texts):
+            for annotation in annotations or []:
+                if not self._must_normalize(annotation):
+                    continue
+                self.assign_entity_type_based_on_line(annotation, text)
+                cache_key = self._cache_key(annotation)
+                if cache_key not in self.angel_cache:
+                    mentions_per_category.setdefault(self.get_candidate_category(annotation), set()).add(cache_key)
+
+        for category, cache_keys in mentions_per_category.items():
+            cache_keys = list(cache_keys)
+            normalizations = self.angel.normalize_entities([mention for mention, _ in cache_keys], category)
+            self.angel_cache.update(zip(cache_keys, normalizations))
 
     def preprocess_annotations(self, annotations, text):
         for annotation in annotations:
-            if "CUI-less" in annotation["id"] or (self.must_normalize_to_mesh and not any(
-                    term_id.startswith("mesh:") for term_id in annotation["id"])):
+            if self._must_normalize(annotation):
                 self.assign_entity_type_based_on_line(annotation, text)
                 mesh_id = self.normalize_to_mesh_id(annotation)
-                annotation["id"].append("mesh:" + mesh_id)
+                if mesh_id is not None:
+                    annotation["id"].append("mesh:" + mesh_id)
 
         return annotations
 
-    def normalize_to_mesh_id(self, annotation: Dict[str, str]) -> str:
+    @staticmethod
+    def _cache_key(annotation):
+        return annotation["mention"].strip().lower(), annotation["obj"]
+
+    def normalize_to_mesh_id(self, annotation: Dict[str, str]) -> str | None:
         """
         Normalizes the annotated mention and returns the normalized entity's 
         MeSH ID.
         :param anntotaion: BERN2 Annotation.
+        :return: MeSH ID or None if ANGEL didn't normalize the mention to a MeSH term.
         """
-        self.set_angel_candidates(annotation)
-        mention = annotation["mention"]
-        mention = mention.strip().lower()
-        entity_type = annotation["obj"]
-        cache_key = (mention, entity_type)
+        cache_key = self._cache_key(annotation)
         if cache_key in self.angel_cache:
-            return self.angel_cache[cache_key].cui
-
-        normalization = self.angel.normalize_entity(mention)
-        self.angel_cache[cache_key] = normalization
-        return normalization.cui
+            normalization = self.angel_cache[cache_key]
+        else:
+            normalization = self.angel.normalize_entity(cache_key[0], self.get_candidate_category(annotation))
+            self.angel_cache[cache_key] = normalization
+        return normalization.cui if normalization is not None else None
 
-    def set_angel_candidates(self, annotation: Dict[str, str]):
+    def get_candidate_category(self, annotation: Dict[str, str]) -> str:
         """
-        Sets the candidates ANGEL considers to match the entity type of the 
-        annotation.
-
         :param annotation: BERN2 annotation.
+        :return: Category of the candidates ANGEL considers to match the entity type of the annotation.
         """
-        entity_type = annotation["obj"]
-        if entity_type in ["cell_type", "cell_line"]:
-            self.angel.candidates = self.cell_type_candidates
-        else:
-            self.angel.candidates = self.all_candidates
+        if annotation["obj"] in ["cell_type", "cell_line"]:
+            return "cell_type"
+        return "all"
 
     def assign_entity_type_based_on_line(self, annotation, text):
         line = get_line_at_index(
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from os import path
+from typing import Dict, List
+
+from src.config import config
+from src.utils.lazy import lazy_resource
+
+logger = logging.getLogger(__name__)
+
+
+class BERN2Cache:
+    """
+    Persistent cache of BERN2 annotations in SQLite, keyed by the hash of the BERN2 model version and the text.
+    When the cache grows over max_size_mb, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path: str, model_version: str, max_size_mb: float):
+        """
+        :param db_path: Path to the SQLite database, created if it doesn't exist.
+        :param model_version: Version of the BERN2 models, change it to invalidate the cached annotations.
+        :param max_size_mb: Maximum size of the cached annotations in megabytes.
+        """
+        db_dir = path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.model_version = model_version
+        self.max_size = int(max_size_mb * 2 ** 20)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS annotations "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS last_access_index ON annotations (last_access)")
+        self.size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM annotations").fetchone()[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_version}\0{text}".encode()).hexdigest()
+
+    def get(self, text: str) -> List[Dict] | None:
+        """
+        :return: Cached annotations of the text or None if they are not cached.
+        """
+        key = self._key(text)
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM annotations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute("UPDATE annotations SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, text: str, annotations: List[Dict]):
+        response = json.dumps(annotations)
+        size = len(response)
+        key = self._key(text)
+        with self._lock, self._connection:
+            previous = self._connection.execute("SELECT size FROM annotations WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO annotations (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self.size += size - (previous[0] if previous else 0)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """
+        Evicts the least recently used entries until the cache takes 90% of its maximum size,
+        so that eviction doesn't run on every put.
+        """
+        target_size = 0.9 * self.max_size
+        evicted = 0
+        for key, size in self._connection.execute(
+                "SELECT key, size FROM annotations ORDER BY last_access, rowid").fetchall():
+            if self.size <= target_size:
+                break
+            self._connection.execute("DELETE FROM annotations WHERE key = ?", (key,))
+            self.size -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} BERN2 annotations from the cache")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits / lookups if lookups else 0.0,
+                    size_mb=self.size / 2 ** 20)
+
+
+@lazy_resource
+def get_bern2_cache() -> BERN2Cache | None:
+    """
+    :return: BERN2 annotations cache set in the [BERN2] section of config.ini or None if it is disabled.
+    """
+    if not config.bern2_cache_path:
+        return None
+    return BERN2Cache(config.bern2_cache_path, config.bern2_model_version, config.bern2_cache_max_size_mb)
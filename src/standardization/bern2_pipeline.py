@@ -1,16 +1,24 @@
-from typing import Dict
-from typing import List
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import List, Tuple
 
 import requests
+from tqdm import tqdm
 
 from src.config import config
 from src.ingestion.rate_limit import RateLimited
+from src.model.geo_dataset import GEO_DATASET_CHARCTERISTICS_STR_SEPARATOR
+from src.services.http_session import make_pooled_session
+from src.standardization.bern2_cache import BERN2Cache
 from src.standardization.entity_normalizer import EntityNormalizer, NormalizationResult
 from src.mesh.mesh_vocabulary import build_mesh_lookup
 from src.standardization.named_entity_recognizer import NamedEntityRecognizer, NamedEntity
 from src.standardization.ner_nen_pipeline import NER_NEN_Pipeline, PipelineResult
 
+logger = logging.getLogger(__name__)
+
 
 @RateLimited(max_per_second=3)
 def get_standard_name_bern2(text, mesh_id_map, mesh_lookup, url="http://bern2.korea.ac.kr/plain") -> str | None:
@@ -35,43 +43,131 @@ def get_standard_name_bern2(text, mesh_id_map, mesh_lookup, url="http://bern2.ko
 
 class BERN2Error(Exception):
     def __init__(self, *args):
-        super().__init__(*args)()
+        super().__init__(*args)
 
 
 class BERN2Pipeline(NER_NEN_Pipeline):
     def __init__(self, mesh_id_to_term_map: Dict[str, str], ncbi_gene: Dict[str, str],
-                 url: str = "http://localhost:8888/plain"):
+                 url: str = "http://localhost:8888/plain", max_in_flight: int = config.bern2_max_in_flight,
+                 timeout: float = config.bern2_timeout, retries: int = config.bern2_retries,
+                 cache: BERN2Cache | None = None):
+        """
+        :param url: URL of the BERN2 /plain endpoint.
+        :param max_in_flight: Maximum number of concurrent requests in batch(), tune it to the BERN2 instance.
+        :param timeout: Timeout of a request in seconds.
+        :param retries: Number of retries of failed or timed out requests.
+        :param cache: Cache of BERN2 annotations consulted before requesting BERN2.
+        """
         self.url = url
         self.mesh_id_to_term_map = mesh_id_to_term_map
         self.ncbi_gene = ncbi_gene
+        self.timeout = timeout
+        self.session = make_pooled_session(pool_size=max_in_flight, retries=retries, allowed_methods=("POST",))
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="bern2")
+        self.cache = cache
 
     def preprocess_annotations(self, annotations, text):
         return annotations
 
+    def fetch_annotations(self, text: str) -> List[Dict]:
+        """
+        Annotates the text with BERN2, the annotations are taken from the cache if they are cached.
+        :return: BERN2 annotations.
+        """
+        if self.cache is None:
+            return self._request_annotations(text)
+        annotations = self.cache.get(text)
+        if annotations is None:
+            annotations = self._request_annotations(text)
+            self.cache.put(text, annotations)
+        return annotations
+
     @RateLimited(config.bern2_rate_limit)
+    def _request_annotations(self, text: str) -> List[Dict]:
+        try:
+            response = self.session.post(self.url, json={'text': text}, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise BERN2Error(f"BERN2 API Failure: {e}")
+        if response.status_code != 200:
+            raise BERN2Error(f"BERN2 API Failure, status {response.status_code}: {response.text}")
+
+        cleaned_response = response.text.replace(": NaN", ": -1")
+        return json.loads(cleaned_response)["annotations"]
+
     def __call__(self, text: str) -> List[PipelineResult]:
-        response = None
-        tries = 0
-        while tries < 3:
+        return self.to_entities(self.fetch_annotations(text), text)
+
+    def batch(self, texts: List[str]) -> List[List[PipelineResult] | None]:
+        """
+        Annotates texts with up to max_in_flight concurrent BERN2 requests.
+        Annotations are converted to entities in the calling thread once all texts are annotated.
+
+        :param texts: Texts to annotate.
+        :return: Entities of each text in the order of texts, None for texts BERN2 failed on.
+        """
+        futures = [self.executor.submit(self.fetch_annotations, text) for text in texts]
+        annotations_per_text = []
+        for text, future in zip(texts, tqdm(futures, desc="BERN2")):
             try:
-                response = requests.post(
-                    self.url, json={'text': text}, timeout=30)
-                if response.status_code == 200:
-                    break
-                else:
-                    print("BERN2 non-200 status:", response.text)
-            except requests.exceptions.ReadTimeout as e:
-                print("BERN2 Timeout")
-                print("Input:")
-                print(text)
-            tries += 1
-            if tries == 3:
-                raise BERN2Error("BERN2 API Failure")
+                annotations_per_text.append(future.result())
+            except BERN2Error as e:
+                logger.error(f"{e}\nInput:\n{text}")
+                annotations_per_text.append(None)
+        if self.cache is not None:
+            logger.info(f"BERN2 cache: {self.cache.stats()}")
+        return self._batch_to_entities(annotations_per_text, texts)
 
-        cleaned_response = response.text.replace(": NaN", ": -1")
-        response = json.loads(cleaned_response)
+    def batch_lines(self, texts: List[str], separator: str = GEO_DATASET_CHARCTERISTICS_STR_SEPARATOR
+                    ) -> List[List[PipelineResult] | None]:
+        """
+        Annotates texts line by line, lines repeated across texts such as "organism: homo sapiens" are sent
+        to BERN2 once. Spans of the line annotations are shifted to the positions of the lines in each text.
 
-        annotations = response["annotations"]
+        :param texts: Texts to annotate.
+        :param separator: Separator of the lines in the texts.
+        :return: Entities of each text in the order of texts, None for texts BERN2 failed on all lines of.
+        Lines BERN2 failed on are left out.
+        """
+        lines_per_text = [_split_with_offsets(text, separator) for text in texts]
+        unique_lines = list(dict.fromkeys(line for lines in lines_per_text for line, _ in lines))
+        logger.info(f"Annotating {len(unique_lines)} unique lines of {sum(map(len, lines_per_text))} lines, "
+                    f"{sum(map(len, unique_lines))} of {sum(map(len, texts))} characters")
+        futures = [self.executor.submit(self.fetch_annotations, line) for line in unique_lines]
+        annotations_per_line = {}
+        for line, future in zip(unique_lines, tqdm(futures, desc="BERN2")):
+            try:
+                annotations_per_line[line] = future.result()
+            except BERN2Error as e:
+                logger.error(f"{e}\nInput:\n{line}")
+        if self.cache is not None:
+            logger.info(f"BERN2 cache: {self.cache.stats()}")
+
+        annotations_per_text = []
+        for lines in lines_per_text:
+            annotated_lines = [(line, offset) for line, offset in lines if line in annotations_per_line]
+            if lines and not annotated_lines:
+                annotations_per_text.append(None)
+                continue
+            annotations_per_text.append([_shift_annotation(annotation, offset) for line, offset in annotated_lines
+                                         for annotation in annotations_per_line[line]])
+        return self._batch_to_entities(annotations_per_text, texts)
+
+    def preprocess_batch(self, annotations_per_text: List[List[Dict] | None], texts: List[str]):
+        """
+        Preprocesses the annotations of all texts of a batch at once, before preprocess_annotations
+        is called for every text.
+
+        :param annotations_per_text: Annotations of each text, None for texts BERN2 failed on.
+        :param texts: Annotated texts.
+        """
+
+    def _batch_to_entities(self, annotations_per_text: List[List[Dict] | None], texts: List[str]
+                           ) -> List[List[PipelineResult] | None]:
+        self.preprocess_batch(annotations_per_text, texts)
+        return [self.to_entities(annotations, text) if annotations is not None else None
+                for annotations, text in zip(annotations_per_text, texts)]
+
+    def to_entities(self, annotations: List[Dict], text: str) -> List[PipelineResult]:
         annotations = self.preprocess_annotations(annotations, text)
 
         entities = []
@@ -97,6 +193,30 @@ class BERN2Pipeline(NER_NEN_Pipeline):
         return entities
 
 
+def _split_with_offsets(text: str, separator: str) -> List[Tuple[str, int]]:
+    """
+    :return: Non-empty lines of the text with their offsets in the text.
+    """
+    lines = []
+    offset = 0
+    for line in text.split(separator):
+        if line.strip():
+            lines.append((line, offset))
+        offset += len(line) + len(separator)
+    return lines
+
+
+def _shift_annotation(annotation: Dict, offset: int) -> Dict:
+    """
+    :return: Copy of the annotation with the span shifted by offset.
+    Annotations of a line are shared by texts, so the copied ids can be modified by preprocess_annotations.
+    """
+    shifted = dict(annotation, id=list(annotation["id"]))
+    if "span" in annotation:
+        shifted["span"] = {"begin": annotation["span"]["begin"] + offset, "end": annotation["span"]["end"] + offset}
+    return shifted
+
+
 class BERN2Recognizer(NamedEntityRecognizer):
     def __init__(self, url: str = "http://localhost:8888/plain"):
         self.url = url
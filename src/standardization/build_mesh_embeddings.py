@@ -0,0 +1,38 @@
+"""
+Precomputes the files FasttextNormalizer loads memory-mapped, so that normalizers start in seconds and
+processes share the pages of the vectors:
+- <fasttext model>.kv, <fasttext model>.kv.vectors.npy: fastText vectors in the native gensim format
+- <fasttext model>.mesh_*.keys.json, <fasttext model>.mesh_*.npy: MeSH terms and their normalized vectors
+- <fasttext model>.mesh_*.hnsw: HNSW index of the MeSH term vectors, only if hnswlib is installed
+
+    python -m src.standardization.build_mesh_embeddings --fasttext-model BioWordVec_PubMed_MIMICIII_d200.vec.bin
+"""
+
+import argparse
+import time
+from os import path
+
+from src.config import logger
+from src.mesh.mesh_vocabulary import build_mesh_lookup
+from src.standardization.get_standard_name_fasttext import FasttextNormalizer, native_keyed_vectors_path, \
+    save_native_keyed_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomputes the fastText vectors of the MeSH terms.")
+    parser.add_argument("--fasttext-model", default="BioWordVec_PubMed_MIMICIII_d200.vec.bin",
+                        help="fastText vectors in the binary word2vec format")
+    parser.add_argument("--mesh", default="desc2025.xml", help="MeSH descriptors XML")
+    parser.add_argument("--exact", action="store_true", help="Don't build the HNSW index of the MeSH term vectors")
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    if not path.isfile(native_keyed_vectors_path(args.fasttext_model)):
+        save_native_keyed_vectors(args.fasttext_model)
+        logger.info(f"Saved the fastText vectors to {native_keyed_vectors_path(args.fasttext_model)}")
+    normalizer = FasttextNormalizer(args.fasttext_model, build_mesh_lookup(args.mesh), use_ann_index=not args.exact)
+    logger.info(f"Embedded {len(normalizer.mesh_ids)} MeSH terms in {time.perf_counter() - begin:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,136 @@
+import hashlib
+import logging
+import time
+from os import path
+from typing import List, Tuple
+
 import numpy as np
 from gensim.models import KeyedVectors
 from nltk import download, word_tokenize
-from nltk.corpus import stopwords
-from scipy.spatial.distance import cosine
 
 from src.standardization.entity_normalizer import EntityNormalizer, NormalizationResult
+from src.standardization.wmd_reranker import WMDReranker
+from src.utils.ann_index import ANNIndex
+from src.utils.lazy import lazy_resource
+
+logger = logging.getLogger(__name__)
+
 
-download('stopwords')  # Download stopwords list.
-download('punkt_tab')
-stop_words = stopwords.words('english')
+@lazy_resource
+def download_nltk_data():
+    download('stopwords')  # Download stopwords list.
+    download('punkt_tab')
+    return True
 
 
 def preprocess(sentence):
+    download_nltk_data()
     return word_tokenize(sentence.strip().lower())
 
 
+def native_keyed_vectors_path(fasttext_model_path) -> str:
+    return f"{fasttext_model_path}.kv"
+
+
+def save_native_keyed_vectors(fasttext_model_path, binary_model=True):
+    """
+    Converts the fastText vectors from the word2vec format to the native gensim format next to the model.
+    The vectors are then saved as a separate .npy file that normalizers memory-map read-only,
+    so that processes share the pages of the vectors instead of reading a copy each.
+    """
+    model = KeyedVectors.load_word2vec_format(fasttext_model_path, binary=binary_model)
+    model.save(native_keyed_vectors_path(fasttext_model_path), sep_limit=0)
+
+
+def load_keyed_vectors(fasttext_model_path, binary_model=True) -> KeyedVectors:
+    """
+    Loads the fastText vectors memory-mapped from the native gensim format if they were converted
+    with save_native_keyed_vectors, otherwise reads them from the word2vec format.
+    """
+    native_path = native_keyed_vectors_path(fasttext_model_path)
+    if path.isfile(native_path):
+        return KeyedVectors.load(native_path, mmap="r")
+    return KeyedVectors.load_word2vec_format(fasttext_model_path, binary=binary_model)
+
+
 class FasttextNormalizer(EntityNormalizer):
-    def __init__(self, fasttext_model_path, mesh_lookup, binary_model=True):
+    def __init__(self, fasttext_model_path, mesh_lookup, binary_model=True, use_ann_index=True):
+        """
+        :param fasttext_model_path: Path to the fastText vectors in the word2vec format.
+        :param mesh_lookup: MeSH lookup or map of MeSH terms to their IDs.
+        :param use_ann_index: Whether to search MeSH terms in an HNSW index if hnswlib is installed,
+        otherwise the search is brute-force. The index of the MeSH term vectors is saved next to the model
+        and memory-mapped instead of embedding the MeSH terms again, see src/standardization/build_mesh_embeddings.py.
+        """
         begin = time.time()
-        self.model = KeyedVectors.load_word2vec_format(
-            fasttext_model_path, binary=binary_model)
+        self.model = load_keyed_vectors(fasttext_model_path, binary_model)
         self.model.fill_norms()
         end = time.time()
         print("Fasttext load time", end - begin)
 
         begin = time.time()
-        self.mesh_embeddings = []
-        for term, entry_or_id in mesh_lookup.items():
-            term_id = entry_or_id.id if not isinstance(
-                entry_or_id, str) else entry_or_id
-            self.mesh_embeddings.append(
-                (term_id, term, self.model.get_mean_vector(preprocess(term))))
+        mesh_ids = {term: entry_or_id.id if not isinstance(entry_or_id, str) else entry_or_id
+                    for term, entry_or_id in mesh_lookup.items()}
+        index_path = self._mesh_index_path(fasttext_model_path, mesh_ids, use_ann_index)
+        if path.isfile(f"{index_path}.keys.json"):
+            self.mesh_index = ANNIndex.load(index_path, mmap=True)
+        else:
+            self.mesh_index = self._build_mesh_index(mesh_ids, use_ann_index)
+            try:
+                self.mesh_index.save(index_path)
+            except OSError as e:
+                logger.warning(f"Could not save the index of MeSH term vectors to {index_path}: {e}")
+        self.mesh_ids = {term: mesh_ids[term] for term in self.mesh_index.keys}
+        self.wmd_reranker = WMDReranker(self.model)
         end = time.time()
-        print(self.mesh_embeddings[0])
+        print("MeSH embeddings time", end - begin)
+
+    @staticmethod
+    def _mesh_index_path(fasttext_model_path, mesh_ids, use_ann_index) -> str:
+        """
+        :return: Path of the index of the MeSH term vectors next to the model, specific to
+        the MeSH terms and the model version, so that a stale index is never loaded.
+        """
+        fingerprint = hashlib.sha256()
+        for term in sorted(mesh_ids):
+            fingerprint.update(f"{term}\t{mesh_ids[term]}\n".encode())
+        fingerprint.update(str(path.getmtime(fasttext_model_path)).encode())
+        kind = "hnsw" if use_ann_index else "exact"
+        return f"{fasttext_model_path}.mesh_{kind}_{fingerprint.hexdigest()[:16]}"
+
+    def _build_mesh_index(self, mesh_ids, use_ann_index) -> ANNIndex:
+        # MeSH terms whose tokens are all out of the vocabulary can't be compared by cosine distance
+        terms = []
+        vectors = []
+        for term in mesh_ids:
+            vector = self._embed(term)
+            if np.any(vector):
+                terms.append(term)
+                vectors.append(vector)
+        return ANNIndex.build(terms, np.array(vectors), use_hnsw=use_ann_index)
+
+    def _embed(self, name: str) -> np.ndarray:
+        tokens = preprocess(name)
+        if not tokens:
+            return np.zeros(self.model.vector_size, dtype=np.float32)
+        return self.model.get_mean_vector(tokens)
+
+    def _get_standard_names_cosine(self, names: List[str], top_k: int = 5) -> List[List[Tuple[str, str, float]]]:
+        """
+        Finds the MeSH terms closest to each name by the cosine distance of the mean fastText vectors of their tokens.
+
+        :return: For each name, up to top_k (MeSH ID, MeSH term, cosine distance) tuples ordered by distance,
+        empty if the name can't be embedded.
+        """
+        name_vectors = np.array([self._embed(name) for name in names]).reshape(len(names), self.model.vector_size)
+        embedded = np.flatnonzero(np.any(name_vectors, axis=1))
+        similarities = [[] for _ in names]
+        for i, neighbours in zip(embedded, self.mesh_index.query(name_vectors[embedded], top_k)):
+            similarities[i] = [(self.mesh_ids[term], term, 1 - similarity) for term, similarity in neighbours]
+        return similarities
 
     def _get_standard_name_cosine(self, name, top_k: int = 5):
-        tokenized_name = preprocess(name)
-        name_embedding = self.model.get_mean_vector(tokenized_name)
-        term_similarities = []
-
-        for id, mesh_term, mesh_embedding in self.mesh_embeddings:
-            score = cosine(name_embedding, mesh_embedding)
-            term_similarities.append((id, mesh_term, score))
-
-        term_similarities = list(
-            filter(lambda x: not np.isnan(x[2]), term_similarities))
-        top_similarities = list(
-            sorted(term_similarities, key=lambda x: x[2]))[:top_k]
+        top_similarities = self._get_standard_names_cosine([name], top_k)[0]
         if len(top_similarities) == 0:
             raise ValueError("Could not embed term " + name)
         return top_similarities
@@ -57,6 +141,18 @@ class FasttextNormalizer(EntityNormalizer):
     def get_standard_name_with_score(self, name, top_k: int = 5):
         return [sim[1:3] for sim in self._get_standard_name_cosine(name, top_k)]
 
+    def get_standard_names(self, names: List[str], top_k: int = 5) -> List[List[str]]:
+        """
+        Batched get_standard_name, names that can't be embedded get no standard names.
+        """
+        return [[sim[1] for sim in similarities] for similarities in self._get_standard_names_cosine(names, top_k)]
+
+    def get_standard_names_with_score(self, names: List[str], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """
+        Batched get_standard_name_with_score, names that can't be embedded get no standard names.
+        """
+        return [[sim[1:3] for sim in similarities] for similarities in self._get_standard_names_cosine(names, top_k)]
+
     def get_standard_name_reranked(self, name, top_k: int = 50, n_output_terms=5):
         term_similarities = self._get_standard_name_cosine(name, top_k * 3)
         name = preprocess(name)
@@ -69,18 +165,13 @@ class FasttextNormalizer(EntityNormalizer):
             if similarity[0] in seen_ids:
                 continue
             seen_ids.add(similarity[0])
-            top_synonyms.append((
-                similarity[0],
-                similarity[1],
-                self.model.wmdistance(name, preprocess(similarity[1]))
-            ))
+            top_synonyms.append(similarity[:2])
             top_k -= 1
 
         # rerank
-        top_synonyms = [
-            synonym for synonym in top_synonyms if not np.isnan(synonym[2])]
-        top_synonyms = list(sorted(top_synonyms, key=lambda x: x[2]))
-        return [synonym_score for synonym_score in top_synonyms[:n_output_terms]]
+        reranked = self.wmd_reranker.rerank(name, [preprocess(synonym[1]) for synonym in top_synonyms],
+                                            n_output_terms)
+        return [(*top_synonyms[i], distance) for i, distance in reranked]
 
     def normalize_entity(self, entity):
         scores = self.get_standard_name_reranked(entity)
@@ -93,7 +184,6 @@ class FasttextNormalizer(EntityNormalizer):
 
 if __name__ == "__main__":
     from src.mesh.mesh_vocabulary import build_mesh_lookup
-    import time
 
     mesh_lookup = build_mesh_lookup("desc2025.xml")
     begin = time.time()
@@ -0,0 +1,143 @@
+"""
+Lightweight stand-in for the BERN2 /plain endpoint to benchmark the standardization on machines without a GPU.
+Texts are annotated by matching MeSH terms and their synonyms, or by replaying annotations recorded
+in a BERN2 annotations cache. The latency and the number of requests processed at once are tunable
+to resemble a real BERN2 instance.
+
+    python -m src.standardization.local_bern2_server --mesh desc2025.xml --latency 0.2 --workers 2
+"""
+
+import argparse
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from flask import Flask, request, jsonify
+
+from src.config import config
+from src.mesh.mesh_vocabulary import MeshEntry, build_mesh_lookup
+from src.standardization.bern2_cache import BERN2Cache
+
+# Entity types BERN2 assigns to the MeSH tree numbers, the first matching prefix wins
+MESH_TREE_ENTITY_TYPES = [
+    ("A11", "cell_type"),
+    ("B01", "species"),
+    ("C", "disease"),
+    ("D", "drug"),
+    ("F03", "disease"),
+]
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _normalize_term(term: str) -> str:
+    return " ".join(_TOKEN_PATTERN.findall(term.lower()))
+
+
+def _entity_type(entry: MeshEntry) -> str | None:
+    for prefix, entity_type in MESH_TREE_ENTITY_TYPES:
+        if any(tree_number.startswith(prefix) for tree_number in entry.tree_numbers):
+            return entity_type
+    return None
+
+
+class DictionaryAnnotator:
+    """
+    Annotates the longest MeSH terms found in the text, token by token.
+    Only terms in the MeSH trees of MESH_TREE_ENTITY_TYPES are annotated.
+    """
+
+    def __init__(self, mesh_lookup: Dict[str, MeshEntry]):
+        self.terms = {}
+        for term, entry in mesh_lookup.items():
+            entity_type = _entity_type(entry)
+            normalized_term = _normalize_term(term)
+            if entity_type and normalized_term:
+                self.terms[normalized_term] = (entry.id, entity_type)
+        self.max_term_tokens = max((term.count(" ") + 1 for term in self.terms), default=0)
+
+    def __call__(self, text: str) -> List[Dict]:
+        tokens = list(_TOKEN_PATTERN.finditer(text))
+        annotations = []
+        i = 0
+        while i < len(tokens):
+            for n_tokens in range(min(self.max_term_tokens, len(tokens) - i), 0, -1):
+                match = self.terms.get(" ".join(token.group().lower() for token in tokens[i:i + n_tokens]))
+                if match:
+                    begin, end = tokens[i].start(), tokens[i + n_tokens - 1].end()
+                    mesh_id, entity_type = match
+                    annotations.append({
+                        "mention": text[begin:end], "obj": entity_type, "id": [f"mesh:{mesh_id}"], "prob": 1.0,
+                        "span": {"begin": begin, "end": end},
+                    })
+                    i += n_tokens
+                    break
+            else:
+                i += 1
+        return annotations
+
+
+class ReplayAnnotator:
+    """
+    Replays the annotations recorded in a BERN2 annotations cache, texts that weren't recorded
+    are annotated by the fallback annotator.
+    """
+
+    def __init__(self, cache: BERN2Cache, fallback: DictionaryAnnotator | None = None):
+        self.cache = cache
+        self.fallback = fallback
+
+    def __call__(self, text: str) -> List[Dict]:
+        annotations = self.cache.get(text)
+        if annotations is None:
+            annotations = self.fallback(text) if self.fallback else []
+        return annotations
+
+
+def create_app(annotator, latency: float = 0.0, latency_per_char: float = 0.0, workers: int = 1) -> Flask:
+    """
+    :param annotator: Function annotating a text.
+    :param latency: Seconds every request takes at least.
+    :param latency_per_char: Seconds added to the latency for every character of the text.
+    :param workers: Number of requests processed at once, others wait as on a BERN2 instance.
+    """
+    app = Flask(__name__)
+    slots = threading.Semaphore(workers)
+
+    @app.route("/plain", methods=["POST"])
+    def plain():
+        text = request.get_json()["text"]
+        with slots:
+            time.sleep(latency + latency_per_char * len(text))
+            annotations = annotator(text)
+        return jsonify(annotations=annotations, text=text, timestamp=datetime.now().strftime("%c"))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves a BERN2-compatible /plain endpoint without BERN2 models.")
+    parser.add_argument("--mesh", default="desc2025.xml", help="MeSH descriptors XML to annotate texts with")
+    parser.add_argument("--replay-cache", help="BERN2 annotations cache to replay the annotations from")
+    parser.add_argument("--model-version", help="BERN2 model version of the replayed annotations")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every request takes at least")
+    parser.add_argument("--latency-per-char", type=float, default=0.0,
+                        help="Seconds added to the latency for every character of the text")
+    parser.add_argument("--workers", type=int, default=1, help="Number of requests processed at once")
+    args = parser.parse_args()
+
+    annotator = DictionaryAnnotator(build_mesh_lookup(args.mesh))
+    if args.replay_cache:
+        cache = BERN2Cache(args.replay_cache, args.model_version or config.bern2_model_version,
+                           config.bern2_cache_max_size_mb)
+        annotator = ReplayAnnotator(cache, annotator)
+    app = create_app(annotator, args.latency, args.latency_per_char, args.workers)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import collections
+import math
+from typing import List, Tuple
+
+import numpy as np
+from gensim.models import KeyedVectors
+from scipy.spatial.distance import cdist
+
+from src.config.config import WMD_CACHE_SIZE
+
+
+class WMDReranker:
+    """
+    Reranks candidates by Word Mover's Distance (WMD) to a document as KeyedVectors.wmdistance computes it.
+    Candidates are visited in the order of cheap lower bounds of WMD, the word centroid distance and
+    the relaxed WMD, and exact WMD is computed only until no remaining candidate can enter the top n
+    (Kusner et al. "From Word Embeddings To Document Distances").
+    Exact distances are cached, so repeated (document, candidate) pairs are not solved again.
+    """
+
+    def __init__(self, model: KeyedVectors, cache_size: int = WMD_CACHE_SIZE):
+        self.model = model
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.exact_computations = 0
+
+    def _bag_of_words(self, document: List[str]) -> Tuple[np.ndarray, np.ndarray] | None:
+        """
+        :return: Tuple (normalized vectors of the unique in-vocabulary words, frequencies of the words)
+        or None if no word is in the vocabulary.
+        """
+        counts = collections.Counter(token for token in document if token in self.model)
+        if not counts:
+            return None
+        vectors = np.array([self.model.get_vector(token, norm=True) for token in counts])
+        weights = np.array(list(counts.values()), dtype=np.float64)
+        return vectors, weights / weights.sum()
+
+    def lower_bound(self, document: List[str], candidate: List[str]) -> float:
+        """
+        :return: Maximum of the word centroid distance and the relaxed WMD, which are lower bounds of WMD.
+        """
+        return self._lower_bound(self._bag_of_words(document), self._bag_of_words(candidate))
+
+    @staticmethod
+    def _lower_bound(document_bow, candidate_bow) -> float:
+        if document_bow is None or candidate_bow is None:
+            return math.inf
+        document_vectors, document_weights = document_bow
+        candidate_vectors, candidate_weights = candidate_bow
+        centroid_distance = np.linalg.norm(document_weights @ document_vectors - candidate_weights @ candidate_vectors)
+        distances = cdist(document_vectors, candidate_vectors)
+        relaxed_wmd = max(document_weights @ distances.min(axis=1), candidate_weights @ distances.min(axis=0))
+        return float(max(centroid_distance, relaxed_wmd))
+
+    def distance(self, document: List[str], candidate: List[str]) -> float:
+        """
+        :return: Exact WMD between the document and the candidate, cached.
+        """
+        key = (tuple(document), tuple(candidate))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        distance = self.model.wmdistance(document, candidate)
+        self.exact_computations += 1
+        self.cache[key] = distance
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return distance
+
+    def rerank(self, document: List[str], candidates: List[List[str]], n: int) -> List[Tuple[int, float]]:
+        """
+        Finds the n candidates closest to the document by WMD.
+
+        :param document: Tokens of the document.
+        :param candidates: Tokens of each candidate.
+        :param n: Number of candidates to return.
+        :return: List of (index of the candidate, WMD) pairs ordered by WMD, candidates with NaN WMD are left out.
+        """
+        if n <= 0:
+            return []
+        document_bow = self._bag_of_words(document)
+        bounds = [self._lower_bound(document_bow, self._bag_of_words(candidate)) for candidate in candidates]
+        ranked = []
+        for i in sorted(range(len(candidates)), key=lambda i: bounds[i]):
+            if len(ranked) >= n and bounds[i] >= ranked[n - 1][1]:
+                break
+            distance = self.distance(document, candidates[i])
+            if not math.isnan(distance):
+                ranked.append((i, distance))
+                ranked.sort(key=lambda pair: (pair[1], pair[0]))
+        return ranked[:n]
@@ -0,0 +1,155 @@
+"""
+Approximate nearest-neighbour index over row vectors identified by string keys, using cosine similarity.
+HNSW from hnswlib is used if it is installed, otherwise queries are exact brute-force searches.
+
+Files of an index saved at <index_path>:
+- <index_path>.keys.json: keys of the rows
+- <index_path>.npy: normalized float32 vectors, used for brute-force search and to look up vectors by key
+- <index_path>.hnsw: HNSW graph, only if hnswlib is installed
+"""
+
+import json
+import logging
+from os import path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from src.config.config import ANN_HNSW_M, ANN_HNSW_EF_CONSTRUCTION, ANN_HNSW_EF_SEARCH, ANN_BRUTE_FORCE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class ANNIndex:
+    def __init__(self, dim: int, use_hnsw: bool = True):
+        """
+        :param dim: Dimension of the vectors.
+        :param use_hnsw: Whether to build an HNSW graph if hnswlib is installed.
+        """
+        self.dim = dim
+        self.keys: List[str] = []
+        self.key_to_row = {}
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.hnsw = None
+        if use_hnsw:
+            try:
+                import hnswlib
+                self.hnsw = hnswlib.Index(space="cosine", dim=dim)
+                self.hnsw.init_index(max_elements=1024, ef_construction=ANN_HNSW_EF_CONSTRUCTION, M=ANN_HNSW_M)
+                self.hnsw.set_ef(ANN_HNSW_EF_SEARCH)
+            except ImportError:
+                logger.info("hnswlib is not installed, using brute-force nearest-neighbour search")
+
+    @classmethod
+    def build(cls, keys: Sequence[str], vectors, use_hnsw: bool = True) -> "ANNIndex":
+        index = cls(np.shape(vectors)[1], use_hnsw)
+        index.add(keys, vectors)
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key: str):
+        return key in self.key_to_row
+
+    def add(self, keys: Sequence[str], vectors):
+        """
+        Adds vectors to the index. Vectors of keys that are already in the index are replaced.
+        """
+        vectors = _normalize(vectors)
+        rows = []
+        new_keys = []
+        for key in keys:
+            if key in self.key_to_row:
+                rows.append(self.key_to_row[key])
+            else:
+                self.key_to_row[key] = len(self.keys) + len(new_keys)
+                rows.append(self.key_to_row[key])
+                new_keys.append(key)
+        self.keys.extend(new_keys)
+        self.vectors = np.concatenate([self.vectors, np.zeros((len(new_keys), self.dim), dtype=np.float32)])
+        rows = np.array(rows, dtype=np.int64)
+        self.vectors[rows] = vectors
+        if self.hnsw is not None and len(rows):
+            if len(self.keys) > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(len(self.keys), 2 * self.hnsw.get_max_elements()))
+            self.hnsw.add_items(vectors, rows)
+
+    def get_vector(self, key: str) -> np.ndarray:
+        return self.vectors[self.key_to_row[key]]
+
+    def query(self, vectors, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """
+        Finds the nearest neighbours of each vector.
+
+        :param vectors: Query vector or matrix of query vectors.
+        :param k: Number of neighbours to return for each query.
+        :return: For each query, list of (key, cosine similarity) pairs ordered by decreasing similarity.
+        """
+        vectors = _normalize(vectors)
+        k = min(k, len(self.keys))
+        if k == 0 or len(vectors) == 0:
+            return [[] for _ in range(len(vectors))]
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(ANN_HNSW_EF_SEARCH, k))
+            rows, distances = self.hnsw.knn_query(vectors, k=k)
+            similarities = 1 - distances
+        else:
+            batches = [self._brute_force_query(vectors[begin:begin + ANN_BRUTE_FORCE_BATCH_SIZE], k)
+                       for begin in range(0, len(vectors), ANN_BRUTE_FORCE_BATCH_SIZE)]
+            rows = np.vstack([batch_rows for batch_rows, _ in batches])
+            similarities = np.vstack([batch_similarities for _, batch_similarities in batches])
+        return [[(self.keys[row], float(similarity)) for row, similarity in zip(query_rows, query_similarities)]
+                for query_rows, query_similarities in zip(rows, similarities)]
+
+    def _brute_force_query(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        all_similarities = vectors @ self.vectors.T
+        rows = np.argpartition(-all_similarities, k - 1, axis=1)[:, :k]
+        similarities = np.take_along_axis(all_similarities, rows, axis=1)
+        order = np.argsort(-similarities, axis=1)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(similarities, order, axis=1)
+
+    def query_key(self, key: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Finds the k nearest neighbours of a vector in the index, excluding the vector itself.
+        """
+        neighbours = self.query(self.get_vector(key), k + 1)[0]
+        return [(neighbour, similarity) for neighbour, similarity in neighbours if neighbour != key][:k]
+
+    def save(self, index_path: str):
+        with open(f"{index_path}.keys.json", "w") as f:
+            json.dump(self.keys, f)
+        np.save(f"{index_path}.npy", self.vectors)
+        if self.hnsw is not None:
+            self.hnsw.save_index(f"{index_path}.hnsw")
+
+    @classmethod
+    def load(cls, index_path: str, mmap: bool = False) -> "ANNIndex":
+        """
+        Loads an index saved with save(). The HNSW graph is loaded if hnswlib is installed.
+
+        :param index_path: Path the index was saved to.
+        :param mmap: Whether to memory-map the vectors read-only instead of reading them into memory.
+        """
+        with open(f"{index_path}.keys.json") as f:
+            keys = json.load(f)
+        vectors = np.load(f"{index_path}.npy", mmap_mode="r" if mmap else None)
+        index = cls(vectors.shape[1], use_hnsw=False)
+        index.keys = keys
+        index.key_to_row = {key: row for row, key in enumerate(keys)}
+        index.vectors = vectors
+        if path.isfile(f"{index_path}.hnsw"):
+            try:
+                import hnswlib
+                index.hnsw = hnswlib.Index(space="cosine", dim=index.dim)
+                index.hnsw.load_index(f"{index_path}.hnsw", max_elements=len(keys))
+                index.hnsw.set_ef(ANN_HNSW_EF_SEARCH)
+            except ImportError:
+                logger.info("hnswlib is not installed, using brute-force nearest-neighbour search")
+        return index
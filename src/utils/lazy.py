@@ -0,0 +1,40 @@
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_loaders = []
+
+
+def lazy_resource(func):
+    """
+    Decorator for loaders of heavy resources such as models and vocabularies.
+    The resource is loaded on the first call, once per process, and the load time is logged.
+    Use warmup() to load all resources in advance.
+    """
+    lock = threading.Lock()
+    resource = []
+
+    @functools.wraps(func)
+    def loader():
+        if not resource:
+            with lock:
+                if not resource:
+                    begin = time.perf_counter()
+                    resource.append(func())
+                    logger.info(f"Loaded {func.__module__}.{func.__name__} in {time.perf_counter() - begin:.2f}s")
+        return resource[0]
+
+    loader.is_loaded = lambda: bool(resource)
+    _loaders.append(loader)
+    return loader
+
+
+def warmup():
+    """
+    Loads all the lazy resources of the imported modules, for example, before a server starts accepting requests.
+    """
+    for loader in _loaders:
+        loader()
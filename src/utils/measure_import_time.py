@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+# Modules that are imported by the app, the bokeh server, CLIs and workers
+MODULES = [
+    "src.config",
+    "src.model.geo_dataset",
+    "src.analysis.chunking",
+    "src.analysis.text",
+    "src.analysis.analyzer",
+    "src.standardization.get_standard_name_fasttext",
+    "src.app.app",
+]
+
+
+def measure_import_time(module: str) -> float:
+    """
+    Measures how long it takes to import a module in a fresh interpreter.
+
+    :param module: Name of the module to import.
+    :return: Import time in seconds.
+    """
+    code = f"import time; begin = time.perf_counter(); import {module}; print(time.perf_counter() - begin)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.utils.measure_import_time [module ...]
+    # Use python -X importtime -c "import <module>" for a per-module breakdown
+    for module in sys.argv[1:] or MODULES:
+        try:
+            print(f"{module}: {measure_import_time(module):.2f}s")
+        except subprocess.CalledProcessError as e:
+            print(f"{module}: failed to import\n{e.stderr}")
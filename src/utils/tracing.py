@@ -0,0 +1,186 @@
+"""
+Per-stage tracing of analyses. A Tracer records nested spans with wall time, CPU time, peak RSS and item counts.
+Code called during an analysis adds spans to the active tracer with span() without the tracer being passed around,
+span() does nothing when no tracer is active.
+
+    tracer = Tracer("analysis")
+    with tracer.activate():
+        with span("vectorize", items=len(datasets)):
+            ...
+    tracer.save_chrome_trace("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_current_tracer: ContextVar["Tracer | None"] = ContextVar("current_tracer", default=None)
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak_rss / 2 ** 20 if sys.platform == "darwin" else peak_rss / 2 ** 10
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span | None", start: float, items: int | None = None):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        # Seconds since the start of the tracer
+        self.start = start
+        self.items = items
+        self.wall_seconds: float | None = None
+        self.cpu_seconds: float | None = None
+        # Peak resident set size of the process at the end of the span, it never decreases
+        self.peak_rss_mb: float | None = None
+        self.thread_id = threading.get_ident()
+
+    def to_dict(self) -> dict:
+        return dict(
+            name=self.name,
+            parent=self.parent.name if self.parent else None,
+            depth=self.depth,
+            start=self.start,
+            wall_seconds=self.wall_seconds,
+            cpu_seconds=self.cpu_seconds,
+            peak_rss_mb=self.peak_rss_mb,
+            items=self.items,
+        )
+
+
+class Tracer:
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Span] = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Tracers are pickled with analysis results
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """
+        Makes the tracer the target of span() in the current context.
+        """
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    @contextmanager
+    def span(self, name: str, items: int | None = None):
+        """
+        Records a span, nested in the current span. Items can also be set on the yielded span.
+        """
+        span = Span(name, _current_span.get(), time.perf_counter() - self._start, items)
+        with self._lock:
+            self.spans.append(span)
+        token = _current_span.set(span)
+        wall_begin, cpu_begin = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            span.wall_seconds = time.perf_counter() - wall_begin
+            span.cpu_seconds = time.process_time() - cpu_begin
+            span.peak_rss_mb = _peak_rss_mb()
+            _current_span.reset(token)
+
+    def to_dict(self) -> dict:
+        return dict(name=self.name, spans=[span.to_dict() for span in self.spans])
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def save_json(self, file_path: str):
+        with open(file_path, "w") as f:
+            f.write(self.to_json())
+
+    def save_chrome_trace(self, file_path: str):
+        """
+        Saves the spans in the Chrome trace event format.
+        """
+        events = [
+            dict(name=span.name, ph="X", ts=span.start * 1e6, dur=(span.wall_seconds or 0) * 1e6,
+                 pid=os.getpid(), tid=span.thread_id,
+                 args=dict(cpu_seconds=span.cpu_seconds, peak_rss_mb=span.peak_rss_mb, items=span.items))
+            for span in self.spans
+        ]
+        with open(file_path, "w") as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+
+    def log_summary(self, level=logging.INFO):
+        lines = [f"Trace of {self.name}:"]
+        for span in self.spans:
+            items = f", {span.items} items" if span.items is not None else ""
+            peak_rss = f", peak RSS {span.peak_rss_mb:.0f} MB" if span.peak_rss_mb is not None else ""
+            lines.append(f"{'  ' * (span.depth + 1)}{span.name}: {span.wall_seconds or 0:.2f}s wall, "
+                         f"{span.cpu_seconds or 0:.2f}s CPU{peak_rss}{items}")
+        logger.log(level, "\n".join(lines))
+
+
+def current_tracer() -> Tracer | None:
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name: str, items: int | None = None):
+    """
+    Records a span in the active tracer, see Tracer.span. The span isn't recorded if no tracer is active.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield Span(name, None, 0, items)
+        return
+    with tracer.span(name, items) as active_span:
+        yield active_span
+
+
+def traced(func):
+    """
+    Decorator running the function in a span of the active tracer. If no tracer is active, the function runs
+    in a new tracer, which is attached to the returned object as `trace` and whose summary is logged.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer = _current_tracer.get()
+        if tracer is not None:
+            with tracer.span(func.__name__):
+                return func(*args, **kwargs)
+        tracer = Tracer(func.__qualname__)
+        with tracer.activate(), tracer.span(func.__name__):
+            result = func(*args, **kwargs)
+        result.trace = tracer
+        tracer.log_summary()
+        return result
+
+    return wrapper
@@ -1,6 +1,9 @@
-from src.analysis.analysis_result import AnalysisResult
+from types import SimpleNamespace
+
+from src.analysis.analysis_result import AnalysisResult, AnalysisState
 from src.analysis.analyzer import DatasetAnalyzer
 from src.exception.not_enough_datasets_error import NotEnoughDatasetsError
+from src.model.geo_dataset import GEODataset
 import pytest
 
 SVD_COMPONENTS = 15
@@ -47,3 +50,55 @@ def test_analyzer_raises_error_when_there_are_not_enough_datasets(pubmed_ids):
     analyzer = DatasetAnalyzer(SVD_COMPONENTS, NUMBER_OF_CLUSTERS)
     with pytest.raises(NotEnoughDatasetsError):
         result = analyzer.analyze_paper_datasets(pubmed_ids)
+
+
+def test_incremental_analysis_compares_changes_with_last_full_analysis(monkeypatch):
+    # An earlier update replaced GSE8 and GSE9 of the full analysis, at the limit of changed datasets
+    baseline_accessions = {f"GSE{i}" for i in range(10)}
+    previous_accessions = {f"GSE{i}" for i in range(8)} | {"GSE10", "GSE11"}
+    previous = SimpleNamespace(state=AnalysisState(
+        [SimpleNamespace(id=accession) for accession in sorted(previous_accessions)], object(), None, None, None,
+        [], None, None, baseline_silhouette_score=0.5, baseline_accessions=baseline_accessions
+    ))
+    monkeypatch.setattr("src.analysis.analyzer.fetch_geo_series_accessions",
+                        lambda pubmed_ids: previous_accessions | {"GSE12"})
+    analyzer = DatasetAnalyzer(SVD_COMPONENTS, None, None)
+    full_analysis = SimpleNamespace()
+    monkeypatch.setattr(analyzer, "analyze_paper_datasets", lambda pubmed_ids: full_analysis)
+
+    assert analyzer.analyze_paper_datasets_incremental([1], previous) is full_analysis
+
+
+def _stem_words(df):
+    # Stands in for spaCy and NLTK: one sentence per paper, the stem of a word is its first 4 letters
+    return [[[(word[:4], word) for word in f"{title} {abstract}".lower().split()]]
+            for title, abstract in zip(df["title"], df["abstract"])]
+
+
+def _dataset(accession: str, text: str) -> GEODataset:
+    return GEODataset({"geo_accession": [accession], "title": [text], "type": ["Expression profiling"]})
+
+
+def test_incremental_analysis_counts_tokens_as_full_analysis(monkeypatch):
+    monkeypatch.setattr("src.analysis.text._stem_papers", _stem_words)
+    monkeypatch.setattr("src.analysis.text.get_embeddings_client", lambda: SimpleNamespace(is_ready=lambda: False))
+    monkeypatch.setattr("src.analysis.text.get_local_embedder", lambda: None)
+    monkeypatch.setattr("src.analysis.text.load_pretrained_word2vec", lambda model_path: None)
+    monkeypatch.setattr("src.analysis.analyzer.get_corpus_embeddings", lambda: None)
+    topics = ["cellular tumor cells growth invasion metastasis", "liver mouse diet fatty hepatocyte insulin",
+              "blood plasma protein serum marker antibody"]
+    datasets = [_dataset(f"GSE{i}", topics[i % 3]) for i in range(12)]
+    # The job's vocabulary has the shortest token "cells" for the stem of "cellular"
+    added = [_dataset("GSE100", "cellular tumor growth")]
+    analyzer = DatasetAnalyzer(SVD_COMPONENTS, None, None)
+
+    previous = analyzer.analyze_datasets(datasets)
+    result = analyzer._update_analysis(previous, list(range(len(datasets))), added)
+    full = analyzer.analyze_datasets(datasets + added)
+
+    assert result is not None
+    added_counts = dict(zip(result.state.vocabulary, result.state.counts[-1].toarray()[0]))
+    full_counts = dict(zip(full.state.vocabulary, full.state.counts[-1].toarray()[0]))
+    assert added_counts["cells"] == 1
+    assert {token: added_counts[token] for token in full_counts if token in added_counts} == \
+           {token: full_counts[token] for token in full_counts if token in added_counts}
@@ -0,0 +1,161 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.standardization.angel_generator import ANGELGenerator, CandidateTrie
+
+
+def test_candidate_trie_allows_only_candidate_continuations():
+    trie = CandidateTrie({(5, 6, 2): "t cell", (5, 7, 2): "t helper cell", (8, 2): "blood"})
+    assert sorted(trie.next_tokens([])) == [5, 8]
+    assert sorted(trie.next_tokens([5])) == [6, 7]
+    assert trie.next_tokens([5, 6]) == [2]
+    assert trie.next_tokens([5, 6, 2]) == []
+    assert trie.next_tokens([9]) == []
+    assert trie.depth == 3
+    assert trie.terms[(5, 7, 2)] == "t helper cell"
+
+
+CANDIDATES = ["T-Lymphocytes", "CD8-Positive T-Lymphocytes", "T-Lymphocytes, Helper-Inducer", "B-Lymphocytes",
+              "Monocytes", "Neurons", "Astrocytes", "Liver", "Blood", "Colorectal Neoplasms"]
+MENTIONS = ["cd8+ t cells", "t helper cells", "b cells", "colorectal cancer"]
+
+
+def test_generator_matches_angel_run_sample(tmp_path):
+    # Downloads the ANGEL model set in config.ini, needs the ANGEL repository on PYTHONPATH
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    run_sample = pytest.importorskip("ANGEL.run_sample").run_sample
+    from ANGEL.utils import get_config
+    from src.config import config
+    from src.standardization.angel_generator import ANGELGenerator
+
+    generator = ANGELGenerator(dict(config.angel_config, candidate_tries_folder=str(tmp_path)))
+    generator.add_candidates("test", CANDIDATES)
+    generated = generator.generate([f"START {mention} END" for mention in MENTIONS], MENTIONS, "test")
+
+    angel_config = get_config()
+    for mention, term in zip(MENTIONS, generated):
+        expected = run_sample(angel_config, f"START {mention} END", f"{mention} is", CANDIDATES)[0][0].strip()
+        assert term is not None and term.lower() == expected.lower()
+
+
+class FakeEncoding(dict):
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    """
+    Splits on whitespace and numbers the words in the order they are seen, like a BART tokenizer
+    with BOS 0, padding 1 and EOS 2.
+    """
+    name_or_path = "fake"
+    bos_token_id, pad_token_id, eos_token_id = 0, 1, 2
+
+    def __init__(self):
+        self.vocabulary = {}
+
+    def _encode(self, text, add_special_tokens):
+        ids = [self.vocabulary.setdefault(word, len(self.vocabulary) + 3) for word in text.split()]
+        return [self.bos_token_id, *ids, self.eos_token_id] if add_special_tokens else ids
+
+    def __call__(self, texts, add_special_tokens=True, padding=False, truncation=False, return_tensors=None):
+        if isinstance(texts, str):
+            return FakeEncoding(input_ids=self._encode(texts, add_special_tokens))
+        input_ids = [self._encode(text, add_special_tokens) for text in texts]
+        if padding:
+            length = max(map(len, input_ids))
+            input_ids = [ids + [self.pad_token_id] * (length - len(ids)) for ids in input_ids]
+        return FakeEncoding(input_ids=input_ids)
+
+    def decode(self, ids, skip_special_tokens=False):
+        words = {token_id: word for word, token_id in self.vocabulary.items()}
+        return " ".join(words[token_id] for token_id in ids if token_id in words)
+
+
+class FakeModel:
+    """
+    Greedy search that generates "<mention> is <term>" for the mention between START and END, taking
+    the first allowed token where prefix_allowed_tokens_fn doesn't allow the next token of the term.
+    """
+
+    def __init__(self, tokenizer, mentions_terms, constrained=True):
+        self.tokenizer = tokenizer
+        self.mentions_terms = mentions_terms
+        self.constrained = constrained
+        # Allowed tokens of every step of every generated sequence
+        self.allowed_tokens = []
+
+    def _wanted_tokens(self, input_ids):
+        words = self.tokenizer.decode(input_ids).split()
+        mention = " ".join(words[words.index("START") + 1:words.index("END")])
+        term_ids = self.tokenizer(f" {self.mentions_terms[mention].lower()}", add_special_tokens=False)["input_ids"]
+        return self.tokenizer(f"{mention} is")["input_ids"][:-1] + term_ids + [self.tokenizer.eos_token_id]
+
+    def generate(self, input_ids, num_beams, max_length, prefix_allowed_tokens_fn, early_stopping):
+        outputs = []
+        for batch_id, ids in enumerate(input_ids):
+            wanted = self._wanted_tokens(ids)
+            # BART starts decoding with the EOS token
+            output = [self.tokenizer.eos_token_id]
+            self.allowed_tokens.append([])
+            for token in wanted[:max_length - 1]:
+                allowed = prefix_allowed_tokens_fn(batch_id, np.array(output))
+                self.allowed_tokens[-1].append(allowed)
+                output.append(token if token in allowed or not self.constrained else allowed[0])
+                if output[-1] == self.tokenizer.eos_token_id:
+                    break
+            outputs.append(output)
+        length = max(map(len, outputs))
+        return np.array([output + [self.tokenizer.pad_token_id] * (length - len(output)) for output in outputs])
+
+
+def _fake_generator(tmp_path, mentions_terms, constrained=True, prefix_mention_is=True):
+    # Skips __init__, which loads torch and the BART model
+    generator = ANGELGenerator.__new__(ANGELGenerator)
+    generator.torch = SimpleNamespace(no_grad=nullcontext)
+    generator.device = "cpu"
+    generator.tokenizer = FakeTokenizer()
+    generator.model = FakeModel(generator.tokenizer, mentions_terms, constrained)
+    generator.batch_size = 2
+    generator.num_beams = 1
+    generator.prefix_mention_is = prefix_mention_is
+    generator.tries_folder = str(tmp_path)
+    generator._tries = {}
+    generator.add_candidates("test", CANDIDATES)
+    return generator
+
+
+def test_generate_forces_mention_prefix_and_maps_outputs_to_candidates(tmp_path):
+    mentions_terms = {"cd8+ t cells": "CD8-Positive T-Lymphocytes", "t helper cells": "T-Lymphocytes, Helper-Inducer",
+                      "b cells": "B-Lymphocytes", "colorectal cancer": "Colorectal Neoplasms"}
+    generator = _fake_generator(tmp_path, mentions_terms)
+
+    generated = generator.generate([f"START {mention} END" for mention in MENTIONS], MENTIONS, "test")
+
+    assert generated == [mentions_terms[mention] for mention in MENTIONS]
+    # Mentions are generated in batches of 2, sorted by the length of the input sentences
+    assert len(generator.model.allowed_tokens) == len(MENTIONS)
+    for mention in MENTIONS:
+        forced_prefix = generator._forced_prefix(mention)
+        steps = next(steps for steps in generator.model.allowed_tokens if steps[1] == [forced_prefix[1]])
+        assert steps[:len(forced_prefix)] == [[token] for token in forced_prefix]
+        # The term starts with the first token of a candidate
+        assert sorted(steps[len(forced_prefix)]) == sorted(generator._tries["test"].next_tokens([]))
+
+
+def test_generate_constrains_terms_to_candidates(tmp_path):
+    # The model generates "liver cancer is liver neoplasms" unless constrained, and no candidate continues "liver"
+    generator = _fake_generator(tmp_path, {"liver cancer": "Liver Neoplasms"}, prefix_mention_is=False)
+
+    assert generator.generate(["START liver cancer END"], ["liver cancer"], "test") == ["Liver"]
+    assert generator.model.allowed_tokens[0][0] == [generator.tokenizer.bos_token_id]
+
+
+def test_generate_returns_none_for_outputs_outside_candidates(tmp_path):
+    generator = _fake_generator(tmp_path, {"liver cancer": "Liver Neoplasms"}, constrained=False)
+
+    assert generator.generate(["START liver cancer END"], ["liver cancer"], "test") == [None]
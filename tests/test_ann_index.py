@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.utils.ann_index import ANNIndex
+
+
+@pytest.mark.parametrize("use_hnsw", [False, True])
+def test_ann_index_finds_nearest_neighbours(use_hnsw, tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 15))
+    keys = [f"GSE{i}" for i in range(len(vectors))]
+    index = ANNIndex.build(keys, vectors, use_hnsw=use_hnsw)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ normalized[0]))[1:6]
+    neighbours = index.query_key("GSE0", k=5)
+    assert [key for key, _ in neighbours] == [keys[i] for i in expected]
+    assert all(a[1] >= b[1] for a, b in zip(neighbours, neighbours[1:]))
+
+    index.save(str(tmp_path / "index"))
+    loaded = ANNIndex.load(str(tmp_path / "index"), mmap=True)
+    assert loaded.query_key("GSE0", k=5) == pytest.approx(neighbours)
+
+
+def test_ann_index_replaces_vectors_of_existing_keys():
+    index = ANNIndex.build(["a", "b", "c"], np.eye(3), use_hnsw=False)
+    index.add(["a", "d"], [[0, 1, 0], [0, 0, 1]])
+    assert len(index) == 4
+    neighbours = index.query([0, 1, 0], k=2)[0]
+    assert {key for key, _ in neighbours} == {"a", "b"}
+    assert [similarity for _, similarity in neighbours] == pytest.approx([1, 1])
+
+
+def test_brute_force_query_in_batches(monkeypatch):
+    rng = np.random.default_rng(0)
+    index = ANNIndex.build([str(i) for i in range(100)], rng.normal(size=(100, 8)), use_hnsw=False)
+    queries = rng.normal(size=(10, 8))
+    expected = index.query(queries, k=3)
+    monkeypatch.setattr("src.utils.ann_index.ANN_BRUTE_FORCE_BATCH_SIZE", 3)
+    batched = index.query(queries, k=3)
+    assert [[key for key, _ in neighbours] for neighbours in batched] == \
+           [[key for key, _ in neighbours] for neighbours in expected]
+    assert [[similarity for _, similarity in neighbours] for neighbours in batched] == \
+           [pytest.approx([similarity for _, similarity in neighbours]) for neighbours in expected]
+    assert index.query(np.zeros((0, 8)), k=3) == []
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from src.app import app as app_module
+from src.utils.ann_index import ANNIndex
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "completed_jobs").mkdir()
+    app_module._load_job_index.cache_clear()
+    yield app_module.app.test_client()
+    app_module._load_job_index.cache_clear()
+
+
+@pytest.mark.parametrize("k", ["0", "-1", "1000000", "ten"])
+def test_similar_datasets_rejects_invalid_k(client, k):
+    response = client.get(f"/app/similar?accession=GSE1&job-id=job&k={k}")
+
+    assert response.status_code == 400
+
+
+def test_similar_datasets_finds_index_saved_after_first_request(client):
+    assert client.get("/app/similar?accession=GSE1&job-id=job").status_code == 404
+
+    ANNIndex.build(["GSE1", "GSE2"], np.array([[1.0, 0.0], [0.8, 0.6]])).save("completed_jobs/job_index")
+    response = client.get("/app/similar?accession=GSE1&job-id=job&k=1")
+
+    assert response.status_code == 200
+    assert [neighbour["id"] for neighbour in response.get_json()] == ["GSE2"]
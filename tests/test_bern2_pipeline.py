@@ -0,0 +1,106 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from src.standardization.bern2_cache import BERN2Cache
+from src.standardization.bern2_pipeline import BERN2Pipeline, BERN2Error
+
+
+class AnnotateWholeText(BaseHTTPRequestHandler):
+    """
+    Annotates the whole text as a disease, fails on texts starting with "fail".
+    """
+    requested_texts = []
+
+    def do_POST(self):
+        text = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"]
+        self.requested_texts.append(text)
+        if text.startswith("fail"):
+            self.send_response(400)
+            self.end_headers()
+            return
+        body = json.dumps({"annotations": [{
+            "mention": text, "obj": "disease", "id": ["mesh:D001249"], "prob": 0.9,
+            "span": {"begin": 0, "end": len(text)},
+        }]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def bern2_url():
+    AnnotateWholeText.requested_texts.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AnnotateWholeText)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/plain"
+    server.shutdown()
+
+
+def test_batch_keeps_order_of_texts(bern2_url):
+    pipeline = BERN2Pipeline({"D001249": "asthma"}, {}, url=bern2_url, max_in_flight=4)
+    texts = [f"text {i}" for i in range(10)] + ["fail"]
+    entities_per_text = pipeline.batch(texts)
+    assert [entities[0].mention for entities in entities_per_text[:-1]] == texts[:-1]
+    assert all(entities[0].standard_name == "asthma" for entities in entities_per_text[:-1])
+    assert entities_per_text[-1] is None
+
+
+def test_call_raises_bern2_error(bern2_url):
+    pipeline = BERN2Pipeline({}, {}, url=bern2_url)
+    with pytest.raises(BERN2Error):
+        pipeline("fail")
+
+
+def test_cached_annotations_are_not_requested(bern2_url, tmp_path):
+    cache = BERN2Cache(str(tmp_path / "bern2.sqlite"), "v1", max_size_mb=1)
+    pipeline = BERN2Pipeline({"D001249": "asthma"}, {}, url=bern2_url, cache=cache)
+    assert pipeline("text")[0].standard_name == "asthma"
+    assert pipeline("text")[0].standard_name == "asthma"
+    assert AnnotateWholeText.requested_texts == ["text"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # The cache persists, a new model version invalidates it
+    assert BERN2Cache(str(tmp_path / "bern2.sqlite"), "v1", max_size_mb=1).get("text") is not None
+    assert BERN2Cache(str(tmp_path / "bern2.sqlite"), "v2", max_size_mb=1).get("text") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    annotations = [{"mention": "x" * 1000}]
+    cache = BERN2Cache(str(tmp_path / "bern2.sqlite"), "v1", max_size_mb=5000 / 2 ** 20)
+    for i in range(4):
+        cache.put(f"text {i}", annotations)
+    cache.get("text 0")
+    cache.put("text 4", annotations)
+    assert cache.size <= cache.max_size
+    assert cache.get("text 0") == annotations
+    assert cache.get("text 1") is None
+    assert cache.get("text 4") == annotations
+
+
+def test_batch_lines_annotates_unique_lines_once(bern2_url):
+    pipeline = BERN2Pipeline({"D001249": "asthma"}, {}, url=bern2_url)
+    texts = ["Title: a ; tissue: blood ; ", "Title: b ; tissue: blood ; fail ; ", "fail"]
+    entities_per_text = pipeline.batch_lines(texts)
+    assert sorted(AnnotateWholeText.requested_texts) == ["Title: a", "Title: b", "fail", "tissue: blood"]
+    assert [entity.mention for entity in entities_per_text[0]] == ["Title: a", "tissue: blood"]
+    assert [entity.mention for entity in entities_per_text[1]] == ["Title: b", "tissue: blood"]
+    assert entities_per_text[2] is None
+
+
+def test_batch_lines_shifts_spans():
+    pipeline = BERN2Pipeline({}, {})
+    text = "Title: a ; tissue: blood"
+    pipeline.fetch_annotations = lambda line: [{
+        "mention": line, "obj": "disease", "id": ["CUI-less"], "prob": 0.9, "span": {"begin": 0, "end": len(line)},
+    }]
+    annotations = []
+    pipeline.to_entities = lambda line_annotations, _: annotations.extend(line_annotations)
+    pipeline.batch_lines([text])
+    assert [text[a["span"]["begin"]:a["span"]["end"]] for a in annotations] == ["Title: a", "tissue: blood"]
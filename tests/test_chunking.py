@@ -0,0 +1,36 @@
+import pytest
+
+from src.analysis.chunking import split_sentences, get_chunks, collect_papers_chunks, parallel_collect_chunks
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("First sentence. Second one! Third?", ["First sentence.", "Second one!", "Third?"]),
+        ("Cells were treated with 5.5 mM glucose. 24 hours later RNA was extracted.",
+         ["Cells were treated with 5.5 mM glucose.", "24 hours later RNA was extracted."]),
+        ("Expression profiling by array\nThis SuperSeries is composed of the SubSeries listed below.",
+         ["Expression profiling by array", "This SuperSeries is composed of the SubSeries listed below."]),
+        ("e.g. lowercase continuation stays together.", ["e.g. lowercase continuation stays together."]),
+        ("", []),
+    ],
+)
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_get_chunks_respects_max_tokens_and_overlap():
+    text = "One two three. Four five six. Seven eight nine."
+    assert get_chunks(text, max_tokens=8, overlap_sentences=0) == [
+        "One two three. Four five six.", "Seven eight nine."
+    ]
+    assert get_chunks(text, max_tokens=8, overlap_sentences=1) == [
+        "One two three. Four five six.", "Four five six. Seven eight nine."
+    ]
+
+
+def test_parallel_collect_chunks_is_deterministic():
+    pids = [f"GSE{i}" for i in range(300)]
+    texts = [" ".join(f"Sentence {j} of text {i}." for j in range(i % 7 + 1)) for i in range(300)]
+    expected = collect_papers_chunks((list(zip(pids, texts)), 8, 1))
+    assert parallel_collect_chunks(pids, texts, 8, 1, batch_size=16) == expected
@@ -1,6 +1,12 @@
 import pytest
 import numpy as np
-from src.analysis.cluster import sort_cluster_labels
+from scipy.sparse import csr_matrix
+from sklearn.datasets import make_blobs
+
+from src.analysis.cluster import sort_cluster_labels, auto_cluster, cluster, get_clusters_top_terms, \
+    cluster_centroids, assign_to_nearest_centroids
+from src.analysis.clustering_engines import KMeansEngine, MiniBatchKMeansEngine, HDBSCANEngine
+from src.exception.not_enough_datasets_error import NotEnoughDatasetsError
 
 
 @pytest.mark.parametrize(
@@ -14,3 +20,77 @@ from src.analysis.cluster import sort_cluster_labels
 def test_sort_cluster_labels(labels, expected):
     sorted_labels = sort_cluster_labels(labels)
     assert all(sorted_labels == expected)
+
+
+@pytest.mark.parametrize("n_centers,n_jobs", [(3, 1), (5, 1), (5, 4)])
+def test_auto_cluster_finds_number_of_blobs(n_centers, n_jobs):
+    embeddings, _ = make_blobs(n_samples=300, centers=n_centers, cluster_std=0.5, random_state=0)
+    labels, score, n_clusters = auto_cluster(embeddings, n_jobs=n_jobs)
+    assert n_clusters == n_centers
+    assert len(labels) == 300
+    assert score > 0.5
+
+
+@pytest.mark.parametrize("engine", [KMeansEngine(), MiniBatchKMeansEngine(batch_size=64), HDBSCANEngine()])
+def test_clustering_engines_assign_every_dataset(engine):
+    embeddings, _ = make_blobs(n_samples=300, centers=4, cluster_std=0.5, random_state=0)
+    labels, score, n_clusters = auto_cluster(embeddings, n_jobs=1, engine=engine)
+    assert n_clusters == 4
+    assert sorted(set(labels)) == list(range(n_clusters))
+    assert all(np.diff(np.bincount(labels)) <= 0)
+
+
+@pytest.mark.parametrize("to_matrix", [np.array, csr_matrix])
+def test_get_clusters_top_terms(to_matrix):
+    vocabulary = ["cancer", "tumor", "brain", "neuron", "cell", "unused"]
+    corpus_counts = to_matrix(np.array([
+        [3, 1, 0, 0, 1, 0],
+        [2, 2, 0, 0, 1, 0],
+        [0, 0, 4, 1, 1, 0],
+        [0, 0, 1, 3, 1, 0],
+    ]))
+    top_terms = get_clusters_top_terms(np.array([0, 0, 1, 1]), vocabulary, corpus_counts, 3)
+    assert top_terms == [["cancer", "tumor", "cell"], ["brain", "neuron", "cell"]]
+
+
+def test_new_datasets_are_assigned_to_nearest_centroids():
+    embeddings, blobs = make_blobs(n_samples=220, centers=3, cluster_std=0.5, random_state=0)
+    labels, _, _ = auto_cluster(embeddings[:200], n_jobs=1)
+    centroids = cluster_centroids(embeddings[:200], labels)
+    assert centroids.shape == (3, 2)
+    label_of_blob = dict(zip(blobs[:200], labels))
+    assert list(assign_to_nearest_centroids(embeddings[200:], centroids)) == [label_of_blob[b] for b in blobs[200:]]
+
+
+def test_auto_cluster_falls_back_to_kmeans_when_hdbscan_finds_one_cluster():
+    embeddings, _ = make_blobs(n_samples=60, centers=[[0, 0], [10, 10], [-10, 10]], cluster_std=0.5, random_state=0)
+
+    cluster_assignments, score, n_clusters = auto_cluster(embeddings, n_jobs=1,
+                                                          engine=HDBSCANEngine(min_cluster_size=50))
+
+    assert n_clusters == 3
+    assert len(set(cluster_assignments)) == 3
+    assert score > 0.5
+
+
+@pytest.mark.parametrize("n_datasets", [1, 2])
+def test_auto_cluster_raises_error_when_there_are_too_few_datasets(n_datasets):
+    embeddings = np.random.default_rng(0).random((n_datasets, 5))
+
+    with pytest.raises(NotEnoughDatasetsError):
+        auto_cluster(embeddings, n_jobs=1, engine=KMeansEngine())
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_auto_cluster_matches_exhaustive_sweep_on_noisy_data(seed, n_jobs):
+    rng = np.random.default_rng(seed)
+    blobs, _ = make_blobs(n_samples=400, centers=8, n_features=10, cluster_std=1.5, random_state=seed)
+    outliers = rng.uniform(blobs.min() * 2, blobs.max() * 2, size=(20, 10))
+    embeddings = np.vstack([blobs, outliers])
+
+    scores = {n_clusters: cluster(embeddings, n_clusters, KMeansEngine())[1] for n_clusters in range(2, 20)}
+    _, score, n_clusters = auto_cluster(embeddings, n_jobs=n_jobs, engine=KMeansEngine())
+
+    assert n_clusters == max(scores, key=scores.get)
+    assert score == pytest.approx(scores[n_clusters])
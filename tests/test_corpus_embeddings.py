@@ -0,0 +1,37 @@
+import pickle
+from types import SimpleNamespace
+
+import scipy.sparse
+
+from src.analysis.corpus_embeddings import build_corpus_embeddings
+from src.model.geo_dataset import GEODataset
+
+
+def _stem_words(df):
+    # Stands in for spaCy and NLTK: one sentence per paper, the stem of a word is its first 4 letters
+    return [[[(word[:4], word) for word in f"{title} {abstract}".lower().split()]]
+            for title, abstract in zip(df["title"], df["abstract"])]
+
+
+def test_corpus_chunks_are_counted_with_the_sample_stem_map(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.analysis.text._stem_papers", _stem_words)
+    monkeypatch.setattr("src.analysis.text.get_embeddings_client", lambda: SimpleNamespace(is_ready=lambda: False))
+    monkeypatch.setattr("src.analysis.text.get_local_embedder", lambda: None)
+    monkeypatch.setattr("src.analysis.text.load_pretrained_word2vec", lambda model_path: None)
+    topics = ["cellular tumor cells growth invasion metastasis", "liver mouse diet fatty hepatocyte insulin",
+              "blood plasma protein serum marker antibody"]
+    datasets = [GEODataset({"geo_accession": [f"GSE{i}"], "title": [topics[i % 3]], "type": ["Expression profiling"]})
+                for i in range(12)]
+    datasets.append(GEODataset({"geo_accession": ["GSE100"], "title": ["cellular tumor growth"],
+                                "type": ["Expression profiling"]}))
+    index_path = str(tmp_path / "corpus")
+
+    # Every dataset is in its own chunk, "cellular" alone would be its shortest token for the stem
+    build_corpus_embeddings(lambda: iter(datasets), len(datasets), index_path, svd_components=3,
+                            sample_size=len(datasets), chunk_size=1)
+
+    with open(f"{index_path}.model.pkl", "rb") as f:
+        space, _ = pickle.load(f)
+    counts = scipy.sparse.load_npz(f"{index_path}.counts.npz")
+    assert space.stems_tokens_map["cell"] == "cells"
+    assert counts[-1, space.vocabulary.index("cells")] == 1
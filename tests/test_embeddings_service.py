@@ -0,0 +1,92 @@
+import random
+import threading
+import time
+
+import numpy as np
+
+from src.services.embeddings_service import EmbeddingsServiceClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """
+    Embeds a text "<n>" as [n, -n] after a random delay, fails batches with a text "fail".
+    """
+
+    def __init__(self):
+        self.requested_urls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, json=None, headers=None, timeout=None):
+        with self.lock:
+            self.requested_urls.append(url)
+        if url.endswith("/check"):
+            return FakeResponse(200, True)
+        if json is None:
+            return FakeResponse(200)
+        if "fail" in json:
+            return FakeResponse(500)
+        time.sleep(random.uniform(0, 0.01))
+        return FakeResponse(200, [[float(text), -float(text)] if text.isdigit() else [0.0, 0.0] for text in json])
+
+
+def _client(**kwargs):
+    client = EmbeddingsServiceClient(url="http://embeddings", **kwargs)
+    client.session = FakeSession()
+    return client
+
+
+def test_batches_are_concatenated_in_order_of_items():
+    client = _client(batch_size=3, max_in_flight=4)
+    texts = [str(i) for i in range(50)]
+
+    embeddings = client.fetch_texts_embedding(texts)
+
+    np.testing.assert_array_equal(embeddings[:, 0], np.arange(50))
+    assert len(client.batch_latencies) == 17
+
+
+def test_failed_batch_returns_none_and_invalidates_readiness():
+    client = _client(batch_size=2)
+    assert client.is_ready()
+
+    assert client.fetch_texts_embedding(["1", "2", "fail", "4"]) is None
+    assert client._ready is None
+
+
+def test_no_items_are_embedded_without_requests():
+    client = _client()
+    assert client.is_ready()
+    n_requests = len(client.session.requested_urls)
+
+    # The dimension is known from the readiness check
+    embeddings = client.fetch_texts_embedding([])
+
+    assert embeddings.shape == (0, 2)
+    assert len(client.session.requested_urls) == n_requests
+    assert client.is_ready()
+    assert len(client.session.requested_urls) == n_requests
+
+
+def test_readiness_is_cached_until_ttl_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.services.embeddings_service.time.monotonic", lambda: now[0])
+    client = _client(readiness_ttl=60)
+
+    assert client.is_ready() and client.is_texts_embeddings_available()
+    n_requests = len(client.session.requested_urls)
+    now[0] += 59
+    assert client.is_ready() and client.is_texts_embeddings_available()
+    assert len(client.session.requested_urls) == n_requests
+
+    now[0] += 2
+    assert client.is_ready()
+    assert len(client.session.requested_urls) > n_requests
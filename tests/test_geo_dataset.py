@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from src.model.geo_dataset import GEODataset
+from src.model.geo_sample import GEOSample
+
+CHARACTERISTICS_SCRIPT = """
+from src.model.geo_dataset import GEODataset
+from src.model.geo_sample import GEOSample
+
+dataset = GEODataset({"geo_accession": ["GSE1"], "title": ["Title"], "type": ["Expression profiling"]})
+dataset.samples = [GEOSample({"characteristics_ch1": [f"cell type: cell {i}", "tissue: liver"]}) for i in range(10)]
+print(dataset.get_str_with_sample_characteristics())
+"""
+
+
+def test_sample_characteristics_values_sorted():
+    dataset = GEODataset({"geo_accession": ["GSE1"], "title": ["Title"], "type": ["Expression profiling"]})
+    dataset.samples = [GEOSample({"characteristics_ch1": [f"cell type: {cell_type}"]})
+                       for cell_type in ["neuron", "astrocyte", "microglia", "astrocyte"]]
+
+    assert dataset._get_sample_characteristics_str() == "cell type: astrocyte,microglia,neuron\n"
+
+
+def test_sample_characteristics_str_stable_across_hash_seeds():
+    # The text is the key of the BERN2 annotations cache, so it must not depend on the set order
+    outputs = set()
+    for seed in ["1", "2", "3"]:
+        result = subprocess.run([sys.executable, "-c", CHARACTERISTICS_SCRIPT], capture_output=True, text=True,
+                                check=True, env={**os.environ, "PYTHONHASHSEED": seed})
+        outputs.add(result.stdout)
+
+    assert len(outputs) == 1
@@ -0,0 +1,18 @@
+import numpy as np
+from sklearn.datasets import make_blobs
+
+from src.analysis.layout_engines import TSNELayout
+
+
+def test_tsne_layout_places_new_datasets_next_to_their_neighbors():
+    embeddings, labels = make_blobs(n_samples=200, n_features=10, centers=3, cluster_std=0.5, random_state=0)
+    layout = TSNELayout()
+    positions = layout.fit_transform(embeddings[:190])
+    assert positions.shape == (190, 2)
+
+    new_positions = layout.transform(embeddings[190:])
+    assert new_positions.shape == (10, 2)
+    for position, label in zip(new_positions, labels[190:]):
+        nearest = np.argmin(np.sum((positions - position) ** 2, axis=1))
+        assert labels[nearest] == label
+    assert np.allclose(layout.transform(embeddings[:5]), positions[:5])
@@ -0,0 +1,23 @@
+import concurrent.futures
+
+from src.utils import lazy
+from src.utils.lazy import lazy_resource
+
+
+def test_lazy_resource_is_loaded_once_on_first_use(monkeypatch):
+    # The test loader isn't left among the resources warmup() loads
+    monkeypatch.setattr(lazy, "_loaders", [])
+    calls = []
+
+    @lazy_resource
+    def load_model():
+        calls.append(1)
+        return object()
+
+    assert not load_model.is_loaded()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: load_model(), range(32)))
+    assert load_model.is_loaded()
+    assert len(calls) == 1
+    assert all(model is models[0] for model in models)
+
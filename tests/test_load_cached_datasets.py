@@ -0,0 +1,28 @@
+from src.ingestion.load_cached_datasets import load_cached_datasets
+
+
+def _write_cached_series(folder):
+    (folder / "GSE1.txt").write_text("^SERIES = GSE1\n!Series_title = Liver study\n!Series_geo_accession = GSE1\n"
+                                     "!Series_type = Expression profiling by array\n!Series_sample_id = GSM1\n")
+    (folder / "GSM1.txt").write_text("^SAMPLE = GSM1\n!Sample_title = Liver 1\n"
+                                     "!Sample_characteristics_ch1 = tissue: liver\n")
+
+
+def test_cached_datasets_are_loaded_with_samples(tmp_path):
+    _write_cached_series(tmp_path)
+
+    dataset, = load_cached_datasets(str(tmp_path))
+
+    assert dataset.id == "GSE1"
+    assert [sample.characteristics for sample in dataset.samples] == [{"tissue": "liver"}]
+
+
+def test_cached_datasets_are_loaded_without_samples(tmp_path):
+    _write_cached_series(tmp_path)
+    # The sample file isn't parsed
+    (tmp_path / "GSM1.txt").write_text("not a SOFT file")
+
+    dataset, = load_cached_datasets(str(tmp_path), load_samples=False)
+
+    assert dataset.id == "GSE1"
+    assert dataset.samples is None
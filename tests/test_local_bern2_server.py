@@ -0,0 +1,40 @@
+from src.mesh.mesh_vocabulary import MeshEntry
+from src.standardization.bern2_cache import BERN2Cache
+from src.standardization.local_bern2_server import DictionaryAnnotator, ReplayAnnotator, create_app
+
+
+def _mesh_entry(term, mesh_id, tree_number):
+    entry = MeshEntry(term, mesh_id)
+    entry.tree_numbers.add(tree_number)
+    return entry
+
+
+MESH_LOOKUP = {
+    "asthma": _mesh_entry("asthma", "D001249", "C08.127.108"),
+    "t-lymphocytes": _mesh_entry("t-lymphocytes", "D013601", "A11.118.637.555.567"),
+    "t lymphocytes helper": _mesh_entry("t lymphocytes helper", "D006377", "A11.118.637.555.567.569"),
+    "blood": _mesh_entry("blood", "D001769", "A15.145"),
+}
+
+
+def test_dictionary_annotator_matches_longest_terms():
+    text = "disease: Asthma ; cell type: T lymphocytes helper,T-lymphocytes ; tissue: blood"
+    annotations = DictionaryAnnotator(MESH_LOOKUP)(text)
+    assert [(a["mention"], a["obj"], a["id"]) for a in annotations] == [
+        ("Asthma", "disease", ["mesh:D001249"]),
+        ("T lymphocytes helper", "cell_type", ["mesh:D006377"]),
+        ("T-lymphocytes", "cell_type", ["mesh:D013601"]),
+    ]
+    assert all(text[a["span"]["begin"]:a["span"]["end"]] == a["mention"] for a in annotations)
+
+
+def test_plain_endpoint_replays_recorded_annotations(tmp_path):
+    cache = BERN2Cache(str(tmp_path / "bern2.sqlite"), "v1", max_size_mb=1)
+    recorded = [{"mention": "recorded", "obj": "gene", "id": ["NCBIGene:1"], "prob": 0.5,
+                 "span": {"begin": 0, "end": 8}}]
+    cache.put("recorded text", recorded)
+    client = create_app(ReplayAnnotator(cache, DictionaryAnnotator(MESH_LOOKUP))).test_client()
+
+    assert client.post("/plain", json={"text": "recorded text"}).get_json()["annotations"] == recorded
+    annotations = client.post("/plain", json={"text": "asthma"}).get_json()["annotations"]
+    assert annotations[0]["id"] == ["mesh:D001249"]
@@ -0,0 +1,120 @@
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis import text
+from src.services import local_embeddings
+from src.services.local_embeddings import OnnxTextEmbedder, get_local_embedder
+
+
+class StubTokenizer:
+    """
+    Encodes a text as the lengths of its words, padded with zeros to the longest text of the batch.
+    """
+
+    def encode_batch(self, texts):
+        ids = [[len(word) for word in text.split()] for text in texts]
+        length = max(map(len, ids))
+        return [SimpleNamespace(ids=row + [0] * (length - len(row)),
+                                attention_mask=[1] * len(row) + [0] * (length - len(row)),
+                                type_ids=[0] * length) for row in ids]
+
+
+class StubSession:
+    """
+    Token embedding of a token id i is [i, 1], padding tokens get large embeddings that the pooling must ignore.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, output_names, inputs):
+        self.batches.append(inputs)
+        input_ids = inputs["input_ids"].astype(np.float32)
+        token_embeddings = np.stack([input_ids, np.ones_like(input_ids)], axis=2)
+        token_embeddings[inputs["attention_mask"] == 0] = 1000
+        return [token_embeddings]
+
+
+def _stub_embedder(batch_size, input_names=("input_ids", "attention_mask")):
+    embedder = OnnxTextEmbedder.__new__(OnnxTextEmbedder)
+    embedder.session = StubSession()
+    embedder.tokenizer = StubTokenizer()
+    embedder.input_names = set(input_names)
+    embedder.batch_size = batch_size
+    return embedder
+
+
+def test_texts_are_embedded_in_batches_with_masked_mean_pooling():
+    embedder = _stub_embedder(batch_size=2)
+
+    embeddings = embedder.fetch_texts_embedding(["aaa", "a aaa aaaaa", "aa aa"])
+
+    # Means of [length, 1] over the words: [3, 1], [3, 1], [2, 1]
+    expected = np.array([[3, 1], [3, 1], [2, 1]]) / np.linalg.norm([[3, 1], [3, 1], [2, 1]], axis=1, keepdims=True)
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-6)
+    assert [len(batch["input_ids"]) for batch in embedder.session.batches] == [2, 1]
+    assert "token_type_ids" not in embedder.session.batches[0]
+
+
+def test_token_type_ids_are_passed_to_models_that_take_them():
+    embedder = _stub_embedder(batch_size=4, input_names=("input_ids", "attention_mask", "token_type_ids"))
+
+    embedder.fetch_texts_embedding(["aaa aa"])
+
+    assert embedder.session.batches[0]["token_type_ids"].shape == (1, 2)
+
+
+@pytest.fixture
+def local_embeddings_config(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.onnx"
+    embeddings_config = dict(enabled=True, onnx_model_path=str(model_path), onnx_tokenizer="tokenizer.json",
+                             onnx_threads=1, onnx_batch_size=2)
+    monkeypatch.setattr(local_embeddings.config, "local_embeddings_config", embeddings_config)
+    monkeypatch.setattr(local_embeddings, "_local_embedder", None)
+    monkeypatch.setattr(local_embeddings, "_local_embedder_loaded", False)
+    return model_path
+
+
+def test_no_local_embedder_without_model(local_embeddings_config):
+    assert get_local_embedder() is None
+
+
+def test_no_local_embedder_without_onnxruntime(local_embeddings_config, monkeypatch):
+    local_embeddings_config.write_bytes(b"model")
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+
+    assert get_local_embedder() is None
+
+
+def test_no_local_embedder_when_model_can_not_be_loaded(local_embeddings_config, monkeypatch):
+    local_embeddings_config.write_bytes(b"not an ONNX model")
+
+    def fail_to_load(*args, **kwargs):
+        raise RuntimeError("Failed to load model")
+
+    monkeypatch.setattr(local_embeddings, "OnnxTextEmbedder", fail_to_load)
+
+    assert get_local_embedder() is None
+
+
+def test_embedding_space_falls_back_without_local_embedder(monkeypatch):
+    # Stands in for spaCy and NLTK: one sentence per paper, words are their own stems
+    monkeypatch.setattr(text, "_stem_papers", lambda df: [[[(word, word) for word in abstract.split()]]
+                                                          for abstract in df["abstract"]])
+    monkeypatch.setattr(text, "get_embeddings_client", lambda: SimpleNamespace(is_ready=lambda: False))
+    monkeypatch.setattr(text, "get_local_embedder", lambda: None)
+    monkeypatch.setattr(text, "load_pretrained_word2vec", lambda model_path: None)
+    papers_tokens = [["liver", "mouse", "diet", "fatty", "insulin"], ["blood", "plasma", "serum", "marker", "protein"]]
+    df = pd.DataFrame(dict(id=["GSE1", "GSE2"], title=["", ""],
+                           abstract=[" ".join(tokens) for tokens in papers_tokens]))
+    vocabulary = sorted(token for tokens in papers_tokens for token in tokens)
+    counts = text._count_vocabulary_tokens(papers_tokens, vocabulary)
+
+    assert text.EmbeddingSpace(vocabulary, {}, "local").embed(df) is None
+    # Falls back to the word2vec model trained on the corpus
+    _, _, space = text.embeddings(df, [[tokens] for tokens in papers_tokens], vocabulary, counts, {})
+    assert space.backend == "tokens"
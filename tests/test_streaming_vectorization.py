@@ -0,0 +1,71 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis import text
+from src.analysis.vectorize_datasets import vectorize_datasets_with_space
+from src.model.geo_dataset import GEODataset
+
+TOPICS = ["cellular tumor cells growth invasion metastasis", "liver mouse diet fatty hepatocyte insulin",
+          "blood plasma protein serum marker antibody", "neuron brain cortex synapse plasticity memory"]
+
+
+def _stem_words(df):
+    # Stands in for spaCy and NLTK: one sentence per paper, the stem of a word is its first 4 letters
+    return [[[(word[:4], word) for word in f"{title} {abstract}".lower().split()]]
+            for title, abstract in zip(df["title"], df["abstract"])]
+
+
+@pytest.fixture(autouse=True)
+def stub_stemming_and_embeddings(monkeypatch):
+    monkeypatch.setattr(text, "_stem_papers", _stem_words)
+    monkeypatch.setattr(text, "get_embeddings_client", lambda: SimpleNamespace(is_ready=lambda: False))
+    monkeypatch.setattr(text, "get_local_embedder", lambda: None)
+    monkeypatch.setattr(text, "load_pretrained_word2vec", lambda model_path: None)
+
+
+def _papers(n_papers):
+    # Zipf-like word frequencies, so the most common stems are well separated from the tail the sketch prunes
+    words = " ".join(TOPICS).split()
+    weights = 1 / np.arange(1, len(words) + 1)
+    rng = np.random.default_rng(0)
+    abstracts = [" ".join(rng.choice(words, size=8, p=weights / weights.sum())) for _ in range(n_papers)]
+    return pd.DataFrame(dict(title=[""] * n_papers, abstract=abstracts))
+
+
+@pytest.mark.parametrize("chunk_size", [7, 100])
+def test_streaming_vocabulary_matches_exact_document_frequencies(chunk_size):
+    df = _papers(60)
+    papers_stems = [[stem for stem, _ in sentences[0]] for sentences in _stem_words(df)]
+    doc_freqs = Counter(stem for stems in papers_stems for stem in set(stems))
+
+    _, tokens, counts, stems_tokens_map = text.vectorize_corpus_streaming(
+        df, max_features=5, min_df=1, max_df=1.0, chunk_size=chunk_size, sketch_capacity=8)
+
+    stems = [stem for stem, token in stems_tokens_map.items() if token in tokens] + \
+            [token for token in tokens if token not in stems_tokens_map.values()]
+    assert sorted(doc_freqs[stem] for stem in stems) == sorted(count for _, count in doc_freqs.most_common(5))
+    token_stems = {stems_tokens_map.get(stem, stem): stem for stem in doc_freqs}
+    expected_counts = np.array([[stems.count(token_stems[token]) for token in tokens] for stems in papers_stems])
+    np.testing.assert_array_equal(counts.toarray(), expected_counts)
+
+
+@pytest.mark.parametrize("streaming_min_datasets", [5, 1000])
+def test_vectorized_datasets_match_vocabulary(monkeypatch, streaming_min_datasets):
+    monkeypatch.setattr("src.analysis.vectorize_datasets.VECTOR_STREAMING_MIN_DATASETS", streaming_min_datasets)
+    datasets = [GEODataset({"geo_accession": [f"GSE{i}"], "title": [abstract], "type": ["Expression profiling"]})
+                for i, abstract in enumerate(_papers(30)["abstract"])]
+
+    embeddings, vocabulary, counts, space = vectorize_datasets_with_space(datasets)
+
+    assert counts.shape == (len(datasets), len(vocabulary))
+    assert embeddings.shape[0] == len(datasets)
+    if streaming_min_datasets <= len(datasets):
+        # TF-IDF vectors of the vocabulary tokens
+        assert embeddings.shape[1] == len(vocabulary)
+        assert space is None
+    else:
+        assert space is not None and space.vocabulary == vocabulary
@@ -0,0 +1,33 @@
+import random
+from collections import Counter
+
+import pytest
+
+from src.analysis.term_sketch import HeavyHittersSketch
+
+
+def test_sketch_counts_are_exact_without_pruning():
+    sketch = HeavyHittersSketch(capacity=10)
+    sketch.update(["a", "b", "a", "c", "a", "b"])
+    assert sketch.top(2) == [("a", 3), ("b", 2)]
+    assert sketch.floor == 0
+
+
+@pytest.mark.parametrize("capacity", [5, 20, 50])
+def test_sketch_finds_heavy_hitters_with_bounded_memory(capacity):
+    random.seed(42)
+    # Zipf-like stream over 1000 distinct items
+    stream = [f"t{int(random.paretovariate(1.0))}" for _ in range(20_000)]
+    true_counts = Counter(stream)
+
+    sketch = HeavyHittersSketch(capacity)
+    for i in range(0, len(stream), 100):
+        sketch.update(stream[i:i + 100])
+        assert len(sketch.counts) <= 2 * capacity + 100
+
+    for item, count in sketch.counts.items():
+        # Counts are overestimates with bounded error
+        assert true_counts[item] <= count <= true_counts[item] + sketch.errors[item]
+    # Every item that occurs more often than the floor is monitored
+    assert all(item in sketch for item, count in true_counts.items() if count > sketch.floor)
+    assert [item for item, _ in sketch.top(3)] == [item for item, _ in true_counts.most_common(3)]
@@ -0,0 +1,52 @@
+from collections import Counter
+
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.analysis.text import _select_vocabulary
+
+PAPERS_TOKENS = [
+    ["cell", "tumor", "tumor", "liver", "rna"],
+    ["cell", "tumor", "blood", "rna", "rna"],
+    ["cell", "liver", "blood", "mouse"],
+    ["cell", "tumor", "mouse", "human", "gene"],
+    ["cell", "blood", "liver", "gene", "gene"],
+    ["cell", "human", "mouse", "rna"],
+]
+TOTAL_COUNTS = Counter(token for tokens in PAPERS_TOKENS for token in tokens)
+
+
+def _count_vectorizer_vocabulary(max_features, min_df, max_df):
+    vectorizer = CountVectorizer(analyzer=lambda tokens: tokens, max_features=max_features, min_df=min_df,
+                                 max_df=max_df)
+    vectorizer.fit(PAPERS_TOKENS)
+    return list(vectorizer.get_feature_names_out())
+
+
+@pytest.mark.parametrize("max_features, min_df, max_df", [
+    (None, 2, 4),
+    (None, 1, 6),
+    (None, 0.3, 0.8),
+    (None, 0.0, 1.0),
+    (2, 2, 5),
+    (2, 0.4, 0.9),
+])
+def test_select_vocabulary_matches_count_vectorizer(max_features, min_df, max_df):
+    assert _select_vocabulary(PAPERS_TOKENS, max_features, min_df, max_df) == _count_vectorizer_vocabulary(
+        max_features, min_df, max_df)
+
+
+@pytest.mark.parametrize("max_features, min_df, max_df, expected", [
+    # "blood", "gene", "liver" and "mouse" have 3 occurrences, 2 of them are kept
+    (4, 0.2, 0.9, ["blood", "gene", "rna", "tumor"]),
+    # "rna" and "tumor" have 4 occurrences, 1 of them is kept
+    (1, 1, 0.5, ["rna"]),
+])
+def test_select_vocabulary_breaks_ties_at_max_features_alphabetically(max_features, min_df, max_df, expected):
+    vocabulary = _select_vocabulary(PAPERS_TOKENS, max_features, min_df, max_df)
+    # CountVectorizer breaks the ties in an unspecified order, the kept counts are the same
+    count_vectorizer_vocabulary = _count_vectorizer_vocabulary(max_features, min_df, max_df)
+
+    assert vocabulary == expected
+    assert sorted(TOTAL_COUNTS[token] for token in vocabulary) == sorted(
+        TOTAL_COUNTS[token] for token in count_vectorizer_vocabulary)
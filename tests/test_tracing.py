@@ -0,0 +1,47 @@
+import json
+import pickle
+
+from src.utils.tracing import Tracer, span, traced, current_tracer
+
+
+class Result:
+    pass
+
+
+@traced
+def analyze(n):
+    with span("outer", items=n):
+        with span("inner") as inner_span:
+            sum(range(100_000))
+            inner_span.items = 2 * n
+    return Result()
+
+
+def test_traced_function_records_nested_spans(tmp_path):
+    result = analyze(3)
+    assert current_tracer() is None
+    spans = result.trace.to_dict()["spans"]
+    assert [(s["name"], s["parent"], s["depth"], s["items"]) for s in spans] == [
+        ("analyze", None, 0, None), ("outer", "analyze", 1, 3), ("inner", "outer", 2, 6),
+    ]
+    assert all(s["wall_seconds"] >= 0 and s["cpu_seconds"] >= 0 for s in spans)
+    assert spans[0]["wall_seconds"] >= spans[2]["wall_seconds"]
+
+    result.trace.save_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    assert [event["name"] for event in events] == ["analyze", "outer", "inner"]
+    assert pickle.loads(pickle.dumps(result.trace)).to_json() == result.trace.to_json()
+
+
+def test_traced_function_uses_active_tracer():
+    tracer = Tracer("job")
+    with tracer.activate():
+        result = analyze(1)
+    assert not hasattr(result, "trace")
+    assert [s.name for s in tracer.spans] == ["analyze", "outer", "inner"]
+
+
+def test_span_without_tracer_is_not_recorded():
+    with span("stage", items=1) as stage_span:
+        stage_span.items = 2
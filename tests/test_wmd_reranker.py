@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from gensim.models import KeyedVectors
+
+from src.standardization.wmd_reranker import WMDReranker
+
+pytest.importorskip("ot")
+
+
+@pytest.fixture
+def model():
+    rng = np.random.default_rng(0)
+    model = KeyedVectors(vector_size=10)
+    model.add_vectors([f"w{i}" for i in range(50)], rng.normal(size=(50, 10)))
+    return model
+
+
+def test_rerank_matches_exact_wmd(model):
+    rng = np.random.default_rng(1)
+    document = ["w1", "w2", "w3"]
+    candidates = [[f"w{i}" for i in rng.integers(0, 50, size=rng.integers(1, 4))] for _ in range(40)]
+    candidates.append(["oov"])
+    reranker = WMDReranker(model)
+
+    distances = [model.wmdistance(document, candidate) for candidate in candidates]
+    assert all(reranker.lower_bound(document, candidate) <= distance + 1e-9
+               for candidate, distance in zip(candidates, distances))
+
+    expected = sorted(range(len(candidates)), key=lambda i: (distances[i], i))[:5]
+    ranked = reranker.rerank(document, candidates, 5)
+    assert [i for i, _ in ranked] == expected
+    assert [distance for _, distance in ranked] == pytest.approx([distances[i] for i in expected])
+    assert reranker.exact_computations < len(candidates)
+
+
+def test_rerank_caches_exact_wmd(model):
+    reranker = WMDReranker(model, cache_size=2)
+    candidates = [["w1"], ["w2", "w3"], ["w4"]]
+    reranker.rerank(["w1", "w5"], candidates, 3)
+    computations = reranker.exact_computations
+    reranker.rerank(["w1", "w5"], candidates[1:], 2)
+    assert reranker.exact_computations == computations
+    assert len(reranker.cache) == 2